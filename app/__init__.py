@@ -1,5 +1,4 @@
 import os
-import logging, logging.handlers
 
 from flask import Flask
 from sqlalchemy import MetaData
@@ -8,9 +7,6 @@ from flask_migrate import Migrate
 from flask_mail import Mail
 from flask_jsglue import JSGlue
 
-from elasticsearch import Elasticsearch
-
-
 
 db = SQLAlchemy(metadata=MetaData(naming_convention={
     "ix": 'ix_%(column_0_label)s',
@@ -32,21 +28,10 @@ def create_app(config_class='config.DevelopmentConfig'):
     app.config.from_object(config_class)
     app.config.from_pyfile('config.py', silent=True)
 
-    # setting of logging of app-specific messages to cadet.log
-    handler = logging.FileHandler('cadet.log')
-    handler.setLevel(app.config.get('LOGGING_LEVEL', logging.INFO))
-    formatter = logging.Formatter('%(asctime)s %(levelname)s [%(filename)s:%(lineno)d - %(funcName)s] : %(message)s')
-    handler.setFormatter(formatter)
-    app.logger.addHandler(handler)
-
-    if app.config.get('EMAIL_ERRORS', False):
-        # email error and critical events to admin(s)
-        mail_handler = logging.handlers.SMTPHandler(mailhost=app.config['MAIL_SERVER'],
-                                                    fromaddr=app.config['EMAIL_FROM'],
-                                                    toaddrs=app.config['EMAIL_ERRORS_TO'],
-                                                    subject="SpacedCadet Error Report")
-        mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
+    # log app-specific messages to cadet.log (and email errors) from a
+    # background thread
+    from app.log import init_app as init_logging
+    init_logging(app)
 
     # ensure that the instance folder exists (creating if necessary)
     os.makedirs(app.instance_path, exist_ok=True)
@@ -54,22 +39,11 @@ def create_app(config_class='config.DevelopmentConfig'):
     mail.init_app(app)
     jsglue.init_app(app)
 
-    es_url = app.config.get('ELASTICSEARCH_URL')
-    if es_url:
-        app.elasticsearch = Elasticsearch(es_url)
-
-        # check that elasticsearch server is actually available before
-        # initializing it.
-        if app.elasticsearch.ping():
-            from app.search import init_app as init_search
-            init_search(app)
-        else:
-            app.logger.warn("Could not connect to Elasticsearch server.")
-            app.elasticsearch = None
-
-    else:
-        app.elasticsearch = None
+    from app.email import init_app as init_email
+    init_email(app)
 
+    from app.search import init_app as init_search
+    init_search(app)
 
     from app.database import init_app as init_db
     init_db(app)
@@ -79,9 +53,13 @@ def create_app(config_class='config.DevelopmentConfig'):
     from app.user_views import user_views as uv
     app.register_blueprint(uv)
 
-    from app.user_views import markdown_to_html
+    from app.rendering import init_app as init_rendering, markdown_to_html
+    init_rendering(app)
     app.jinja_env.filters['mdown'] = markdown_to_html
 
+    from app.grading import init_app as init_grading
+    init_grading(app)
+
     from app.api import init_app as init_api
     init_api(app)
 
@@ -97,6 +75,9 @@ def create_app(config_class='config.DevelopmentConfig'):
     from app.search import search_cli
     app.cli.add_command(search_cli)
 
+    from app.grading import grading_cli
+    app.cli.add_command(grading_cli)
+
     if app.config.get('ENABLE_TEST_ROUTES'):
         from app.tests import tests
         app.register_blueprint(tests, url_prefix="/test")
@@ -1,4 +1,10 @@
-from flask import request, jsonify
+import base64
+import binascii
+import functools
+import hashlib
+import json
+
+from flask import request, jsonify, current_app
 from flask_restful import Resource, Api
 from marshmallow import (
     Schema, fields, ValidationError, EXCLUDE
@@ -7,9 +13,10 @@ from flask_jwt_extended import (
     jwt_required, create_access_token, set_access_cookies, unset_jwt_cookies,
     current_user
 )
+from werkzeug.http import http_date, quote_etag
 
 from app import db
-from app.auth import AuthorizationError
+from app.auth import AuthorizationError, is_enrolled
 from app.db_models import (
     Question, QuestionSchema,
     QuestionType,
@@ -29,7 +36,8 @@ from app.db_models import (
     Objective, LearningObjectiveSchema,
     Course, CourseSchema,
     ClassMeeting, ClassMeetingSchema,
-    Assessment, AssessmentSchema
+    Assessment, AssessmentSchema,
+    ResourceVersion, enrollments
 )
 
 class ImmutableFieldError(Exception):
@@ -41,13 +49,13 @@ def admin_only(item):
 
 
 def admin_or_course_instructor(course):
-    if not (current_user.admin or (current_user.instructor and current_user in course.users)):
+    if not (current_user.admin or (current_user.instructor and is_enrolled(current_user, course))):
         raise AuthorizationError()
 
 
 def admin_or_course_instructor_nested(course_collection):
     if not (current_user.admin\
-            or (current_user.instructor and current_user in course_collection.course.users)):
+            or (current_user.instructor and is_enrolled(current_user, course_collection.course))):
         raise AuthorizationError()
 
 
@@ -56,6 +64,210 @@ def admin_or_author(obj):
         raise AuthorizationError()
 
 
+def search_page():
+    """ Returns the page (starting at 0) and number of results per page that
+    were requested for a search. """
+    page = max(request.args.get('page', 0, type=int), 0)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    return page, per_page
+
+
+def encode_cursor(values):
+    """ Returns an opaque cursor for the position after a row with the given
+    sort key values. """
+    data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, num_values):
+    """ Returns the sort key values encoded in a cursor, raising a ValueError
+    if it isn't valid. """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+
+    if not isinstance(values, list) or len(values) != num_values:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def eager_load_options(model, schema):
+    """ Returns the query options that eagerly load the relationships of model
+    that are dumped by the nested fields of schema (and, recursively, those
+    dumped by the nested schemas), so that dumping a list of objects doesn't
+    lazily load each object's relationships with separate queries.
+
+    Many-to-one relationships are joined, while collections are loaded with
+    one extra query each (regardless of the number of objects). Dynamic
+    relationships can't be eagerly loaded, so schemas dump them from their
+    read-only views instead. """
+    options = []
+    for relationship, nested_schema in nested_relationships(model, schema):
+        if relationship.lazy == 'dynamic':
+            continue
+
+        loader = db.selectinload if relationship.uselist else db.joinedload
+        attr = getattr(model, relationship.key)
+        nested_options = eager_load_options(relationship.mapper.class_, nested_schema)
+        options.append(loader(attr).options(*nested_options))
+
+    return options
+
+
+def nested_relationships(model, schema):
+    """ Returns (relationship, nested schema) pairs for the relationships of
+    model that are dumped by the nested fields of schema. """
+    mapper = db.inspect(model)
+    relationships = []
+    for name, field in schema.dump_fields.items():
+        nested = field.inner if isinstance(field, fields.List) else field
+        if not isinstance(nested, fields.Nested):
+            continue
+
+        relationship = mapper.relationships.get(field.attribute or name)
+        if relationship is not None:
+            relationships.append((relationship, nested.schema))
+
+    return relationships
+
+
+def dumped_tables(model, schema):
+    """ Returns the names of the tables of the models that are dumped by
+    schema (i.e. model's and those of its nested relationships), or None if
+    any of them aren't versioned. """
+    if not getattr(model, '__versioned__', False):
+        return None
+
+    names = set(ResourceVersion.table_names(model))
+    for relationship, nested_schema in nested_relationships(model, schema):
+        nested_names = dumped_tables(relationship.mapper.class_, nested_schema)
+        if nested_names is None:
+            return None
+        names |= nested_names
+
+    return names
+
+
+def versioned_response(version_names, dump):
+    """ Returns the response for reading a resource whose content only changes
+    when the named version counters are bumped.
+
+    The response has a strong ETag for the current versions, and clients
+    that already have it (i.e. send it in If-None-Match) get a 304 without
+    calling dump, which returns the body of the response. """
+    version_names = sorted(version_names)
+    versions = ResourceVersion.current(version_names)
+
+    digest = hashlib.blake2b(request.path.encode('utf-8'), digest_size=16)
+    for name, (version, modified) in zip(version_names, versions):
+        digest.update(f"|{name}={version}@{modified}".encode('utf-8'))
+    etag = digest.hexdigest()
+
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': "private, no-cache"}
+    modified_times = [modified for _, modified in versions if modified is not None]
+    if modified_times:
+        headers['Last-Modified'] = http_date(max(modified_times))
+
+    if request.if_none_match.contains(etag):
+        return current_app.response_class(status=304, headers=headers)
+
+    return dump(), 200, headers
+
+
+@functools.lru_cache(maxsize=128)
+def list_schema(schema_class, only=None, html=False):
+    """ Returns a schema for dumping lists with only the given fields (or all
+    of them if only is None), using the html version of markdown fields if
+    html is True.
+
+    Constructing a schema copies and binds all of its fields (and those of
+    its nested schemas), so each combination is only constructed once and
+    shared between requests. """
+    schema = schema_class(many=True, only=only)
+    if html:
+        schema.context = {"html": True}
+    return schema
+
+
+def requested_schema(schema_class):
+    """ Returns the list schema for the fields given by the comma separated
+    'fields' argument, and the 'html' argument. Raises a ValueError if any of
+    the fields can't be dumped. """
+    html = request.args.get("html") is not None
+
+    fields_str = request.args.get("fields")
+    if not fields_str:
+        return list_schema(schema_class, html=html)
+
+    dumpable = {(field.data_key or name): name
+                for name, field in schema_class._declared_fields.items()
+                if not field.load_only}
+    requested = set(fields_str.split(','))
+    unknown = requested - dumpable.keys()
+    if unknown:
+        raise ValueError(f"Invalid fields: {', '.join(sorted(unknown))}")
+
+    # use the declared order of the fields, so that requests for the same
+    # fields share a schema
+    only = tuple(name for key, name in dumpable.items() if key in requested)
+    return list_schema(schema_class, only, html)
+
+
+def load_only_options(model, schema, required=()):
+    """ Returns the query options that only load the columns of model that are
+    dumped by schema (along with the required columns), if the schema is
+    limited to some of its fields. """
+    if schema.only is None:
+        return []
+
+    mapper = db.inspect(model)
+    columns = [getattr(model, field.attribute or name)
+               for name, field in schema.dump_fields.items()
+               if (field.attribute or name) in mapper.column_attrs]
+    return [db.load_only(*columns, *required)]
+
+
+def keyset_page(query, order_by, collection_name, schema):
+    """ Returns the response for one page of a list resource.
+
+    Results are ordered by the order_by columns (which together must be
+    unique) and start after the cursor given by the 'after' argument. Up to
+    'limit' results are returned, along with a cursor for the next page
+    ('next', which is null on the last page). The total number of results is
+    only counted (in the X-Total-Count header) if the 'count' argument is
+    given, since it requires another query. """
+    default_limit = current_app.config.get('API_PAGE_SIZE', 100)
+    max_limit = current_app.config.get('API_MAX_PAGE_SIZE', 500)
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+
+    headers = {}
+    if request.args.get('count') is not None:
+        headers['X-Total-Count'] = str(query.order_by(None).count())
+
+    after = request.args.get('after')
+    if after:
+        try:
+            values = decode_cursor(after, len(order_by))
+        except ValueError as error:
+            return {'message': str(error)}, 400
+        query = query.filter(db.tuple_(*order_by) > db.tuple_(*values))
+
+    model = query.column_descriptions[0]['entity']
+    options = eager_load_options(model, schema) + load_only_options(model, schema, order_by)
+    items = query.options(*options).order_by(*order_by).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([getattr(items[-1], column.key)
+                                     for column in order_by])
+
+    return {collection_name: schema.dump(items, many=True),
+            'next': next_cursor}, 200, headers
+
+
 def item_collection_getter(item_type, item_id, schema, collection_name,
                               authorization_checker):
     item = item_type.query.filter_by(id=item_id).one_or_none()
@@ -66,13 +278,72 @@ def item_collection_getter(item_type, item_id, schema, collection_name,
         except AuthorizationError as e:
             return {'message': 'Unauthorized access.'}, 401
 
-        result = schema.dump(getattr(item, collection_name), many=True)
-        return {collection_name: result}
+        def dump():
+            result = schema.dump(getattr(item, collection_name), many=True)
+            return {collection_name: result}
+
+        # the collection only changes when the item (including its
+        # collection) or one of the dumped tables changes
+        collection_type = db.inspect(item_type).relationships[collection_name].mapper.class_
+        version_names = dumped_tables(collection_type, schema)
+        if version_names is None:
+            return dump()
+
+        version_names.add(ResourceVersion.object_name(item_type, item_id))
+        return versioned_response(version_names, dump)
 
     else:
         return {'message': f"{item_type.__name__} with id {item_id} not found."}, 404
 
 
+def update_collection(item_type, item_id, collection_name, add_ids, remove_ids):
+    """ Adds and removes the items with the given ids to/from the named
+    collection of an item, with (at most) one bulk insert or update and one
+    delete or update, instead of going through the ORM one item at a time.
+
+    The collection can either be many-to-many (i.e. use an association
+    table), or one-to-many. """
+    if not (add_ids or remove_ids):
+        return
+
+    relationship = db.inspect(item_type).relationships[collection_name]
+    (item_column, item_key), = relationship.synchronize_pairs
+    connection = db.session.connection()
+
+    if relationship.secondary is not None:
+        (_, collection_key), = relationship.secondary_synchronize_pairs
+        table = relationship.secondary
+
+        if add_ids:
+            connection.execute(table.insert(), [
+                {item_key.key: item_id, collection_key.key: collection_id}
+                for collection_id in add_ids])
+        if remove_ids:
+            connection.execute(table.delete().where(
+                item_key == item_id, collection_key.in_(remove_ids)))
+
+    else:
+        # the collection's items have a foreign key to the item
+        table = item_key.table
+        collection_id, = table.primary_key.columns
+
+        if add_ids:
+            connection.execute(table.update().where(collection_id.in_(add_ids))
+                                    .values({item_key.key: item_id}))
+        if remove_ids:
+            connection.execute(table.update().where(collection_id.in_(remove_ids))
+                                    .values({item_key.key: None}))
+
+    # both sides of the relationship changed
+    collection_type = relationship.mapper.class_
+    if relationship.secondary is enrollments:
+        User.identities_changed(db.session, [*add_ids, *remove_ids])
+
+    ResourceVersion.bump(connection, {
+        *ResourceVersion.changed_names(item_type, [item_id]),
+        *ResourceVersion.changed_names(collection_type, [*add_ids, *remove_ids])})
+
+
 def item_collection_poster(item_type, item_id, schema, collection_name,
                             collection_type, authorization_checker, patch=False):
     """ Adds all the items with the IDs listed in the request's 'ids' field to
@@ -113,41 +384,35 @@ def item_collection_poster(item_type, item_id, schema, collection_name,
     except ValidationError as err:
         return err.messages, 422
 
-    ignored = []
-    added = []
-    removed = []
-    invalid_ids = []
-
-    collection = getattr(item, collection_name)
-
-    for new_item_id in data['ids']:
-        item_to_add = collection_type.query.filter_by(id=new_item_id).one_or_none()
+    # load the requested items and the current collection (one query each)
+    # rather than checking each of the requested ids separately
+    requested_ids = list(dict.fromkeys(data['ids']))
+    found = {obj.id: obj for obj in
+             collection_type.query.filter(collection_type.id.in_(requested_ids))}
+    current = {obj.id: obj for obj in getattr(item, collection_name)}
 
-        if item_to_add:
-            if item_to_add in collection:
-                ignored.append(item_to_add)
-            else:
-                added.append(item_to_add)
-                collection.append(item_to_add)
-
-        else:
-            invalid_ids.append(new_item_id)
+    invalid_ids = [i for i in requested_ids if i not in found]
+    added = [found[i] for i in requested_ids if i in found and i not in current]
+    ignored = [found[i] for i in requested_ids if i in found and i in current]
 
+    removed = []
     if patch:
         # remove any items not specified by the user
-        for ci in collection:
-            if ci.id not in data['ids']:
-                removed.append(ci)
-                collection.remove(ci)
+        removed = [obj for obj_id, obj in current.items() if obj_id not in found]
 
-    db.session.commit()
+    update_collection(item_type, item_id, collection_name,
+                      [obj.id for obj in added], [obj.id for obj in removed])
 
-    return {
+    # dump the items before committing, which would expire them
+    result = {
         "added": schema.dump(added, many=True),
         "previously-added": schema.dump(ignored, many=True),
         "removed": schema.dump(removed, many=True),
         "invalid-ids": invalid_ids
     }
+    db.session.commit()
+
+    return result
 
 
 user_schema = UserSchema()
@@ -168,7 +433,6 @@ textbook_section_schema = TextbookSectionSchema()
 class_meeting_schema = ClassMeetingSchema()
 class_meetings_schema = ClassMeetingSchema(many=True)
 objective_schema = LearningObjectiveSchema()
-objectives_schema = LearningObjectiveSchema(many=True)
 textbook_section_schema = TextbookSectionSchema()
 
 
@@ -280,18 +544,17 @@ class TextbookSearchApi(Resource):
         if query_str is None:
             return {'message': "Missing query argument (q)"}, 400
 
-        textbooks = Textbook.search(query_str)[0]
+        textbooks = Textbook.search(query_str, *search_page(),
+                                    options=eager_load_options(Textbook, textbook_schema))[0]
 
-        result = textbook_schema.dump(textbooks.all(), many=True)
+        result = textbook_schema.dump(textbooks, many=True)
         return {'textbooks': result}
 
 
 class TextbooksApi(Resource):
     @jwt_required()
     def get(self):
-        textbooks = Textbook.query.all()
-        result = textbook_schema.dump(textbooks, many=True)
-        return {'textbooks': result}
+        return keyset_page(Textbook.query, [Textbook.id], 'textbooks', textbook_schema)
 
     @jwt_required()
     def post(self):
@@ -386,9 +649,7 @@ class UsersApi(Resource):
         email_str = request.args.get("email")
 
         if email_str is None:
-            users = User.query.all()
-            result = users_schema.dump(users)
-            return {'users': result}
+            return keyset_page(User.query, [User.id], 'users', users_schema)
         else:
             user = User.query.filter_by(email=email_str).first()
             if not user:
@@ -412,7 +673,7 @@ class CourseApi(Resource):
         if c:
             # Limit access to admins and course instructors
             if (not current_user.admin)\
-                    and (not current_user.instructor or current_user not in c.users):
+                    and (not current_user.instructor or not is_enrolled(current_user, c)):
                 return {'message': "Unauthorized access"}, 401
 
             return course_schema.dump(c)
@@ -452,13 +713,12 @@ class CoursesApi(Resource):
         # admins will get all courses, everyone else gets only the courses
         # they are part of
         if current_user.admin:
-            courses = Course.query.all()
+            courses = Course.query
         else:
             courses = current_user.courses
 
         schema = CourseSchema(many=True, exclude=('users',))
-        result = schema.dump(courses)
-        return {'courses': result}
+        return keyset_page(courses, [Course.id], 'courses', schema)
 
     @jwt_required()
     def post(self):
@@ -516,16 +776,15 @@ class TopicsApi(Resource):
 
         query_str = request.args.get("q")
 
-        if query_str is None:
-            topics = Topic.query
-        else:
-            topics = Topic.search(query_str)[0]
-
-        topics = topics.order_by(Topic.text)
+        schema = TopicSchema(many=True, exclude=('sources', 'objectives'))
 
+        if query_str is None:
+            return keyset_page(Topic.query, [Topic.text, Topic.id], 'topics', schema)
 
-        schema = TopicSchema(many=True, exclude=('sources', 'objectives'))
-        result = schema.dump(topics.all())
+        topics = sorted(Topic.search(query_str, *search_page(),
+                                    options=eager_load_options(Topic, schema))[0],
+                        key=lambda topic: topic.text)
+        result = schema.dump(topics)
         return {'topics': result}
 
     @jwt_required()
@@ -724,6 +983,9 @@ class QuestionApi(Resource):
             schema.update_obj(q, data)
         except ImmutableFieldError:
             return {"message": "Question type may not be changed."}, 400
+        except ValidationError as err:
+            db.session.rollback()
+            return err.messages, 422
         else:
             db.session.commit()
             return {"updated": schema.dump(q)}
@@ -742,7 +1004,7 @@ class CourseAssessmentQuestionApi(Resource):
 
         # Limit access to admins and course instructors
         if not (current_user.admin \
-                or (current_user.instructor and (current_user in course.users))):
+                or (current_user.instructor and is_enrolled(current_user, course))):
             return {'message': 'Unauthorized access.'}, 401
 
         q = assessment.questions.filter_by(id=question_id).one_or_none()
@@ -764,7 +1026,7 @@ class CourseTextbookApi(Resource):
 
         # Limit access to admins and course instructors
         if not (current_user.admin \
-                or (current_user.instructor and (current_user in course.users))):
+                or (current_user.instructor and is_enrolled(current_user, course))):
             return {'message': 'Unauthorized access.'}, 401
 
         tb = course.textbooks.filter_by(id=textbook_id).one_or_none()
@@ -787,7 +1049,7 @@ class CourseTopicApi(Resource):
 
         # Limit access to admins and course instructors
         if not (current_user.admin \
-                or (current_user.instructor and (current_user in course.users))):
+                or (current_user.instructor and is_enrolled(current_user, course))):
             return {'message': 'Unauthorized access.'}, 401
 
         topic = course.topics.filter_by(id=topic_id).one_or_none()
@@ -831,7 +1093,7 @@ class EnrolledStudentApi(Resource):
 
         # Limit access to admins and course instructors
         if (not current_user.admin)\
-                and (not current_user.instructor or current_user not in course.users):
+                and (not current_user.instructor or not is_enrolled(current_user, course)):
             return {'message': 'Unauthorized access.'}, 401
 
         s = course.users.filter_by(id=student_id).one_or_none()
@@ -965,18 +1227,14 @@ class QuestionsApi(Resource):
         if not (current_user.instructor or current_user.admin):
             return {'message': "Unauthorized access"}, 401
 
-        query_str = request.args.get("q")
-
-        if query_str is None:
-            questions = Question.query
-        else:
-            questions = Question.search(query_str)[0]
-
+        # filters are applied by the search backend when searching so that
+        # pages of search results only include matching questions
+        filters = []
         target_author = request.args.get('author')
 
         if target_author == 'self':
             # restrict results to current user if author=self is specified
-            questions = questions.filter(Question.author_id == current_user.id)
+            filters.append({'author_id': current_user.id})
 
         elif target_author:
             # Restrict results to specific user id if author is given (and not
@@ -989,13 +1247,12 @@ class QuestionsApi(Resource):
             except:
                 return {'message': f"Invalid value for author argument: {target_author}"}, 400
             else:
-                questions = questions.filter(Question.author_id == target_id)
+                filters.append({'author_id': target_id})
 
         elif not current_user.admin:
             # if no author specified and user isn't an admin, get all public
             # questions as well as those that are authored by the current user
-            questions = questions.filter(db.or_(Question.public == True,
-                                                Question.author == current_user))
+            filters.append({'public': True, 'author_id': current_user.id})
 
         # handle request to limit to questions with specific objectives
         objective_list_str = request.args.get("objectives")
@@ -1005,10 +1262,23 @@ class QuestionsApi(Resource):
             except:
                 return {'message': f"Invalid objectives argument: {objective_list_str}"}, 400
 
-            questions = questions.join(Objective).filter(Objective.id.in_(objective_ids))
+            filters.append({'objective_id': objective_ids})
 
+        try:
+            schema = requested_schema(QuestionSchema)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+
+        query_str = request.args.get("q")
+
+        if query_str is None:
+            questions = Question.query.filter(Question.filter_expression(filters))
+            return keyset_page(questions, [Question.id], 'questions', schema)
 
-        result = question_schema.dump(questions.all(), many=True)
+        options = eager_load_options(Question, schema) + load_only_options(Question, schema)
+        questions = Question.search(query_str, *search_page(), filters=filters,
+                                    options=options)[0]
+        result = schema.dump(questions)
         return {'questions': result}
 
 
@@ -1197,18 +1467,14 @@ class QuestionObjectiveApi(Resource):
 class ObjectiveSearchApi(Resource):
     @jwt_required()
     def get(self):
-        query_str = request.args.get("q")
-
-        if query_str is None:
-            objectives = Objective.query
-        else:
-            objectives = Objective.search(query_str)[0]
-
+        # filters are applied by the search backend when searching so that
+        # pages of search results only include matching objectives
+        filters = []
         target_author = request.args.get('author')
 
         if target_author == 'self':
             # restrict results to current user if author=self is specified
-            objectives = objectives.filter(Objective.author_id == current_user.id)
+            filters.append({'author_id': current_user.id})
 
         elif target_author:
             # Restrict results to specific user id if author is given (and not
@@ -1221,31 +1487,38 @@ class ObjectiveSearchApi(Resource):
             except:
                 return {'message': f"Invalid value for author argument: {target_author}"}, 400
             else:
-                objectives = objectives.filter(Objective.author_id == target_id)
+                filters.append({'author_id': target_id})
 
         elif not current_user.admin:
             # if no author specified and user isn't an admin, get all public
             # objectives as well as those that are authored by the current user
-            objectives = objectives.filter(db.or_(Objective.public == True,
-                                                  Objective.author == current_user))
+            filters.append({'public': True, 'author_id': current_user.id})
 
         # topic_q parameter is a query string to search for topics and limit
         # objective search results to only those objectives that have one of
         # the topics.
         topic_query_str = request.args.get("topics_q")
         if topic_query_str is not None:
-            print("SEARCHING FOR TOPIC QUERY:", topic_query_str)
             topics = Topic.search(topic_query_str)[0]
-            objectives = objectives.join(topics)
+            filters.append({'topic_id': [topic.id for topic in topics]})
 
-        # if they used the 'html' argument, get the HTML version of the field
-        if request.args.get("html") is not None:
-            schema = LearningObjectiveSchema(many=True)
-            schema.context = {"html": True}
-        else:
-            schema = objectives_schema
+        query_str = request.args.get("q")
 
-        result = schema.dump(objectives.all())
+        # limit the results to the requested fields, using the HTML version of
+        # the description if they used the 'html' argument
+        try:
+            schema = requested_schema(LearningObjectiveSchema)
+        except ValueError as error:
+            return {'message': str(error)}, 400
+
+        if query_str is None:
+            objectives = Objective.query.filter(Objective.filter_expression(filters))
+            return keyset_page(objectives, [Objective.id], 'learning_objectives', schema)
+
+        options = eager_load_options(Objective, schema) + load_only_options(Objective, schema)
+        objectives = Objective.search(query_str, *search_page(), filters=filters,
+                                      options=options)[0]
+        result = schema.dump(objectives)
         return {'learning_objectives': result}
 
 
@@ -1289,15 +1562,14 @@ class ObjectivesApi(Resource):
 
             objectives = objectives.join(Topic).filter(Topic.id.in_(topic_ids))
 
-        # if they used the 'html' argument, get the HTML version of the field
-        if request.args.get("html") is not None:
-            schema = LearningObjectiveSchema(many=True)
-            schema.context = {"html": True}
-        else:
-            schema = objectives_schema
+        # limit the results to the requested fields, using the HTML version of
+        # the description if they used the 'html' argument
+        try:
+            schema = requested_schema(LearningObjectiveSchema)
+        except ValueError as error:
+            return {'message': str(error)}, 400
 
-        result = schema.dump(objectives.all())
-        return {'learning_objectives': result}
+        return keyset_page(objectives, [Objective.id], 'learning_objectives', schema)
 
     @jwt_required()
     def post(self):
@@ -1318,7 +1590,7 @@ class AssessmentApi(Resource):
             # Limit access to admins and instructors of the course this
             # assessment is assigned to
             if (not current_user.admin)\
-                    and (not current_user.instructor or current_user not in assessment.course.users):
+                    and (not current_user.instructor or not is_enrolled(current_user, assessment.course)):
                 return {'message': "Unauthorized access"}, 401
 
             return assessment_schema.dump(assessment)
@@ -1332,7 +1604,7 @@ class AssessmentApi(Resource):
             # Limit access to admins and instructors of the course this
             # assessment is assigned to
             if (not current_user.admin)\
-                    and (not current_user.instructor or current_user not in assessment.course.users):
+                    and (not current_user.instructor or not is_enrolled(current_user, assessment.course)):
                 return {'message': "Unauthorized access"}, 401
 
             db.session.delete(assessment)
@@ -1,6 +1,6 @@
 from flask import (
     Blueprint, render_template, abort, current_app, request, redirect, url_for,
-    flash, Markup, jsonify
+    flash, Markup, jsonify, g, has_app_context, has_request_context
 )
 
 from flask_login import current_user, login_user, logout_user, LoginManager
@@ -18,6 +18,10 @@ from flask_jwt_extended import (
 from jwt.exceptions import DecodeError, ExpiredSignatureError
 
 from datetime import datetime, timedelta, timezone
+from collections import OrderedDict, namedtuple
+from sqlalchemy.orm import make_transient_to_detached
+import threading
+import time
 
 #from cas import CASClient
 
@@ -43,10 +47,135 @@ def check_authorization(user, course=None, instructor=False, admin=False):
     elif admin and not user.admin:
         raise AuthorizationError("Must be an admin")
 
-    elif course and user not in course.users:
+    elif course and not is_enrolled(user, course):
         raise AuthorizationError("Must be enrolled in course")
 
 
+Identity = namedtuple('Identity', ['columns', 'course_ids', 'loaded'])
+
+
+class IdentityCache(object):
+    """ Thread-safe, bounded LRU cache of the users who made recent requests:
+    their columns (including their instructor and admin flags) and the ids of
+    the courses they are enrolled in, so that authenticating a request and
+    checking enrollments doesn't take any queries.
+
+    Entries expire after ttl seconds. They are also forgotten when the user
+    or their enrollments change, but only in the worker that made the change,
+    so the ttl bounds how long other workers can use out of date roles. """
+
+    def __init__(self, ttl=5, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """ Returns the user's Identity, or None if it isn't cached (or has
+        expired). """
+        with self._lock:
+            identity = self._entries.get(user_id)
+            if identity is not None and time.monotonic() - identity.loaded < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return identity
+
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, user_id, columns, course_ids):
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[user_id] = Identity(columns, course_ids, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+        # including what the current request loaded
+        if has_app_context() and g.get('identity') and g.identity[0] in user_ids:
+            g.pop('identity')
+
+    def configure(self, ttl, maxsize):
+        with self._lock:
+            self.ttl = ttl
+            self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+identities = IdentityCache()
+
+# requests that can use cached identities
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def load_identity(user_id):
+    """ Returns the user with the given id (or None if there isn't one).
+
+    The user and the ids of their courses are loaded with a single query, or
+    taken from the identity cache, in which case the user is added to the
+    session without a query. Requests that can change anything always load
+    the user, so their roles and enrollments are up to date. The course ids
+    are kept in g for the rest of the request (see is_enrolled). """
+    identity = None
+    if not has_request_context() or request.method in SAFE_METHODS:
+        identity = identities.get(user_id)
+
+    if identity is None:
+        rows = db.session.execute(
+            db.select(User, enrollments.c.course_id)
+              .outerjoin(enrollments, enrollments.c.user_id == User.id)
+              .where(User.id == user_id)).all()
+        if not rows:
+            return None
+
+        user = rows[0][0]
+        course_ids = frozenset(course_id for _, course_id in rows if course_id is not None)
+        columns = {attr.key: getattr(user, attr.key)
+                   for attr in db.inspect(User).column_attrs}
+        identities.put(user_id, columns, course_ids)
+
+    else:
+        course_ids = identity.course_ids
+        key = db.inspect(User).identity_key_from_primary_key([user_id])
+        user = db.session.identity_map.get(key)
+        if user is None:
+            user = User(**identity.columns)
+            make_transient_to_detached(user)
+            db.session.add(user)
+
+    g.identity = (user.id, course_ids)
+    return user
+
+
+def is_enrolled(user, course):
+    """ Returns whether the user is enrolled in the course, which doesn't
+    take a query for the user that made the request. """
+    identity = g.get('identity')
+    if identity is not None and identity[0] == user.id:
+        return course.id in identity[1]
+
+    return course.users.filter(User.id == user.id).count() > 0
+
+
 def init_app(app):
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -54,16 +183,20 @@ def init_app(app):
 
     jwt.init_app(app)
 
+    identities.configure(app.config.get('IDENTITY_CACHE_TTL', 5),
+                         app.config.get('IDENTITY_CACHE_SIZE', 1024))
+
 
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        user = User.query.filter_by(id=int(user_id)).one()
-        return user
-
+        user = load_identity(int(user_id))
     except:
+        user = None
+
+    if user is None:
         current_app.logger.error(f"Couldn't load user with id {user_id}")
-        return None
+    return user
 
 
 @jwt.user_identity_loader
@@ -74,7 +207,7 @@ def user_identity_lookup(user):
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
     identity = jwt_data["sub"]
-    return User.query.filter_by(id=identity).one_or_none()
+    return load_identity(identity)
 
 
 @auth.route('/refresh')
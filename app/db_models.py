@@ -1,15 +1,16 @@
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
-import enum, string, secrets
+import enum, string, secrets, random
 from math import ceil
 from marshmallow import (
-    Schema, fields, ValidationError, validates, pre_load
+    Schema, fields, ValidationError, validates, validates_schema, pre_load
 )
 from zoneinfo import ZoneInfo
 
 from app import db
-from app.search import add_to_index, remove_from_index, query_index, clear_index
+from app.search import query_index, SQLiteSearchBackend
 
 def markdown_field(attr_name):
     def markdown_or_html(obj, context):
@@ -34,62 +35,146 @@ def deserialize_str(s):
 
 
 class SearchableMixin(object):
-    """ Mixin to support searching in our models. """
+    """ Mixin to support searching in our models.
+
+    Models list the fields whose text is searched in __searchable__, and the
+    (base table) columns that searches can be filtered on in __filterable__.
+    """
+    __filterable__ = []
+
     @classmethod
-    def search(cls, expression, page=0, per_page=10):
+    def index_name(cls):
+        """ Returns the name of the search index for this model, which is
+        shared with any (polymorphic) subclasses. """
+        return db.inspect(cls).base_mapper.local_table.name
+
+    @classmethod
+    def search(cls, expression, page=0, per_page=10, filters=(), options=()):
         """ Searches for a given expression in this Table, with support for
-        pagination. """
+        pagination. Returns the objects in the requested page, ordered by
+        relevance, and the total number of matches.
+
+        Filters are applied by the search backend, before paginating. Each
+        filter is a dict of {field: value} that matches rows with any of the
+        given values, where a value may also be a list of allowed values.
+        Rows must match all of the filters. Options (e.g. for eager loading)
+        are applied to the query that loads the objects. """
+        hits, total = query_index(cls, expression, page, per_page, filters)
+        if not hits:
+            return [], total
+
+        # load the page with one query, keeping the backend's order
+        ids = [doc_id for doc_id, score in hits]
+        objects = {obj.id: obj for obj in cls.query.options(*options).filter(cls.id.in_(ids))}
+        return [objects[i] for i in ids if i in objects], total
 
-        ids, total = query_index(cls.__tablename__, expression, page, per_page)
-        if total == 0:
-            return cls.query.filter_by(id=0), 0
+    @classmethod
+    def filter_expression(cls, filters, table=None):
+        """ Returns the SQL expression for the given search filters (see
+        search), using the columns of the given table. """
+        if table is None:
+            table = db.inspect(cls).base_mapper.local_table
+
+        clauses = []
+        for any_of in filters:
+            options = []
+            for field, value in any_of.items():
+                if field not in cls.__filterable__:
+                    raise ValueError(f"Can't filter {cls.__name__} searches on {field}")
+
+                if isinstance(value, (list, tuple, set)):
+                    options.append(table.c[field].in_(value))
+                else:
+                    options.append(table.c[field] == value)
 
-        when = []
-        for i in range(len(ids)):
-            when.append((ids[i], i))
+            clauses.append(db.or_(*options))
 
-        return cls.query.filter(cls.id.in_(ids)).order_by(
-            db.case(when, value=cls.id)), total
+        return db.and_(db.true(), *clauses)
+
+    def search_fields_changed(self):
+        """ Returns True if any of the indexed fields have pending changes. """
+        state = db.inspect(self)
+        return any(state.attrs[field].history.has_changes()
+                   for field in self.__searchable__ + self.__filterable__)
 
     @classmethod
-    def before_commit(cls, session):
-        """ Create separate lists for objects that got added, updated, and
-        deleted in this commit. """
+    def search_changes(cls, session):
+        """ Returns (object, SearchOperation) tuples for the searchable objects
+        that are added, updated, or deleted in the session's pending flush. """
+        changes = []
+        for obj in session.new:
+            if isinstance(obj, SearchableMixin):
+                changes.append((obj, SearchOperation.INDEX))
+        for obj in session.dirty:
+            if isinstance(obj, SearchableMixin) and obj.search_fields_changed():
+                changes.append((obj, SearchOperation.INDEX))
+        for obj in session.deleted:
+            if isinstance(obj, SearchableMixin):
+                changes.append((obj, SearchOperation.DELETE))
 
-        session._changes = {
-            'add': list(session.new),
-            'update': list(session.dirty),
-            'delete': list(session.deleted)
-        }
+        return changes
 
+    @classmethod
+    def before_flush(cls, session, flush_context, instances):
+        changes = cls.search_changes(session)
+        for backend in current_app.search_backends:
+            backend.before_flush(session, changes)
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """ Update the search backends with the objects that were added,
+        updated, or deleted in this flush. """
+        changes = cls.search_changes(session)
+        for backend in current_app.search_backends:
+            backend.after_flush(session, changes)
 
     @classmethod
     def after_commit(cls, session):
-        """ Update the search index based on what objects were added, updated,
-        and deleted by this commit. """
-        for obj in session._changes['add']:
-            if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
-        for obj in session._changes['update']:
-            if isinstance(obj, SearchableMixin):
-                add_to_index(obj.__tablename__, obj)
-        for obj in session._changes['delete']:
-            if isinstance(obj, SearchableMixin):
-                remove_from_index(obj.__tablename__, obj)
-        session._changes = None
+        """ Let the indexer know that there are new operations to send. """
+        if session.info.pop('search_queued', False):
+            current_app.search_indexer.wake()
+
+    @classmethod
+    def after_rollback(cls, session):
+        session.info.pop('search_queued', None)
+        session.info.pop('fts_pending', None)
 
 
     @classmethod
-    def reindex(cls, analyzer="english"):
-        """ Updates all entries in this table, clearing out any index
-        documents that aren't current in this table. """
-        clear_index(cls.__tablename__, analyzer)
-        for obj in cls.query:
-            add_to_index(cls.__tablename__, obj)
+    def reindex(cls, analyzer="english", **kwargs):
+        """ Rebuilds the index for this table in each search backend,
+        replacing any index documents that aren't current in this table. """
+        for backend in current_app.search_backends:
+            backend.reindex(cls, analyzer=analyzer, **kwargs)
 
 
-db.event.listen(db.session, 'before_commit', SearchableMixin.before_commit)
+db.event.listen(db.session, 'before_flush', SearchableMixin.before_flush)
+db.event.listen(db.session, 'after_flush', SearchableMixin.after_flush)
 db.event.listen(db.session, 'after_commit', SearchableMixin.after_commit)
+db.event.listen(db.session, 'after_rollback', SearchableMixin.after_rollback)
+db.event.listen(db.metadata, 'after_create', SQLiteSearchBackend.create_tables)
+db.event.listen(db.metadata, 'before_drop', SQLiteSearchBackend.drop_tables)
+
+
+class SearchOperation(enum.Enum):
+    INDEX = "index"
+    DELETE = "delete"
+
+
+class SearchOutbox(db.Model):
+    """ An index operation waiting to be sent to Elasticsearch. """
+
+    id = db.Column(db.Integer, primary_key=True)
+    index = db.Column(db.String(64), nullable=False)
+    doc_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.Enum(SearchOperation), nullable=False)
+
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_try = db.Column(db.DateTime, default=datetime.now, nullable=False,
+                         index=True)
+
+    def __repr__(self):
+        return f"<SearchOutbox {self.id}: {self.op.value} {self.index}/{self.doc_id}>"
 
 
 class QuestionType(enum.Enum):
@@ -194,6 +279,7 @@ selected_answers = db.Table(
 
 class Topic(SearchableMixin, db.Model):
     __searchable__ = ['text']
+    __versioned__ = True
 
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String, unique=True, nullable=False)
@@ -209,6 +295,18 @@ class Topic(SearchableMixin, db.Model):
                                  backref=db.backref('topics', lazy='dynamic', order_by='Topic.text'),
                                  lazy='dynamic')
 
+    # read-only views of the dynamic relationships, which (unlike them) can be
+    # eagerly loaded when dumping lists of topics
+    all_objectives = db.relationship('Objective',
+                                     foreign_keys='Objective.topic_id',
+                                     order_by='Objective.id', viewonly=True)
+
+    all_sources = db.relationship('Source',
+                                  secondary=topic_sources,
+                                  primaryjoin=('topic_sources.c.topic_id == Topic.id'),
+                                  secondaryjoin=('topic_sources.c.source_id == Source.id'),
+                                  order_by='Source.id', viewonly=True)
+
 
 class TopicSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -216,11 +314,11 @@ class TopicSchema(Schema):
 
     sources = fields.List(fields.Nested("SourceSchema",
                                           only=('id', 'title')),
-                            dump_only=True)
+                            attribute='all_sources', dump_only=True)
 
     objectives = fields.List(fields.Nested("LearningObjectiveSchema",
                                            only=('id', 'description')),
-                             dump_only=True)
+                             attribute='all_objectives', dump_only=True)
 
     @validates("text")
     def unique_text(self, text):
@@ -230,6 +328,8 @@ class TopicSchema(Schema):
 
 class Question(SearchableMixin, db.Model):
     __searchable__ = ['prompt']
+    __filterable__ = ['author_id', 'public', 'objective_id']
+    __versioned__ = True
 
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.Enum(QuestionType), nullable=False)
@@ -319,6 +419,15 @@ class QuestionSchema(Schema):
                 setattr(question, field, data[field])
 
 
+def check_answer(question):
+    """ Raises a ValidationError if the (updated) answer of an automatically
+    graded question isn't valid. """
+    try:
+        compile_answer(question)
+    except InvalidAnswerError as error:
+        raise ValidationError(str(error), 'answer')
+
+
 class ShortAnswerQuestion(Question):
     id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
 
@@ -352,6 +461,10 @@ class AutoCheckQuestion(Question):
     answer = db.Column(db.String, nullable=False)
     regex = db.Column(db.Boolean, default=False, nullable=False)
 
+    # answer checked (and hashed for code questions) by grading.compile_answer
+    # when the question is saved
+    compiled_answer = db.Column(db.String)
+
     __mapper_args__ = {
         'polymorphic_identity': QuestionType.AUTO_CHECK,
     }
@@ -367,6 +480,14 @@ class AutoCheckQuestionSchema(QuestionSchema):
     answer = fields.Str(required=True)  # CHANGE TO FUNCTION/METHOD
     regex = fields.Boolean(required=True)
 
+    @validates_schema
+    def valid_answer(self, data, **kwargs):
+        if 'answer' in data and data.get('regex', False):
+            try:
+                compile_regex_answer(data['answer'])
+            except InvalidAnswerError as error:
+                raise ValidationError(str(error), 'answer')
+
     def make_obj(self, data):
         return AutoCheckQuestion(**data)
 
@@ -377,12 +498,15 @@ class AutoCheckQuestionSchema(QuestionSchema):
             if field in data:
                 setattr(question, field, data[field])
 
+        check_answer(question)
+
 class SingleLineCodeQuestion(Question):
     id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
 
     answer = db.Column(db.String, nullable=False)
     add_body = db.Column(db.Boolean, default=False, nullable=False)
     language = db.Column(db.String, nullable=False)
+    compiled_answer = db.Column(db.String)
 
     __mapper_args__ = {
         'polymorphic_identity': QuestionType.SINGLE_LINE_CODE_QUESTION,
@@ -397,6 +521,14 @@ class SingleLineCodeQuestionSchema(QuestionSchema):
     add_body = fields.Boolean(required=True)
     language = fields.Str(required=True)
 
+    @validates_schema
+    def valid_answer(self, data, **kwargs):
+        if 'answer' in data and 'add_body' in data:
+            try:
+                compile_code_answer(data['answer'], data['add_body'])
+            except InvalidAnswerError as error:
+                raise ValidationError(str(error), 'answer')
+
     def make_obj(self, data):
         return SingleLineCodeQuestion(**data)
 
@@ -407,6 +539,38 @@ class SingleLineCodeQuestionSchema(QuestionSchema):
             if field in data:
                 setattr(question, field, data[field])
 
+        check_answer(question)
+
+
+def update_compiled_answer(mapper, connection, question):
+    """ Updates the compiled answer of an auto-check or single line of code
+    question before it is written to the database. Answers that aren't valid
+    (which forms and schemas reject) are compiled to None so they are graded
+    as incorrect. """
+    previous = question.compiled_answer
+    try:
+        question.compiled_answer = compile_answer(question)
+    except InvalidAnswerError:
+        question.compiled_answer = None
+
+    if question.id is not None and question.compiled_answer != previous:
+        forget_verdicts(mapper, connection, question)
+
+
+def forget_verdicts(mapper, connection, question):
+    """ Removes the persisted verdicts on responses to a question whose
+    answer was changed or that was deleted. """
+    connection.execute(GradedResponse.__table__.delete().where(
+        GradedResponse.question_id == question.id))
+
+
+db.event.listen(AutoCheckQuestion, 'before_insert', update_compiled_answer)
+db.event.listen(AutoCheckQuestion, 'before_update', update_compiled_answer)
+db.event.listen(AutoCheckQuestion, 'after_delete', forget_verdicts)
+db.event.listen(SingleLineCodeQuestion, 'before_insert', update_compiled_answer)
+db.event.listen(SingleLineCodeQuestion, 'before_update', update_compiled_answer)
+db.event.listen(SingleLineCodeQuestion, 'after_delete', forget_verdicts)
+
 
 class MultipleChoiceQuestion(Question):
     id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
@@ -602,11 +766,21 @@ class JumbleBlock(db.Model):
     correct_index = db.Column(db.Integer, nullable=False)
     correct_indent = db.Column(db.Integer, nullable=False)
 
+    def markdown(self, code=None):
+        """ Get the markdown used to display this block's code (or the given
+        code, in place of this block's). """
+        if code is None:
+            code = self.code
+
+        language_str = ""
+        if self.question and self.question.language:
+            language_str = self.question.language
+
+        return f"```{language_str}\n{code}\n```\n"
+
     def html(self):
         """ Get HTML to display this block's code. """
-        language_str = "" if not self.question.language else self.question.language
-        code_str = f"```{language_str}\n{self.code}\n```\n"
-        return markdown_to_html(code_str, code_linenums=False)
+        return markdown_to_html(self.markdown(), code_linenums=False)
 
 
 class JumbleBlockSchema(Schema):
@@ -640,6 +814,15 @@ class Attempt(db.Model):
     interval = db.Column(db.Integer, default=1, nullable=False)
     quality = db.Column(db.Integer, default=-1, nullable=False)
 
+    __table_args__ = (
+        # latest/previous attempt lookups for a user on a specific question
+        db.Index('ix_attempt_user_id_question_id_time', 'user_id', 'question_id', 'time'),
+
+        # a user's attempts in a time range (e.g. today), covering the
+        # columns needed to summarize them by question
+        db.Index('ix_attempt_user_id_time', 'user_id', 'time', 'question_id', 'quality', 'correct'),
+    )
+
     __mapper_args__ = {
         'polymorphic_identity': ResponseType.GENERIC,
         'polymorphic_on': type
@@ -705,8 +888,241 @@ class SelectionAttempt(Attempt):
                                  lazy='dynamic')
 
 
+class ReviewState(db.Model):
+    """ The current SM-2 scheduling state of a question for a user.
+
+    This is a summary of the user's attempt history on the question: the
+    latest next_attempt date along with the e_factor, interval, quality, and
+    time of their most recent attempt. Rows are refreshed whenever attempts
+    are flushed so that scheduling queries can read one row per question
+    instead of aggregating over the whole attempt table. """
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'),
+                            primary_key=True)
+
+    next_attempt = db.Column(db.Date, nullable=False)
+    e_factor = db.Column(db.Float, nullable=False)
+    interval = db.Column(db.Integer, nullable=False)
+    quality = db.Column(db.Integer, nullable=False)
+    last_attempt_time = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<ReviewState: Question {self.question_id} for User {self.user_id}, next attempt {self.next_attempt}>"
+
+    @classmethod
+    def _summarize_attempts(cls, *criteria):
+        """ Returns a SELECT that summarizes attempts (matching the given
+        criteria) into one review state row per user and question. """
+        partition = (Attempt.user_id, Attempt.question_id)
+
+        ranked = db.select(
+            Attempt.user_id,
+            Attempt.question_id,
+            db.func.max(Attempt.next_attempt).over(partition_by=partition).label('next_attempt'),
+            Attempt.e_factor,
+            Attempt.interval,
+            Attempt.quality,
+            Attempt.time,
+            db.func.row_number().over(partition_by=partition,
+                                      order_by=(Attempt.time.desc(), Attempt.id.desc())).label('position')
+        ).where(Attempt.user_id.isnot(None),
+                Attempt.question_id.isnot(None),
+                *criteria).subquery()
+
+        return db.select(ranked.c.user_id, ranked.c.question_id,
+                         ranked.c.next_attempt, ranked.c.e_factor,
+                         ranked.c.interval, ranked.c.quality,
+                         ranked.c.time).where(ranked.c.position == 1)
+
+    @classmethod
+    def _insert_from(cls, summary):
+        columns = ['user_id', 'question_id', 'next_attempt', 'e_factor',
+                   'interval', 'quality', 'last_attempt_time']
+        return cls.__table__.insert().from_select(columns, summary)
+
+    @classmethod
+    def refresh(cls, connection, user_id, question_id):
+        """ Recomputes the review state for the given user and question from
+        their attempts, removing it if there are no attempts left. """
+        connection.execute(cls.__table__.delete().where(
+            cls.user_id == user_id, cls.question_id == question_id))
+
+        connection.execute(cls._insert_from(cls._summarize_attempts(
+            Attempt.user_id == user_id, Attempt.question_id == question_id)))
+
+    @classmethod
+    def rebuild(cls):
+        """ Recomputes the review state of every user and question from the
+        full attempt history. """
+        db.session.execute(cls.__table__.delete())
+        db.session.execute(cls._insert_from(cls._summarize_attempts()))
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """ Refresh the review state of any user/question pair that had an
+        attempt added, updated, or deleted in this flush. """
+        changed = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, Attempt) and obj.user_id and obj.question_id:
+                changed.add((obj.user_id, obj.question_id))
+
+        if changed:
+            connection = session.connection()
+            for user_id, question_id in changed:
+                cls.refresh(connection, user_id, question_id)
+
+
+db.event.listen(db.session, 'after_flush', ReviewState.after_flush)
+
+
+class PracticeQueue(db.Model):
+    """ The questions a user has left to practice today in an assessment.
+
+    The queue is built (in random order) from the assessment's fresh and
+    repeat questions the first time the user trains on the assessment each
+    day (by current_timezone_date, as attempts are scheduled). The next question is then just the first entry in the queue. When an
+    attempt is graded, its question is removed from the user's queues if it
+    got a quality of 4 or more, otherwise it is moved to the back of them to
+    be repeated. """
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'),
+                              primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+
+    entries = db.relationship('PracticeQueueEntry',
+                              primaryjoin=('and_(PracticeQueue.user_id == foreign(PracticeQueueEntry.user_id), '
+                                           'PracticeQueue.assessment_id == foreign(PracticeQueueEntry.assessment_id))'),
+                              order_by='PracticeQueueEntry.position',
+                              lazy='dynamic', viewonly=True)
+
+    def __repr__(self):
+        return f"<PracticeQueue: Assessment {self.assessment_id} for User {self.user_id} on {self.day}>"
+
+    @classmethod
+    def for_today(cls, user, assessment):
+        """ Returns the user's queue for today, building it if necessary. """
+        queue = cls.query.get((user.id, assessment.id))
+        if queue is None:
+            # another request (e.g. after a double click) may have created
+            # the queue since, in which case that one is used
+            db.session.execute(
+                cls.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+                {'user_id': user.id, 'assessment_id': assessment.id, 'day': date.min})
+            queue = cls.query.get((user.id, assessment.id))
+
+        today = current_timezone_date()
+        if queue.day != today:
+            queue.day = today
+            queue.build(assessment.fresh_questions(user), assessment.repeat_questions(user))
+            db.session.commit()
+
+        return queue
+
+    def build(self, fresh_questions, repeat_questions):
+        """ Replaces the entries with the given fresh questions (shuffled),
+        followed by the (shuffled) repeat questions. """
+        entries = PracticeQueueEntry.__table__
+        db.session.execute(entries.delete().where(
+            entries.c.user_id == self.user_id,
+            entries.c.assessment_id == self.assessment_id))
+
+        fresh_ids = [q.id for q in fresh_questions.with_entities(Question.id)]
+        repeat_ids = set(q.id for q in repeat_questions.with_entities(Question.id))
+        repeat_ids = list(repeat_ids.difference(fresh_ids))
+        random.shuffle(fresh_ids)
+        random.shuffle(repeat_ids)
+
+        rows = [{'user_id': self.user_id, 'assessment_id': self.assessment_id,
+                 'question_id': question_id, 'position': position,
+                 'repeat': position >= len(fresh_ids)}
+                for position, question_id in enumerate(fresh_ids + repeat_ids)]
+        if rows:
+            db.session.execute(entries.insert(), rows)
+
+    def next_question(self):
+        """ Returns the question at the front of the queue (or None if there
+        are no more questions to practice today) and whether it is fresh,
+        i.e. not a repeat. Questions that have been removed from the
+        assessment since the queue was built are skipped. """
+        front = db.session.query(Question, PracticeQueueEntry.repeat)\
+                          .join(PracticeQueueEntry, PracticeQueueEntry.question_id == Question.id)\
+                          .join(assessment_questions, db.and_(
+                              assessment_questions.c.question_id == Question.id,
+                              assessment_questions.c.assessment_id == PracticeQueueEntry.assessment_id))\
+                          .filter(PracticeQueueEntry.user_id == self.user_id,
+                                  PracticeQueueEntry.assessment_id == self.assessment_id)\
+                          .order_by(PracticeQueueEntry.position).first()
+
+        if front is None:
+            return None, None
+
+        question, repeat = front
+        return question, not repeat
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """ Update today's queues with the attempts whose quality was set in
+        this flush. """
+        graded = {}
+        for obj in (*session.new, *session.dirty):
+            if isinstance(obj, Attempt) and obj.user_id and obj.question_id \
+                    and obj.quality >= 0 \
+                    and db.inspect(obj).attrs.quality.history.has_changes():
+                graded[(obj.user_id, obj.question_id)] = obj.quality
+
+        if not graded:
+            return
+
+        entries = PracticeQueueEntry.__table__
+        queues = cls.__table__
+        connection = session.connection()
+        for (user_id, question_id), quality in graded.items():
+            todays_entry = db.and_(
+                entries.c.user_id == user_id,
+                entries.c.question_id == question_id,
+                db.select(queues.c.day)
+                  .where(queues.c.user_id == entries.c.user_id,
+                         queues.c.assessment_id == entries.c.assessment_id)
+                  .scalar_subquery() == current_timezone_date())
+
+            if quality >= 4:
+                connection.execute(entries.delete().where(todays_entry))
+            else:
+                others = entries.alias()
+                back = db.select(db.func.max(others.c.position) + 1)\
+                         .where(others.c.user_id == entries.c.user_id,
+                                others.c.assessment_id == entries.c.assessment_id)\
+                         .scalar_subquery()
+                connection.execute(entries.update().where(todays_entry)
+                                          .values(position=back, repeat=True))
+
+
+db.event.listen(db.session, 'after_flush', PracticeQueue.after_flush)
+
+
+class PracticeQueueEntry(db.Model):
+    """ A question in a user's practice queue for an assessment. """
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'),
+                              primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'),
+                            primary_key=True)
+
+    position = db.Column(db.Integer, nullable=False)
+    repeat = db.Column(db.Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        # finding the front of a queue
+        db.Index('ix_practice_queue_entry_queue_position', 'user_id', 'assessment_id', 'position'),
+    )
+
+
 class Course(SearchableMixin, db.Model):
     __searchable__ = ['name', 'title']
+    __versioned__ = True
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), index=True, unique=True, nullable=False)
@@ -745,6 +1161,28 @@ class Course(SearchableMixin, db.Model):
                                     backref='course', lazy='dynamic',
                                     order_by='Assessment.time')
 
+    # read-only views of the dynamic relationships, which (unlike them) can be
+    # eagerly loaded when dumping lists of courses
+    all_textbooks = db.relationship('Textbook',
+                                    secondary=assigned_textbooks,
+                                    primaryjoin=('assigned_textbooks.c.course_id == Course.id'),
+                                    secondaryjoin=('assigned_textbooks.c.textbook_id == Textbook.id'),
+                                    order_by='Textbook.id', viewonly=True)
+
+    all_meetings = db.relationship('ClassMeeting',
+                                   foreign_keys='ClassMeeting.course_id',
+                                   order_by='ClassMeeting.id', viewonly=True)
+
+    all_topics = db.relationship('Topic',
+                                 secondary=course_topics,
+                                 primaryjoin=('course_topics.c.course_id == Course.id'),
+                                 secondaryjoin=('course_topics.c.topic_id == Topic.id'),
+                                 order_by='Topic.id', viewonly=True)
+
+    all_assessments = db.relationship('Assessment',
+                                      foreign_keys='Assessment.course_id',
+                                      order_by='Assessment.time', viewonly=True)
+
     def __repr__(self):
         return f"<Course {self.id}: {self.name} ({self.title})>"
 
@@ -764,79 +1202,80 @@ class Course(SearchableMixin, db.Model):
         """Returns all ClassMeetings that occured before today"""
         return self.meetings.filter(ClassMeeting.date < date.today() )
 
+    def update_roster(self, students, add_drop=False):
+        """ Enrolls the given students in this course, creating users (with
+        unusable passwords) for those that don't exist yet. Students are
+        given as (email, last name, first name) tuples.
+
+        If add_drop is set, students (i.e. non-instructors) who are enrolled
+        but aren't given are dropped from the course.
+
+        Rather than going through the ORM one student at a time, this uses a
+        fixed number of queries (and bulk inserts) regardless of the number
+        of students. Returns the emails of the students that were created,
+        enrolled, already enrolled, and dropped. Changes aren't committed. """
+        names = {}
+        for email, last_name, first_name in students:
+            names.setdefault(email, (last_name, first_name))
+
+        user_ids = dict(db.session.execute(
+            db.select(User.email, User.id).where(User.email.in_(names))).all())
+
+        created = [email for email in names if email not in user_ids]
+        if created:
+            db.session.execute(User.__table__.insert(), [
+                {'email': email, 'last_name': names[email][0],
+                 'first_name': names[email][1], 'instructor': False,
+                 'admin': False, 'password_hash': User.UNUSABLE_PASSWORD}
+                for email in created])
+            user_ids.update(db.session.execute(
+                db.select(User.email, User.id).where(User.email.in_(created))).all())
+
+        enrolled = dict(db.session.execute(
+            db.select(User.id, User.instructor)
+              .join(enrollments, enrollments.c.user_id == User.id)
+              .where(enrollments.c.course_id == self.id)).all())
+
+        added = [email for email in names if user_ids[email] not in enrolled]
+        already_enrolled = [email for email in names if user_ids[email] in enrolled]
+        if added:
+            db.session.execute(enrollments.insert(), [
+                {'course_id': self.id, 'user_id': user_ids[email]} for email in added])
+            User.identities_changed(db.session, [user_ids[email] for email in added])
+
+        dropped = []
+        if add_drop:
+            dropped_ids = {user_id for user_id, instructor in enrolled.items()
+                           if not instructor} - set(user_ids.values())
+            if dropped_ids:
+                dropped = db.session.execute(
+                    db.select(User.email).where(User.id.in_(dropped_ids))).scalars().all()
+                db.session.execute(enrollments.delete().where(db.and_(
+                    enrollments.c.course_id == self.id,
+                    enrollments.c.user_id.in_(dropped_ids))))
+                User.identities_changed(db.session, dropped_ids)
+
+        return created, added, already_enrolled, dropped
+
+    def statistics(self, assessment):
+        """ Returns the AssessmentStatistics for the given assessment in this
+        course. """
+        return AssessmentStatistics(self, assessment)
+
     def star_rating(self, objective, assessment):
         """ Returns the number of full stars based on the average e_factor of that objective """
-        average = 0 
-
-        for user in self.users:
-            average = average + objective.get_e_factor_average(user, assessment)
-
-        if self.users.count() == 0 or average == 0:
-            return 0
-        else:
-            rating = average / self.users.count() # average of all the user's average e_factors
-            full = 0
-            if rating < 2:
-                full = 1  
-            elif rating < 3:
-                full = 2 
-            elif rating < 5:
-                full = 3 
-            elif rating < 7:
-                full = 4
-            else:
-                full = 5 
-        
-        return full
+        return self.statistics(assessment).star_rating(objective)
 
     def questions_remaining_breakdown(self, assessment):
         """ Returns a tuple containing the breakdown of how many questions are
         remaining for all users in the given assessment for this course. """
-
-        zero = 0
-        very_little = 0
-        little = 0
-        some = 0
-        lots = 0
-
-        for user in self.users:
-            questions_remaining = assessment.fresh_questions(user).count() + assessment.repeat_questions(user).count()
-            if questions_remaining == 0:
-                zero += 1
-
-            elif questions_remaining < 3:
-                very_little += 1
-
-            elif questions_remaining < 6:
-                little += 1
-
-            elif questions_remaining < 11:
-                some += 1
-
-            else:
-                lots += 1
-
-        return (zero, very_little, little, some, lots)
+        return self.statistics(assessment).questions_remaining_breakdown()
 
     def student_skill_breakdown(self, objective, assessment):
         """ Returns the number of users in this course with various levels of
         profiency (provificient, limited, undeveloped) for the given
         assessment and learning objective. """
-
-        proficient_count = 0
-        limited_count = 0
-        undeveloped_count = 0
-
-        for user in self.users:
-            user_ave = objective.get_e_factor_average(user, assessment)
-            if user_ave < 3:
-                undeveloped_count += 1
-            elif user_ave < 4:
-                limited_count += 1
-            else:
-                proficient_count += 1
-
-        return (proficient_count, limited_count, undeveloped_count)
+        return self.statistics(assessment).skill_breakdown(objective)
 
 
 class CourseSchema(Schema):
@@ -854,16 +1293,16 @@ class CourseSchema(Schema):
                         dump_only=True)
     meetings = fields.List(fields.Nested('ClassMeetingSchema',
                                           only=('id', 'title')),
-                           dump_only=True)
+                           attribute='all_meetings', dump_only=True)
     topics = fields.List(fields.Nested("TopicSchema",
                                        only=('id', 'text')),
-                         dump_only=True)
+                         attribute='all_topics', dump_only=True)
     textbooks = fields.List(fields.Nested("TextbookSchema",
                                           only=("id", "title", "edition")),
-                            dump_only=True)
+                            attribute='all_textbooks', dump_only=True)
     assessments = fields.List(fields.Nested("AssessmentSchema",
                                             only=("id", "title")),
-                              dump_only=True)
+                              attribute='all_assessments', dump_only=True)
 
     @validates("name")
     def unique_name(self, course_name):
@@ -903,10 +1342,23 @@ class User(UserMixin, db.Model):
     def get_id(self):
         return self.id
 
+    # password_hash of users who can't log in with a password until they
+    # reset it (e.g. students imported from a roster), which saves hashing a
+    # random password for each of them
+    UNUSABLE_PASSWORD = "!"
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
+    def set_unusable_password(self):
+        self.password_hash = User.UNUSABLE_PASSWORD
+
+    def has_usable_password(self):
+        return self.password_hash != User.UNUSABLE_PASSWORD
+
     def check_password(self, password):
+        if not self.has_usable_password():
+            return False
         return check_password_hash(self.password_hash, password)
 
     @staticmethod
@@ -950,6 +1402,48 @@ class User(UserMixin, db.Model):
             db.func.max(Attempt.next_attempt).label('latest_next_attempt_time')
         ).group_by(Attempt.question_id).filter(Attempt.user_id == self.id)
 
+    @staticmethod
+    def identities_changed(session, user_ids):
+        """ Marks the users' cached identities (see IdentityCache) to be
+        forgotten when the session is committed, for changes that don't go
+        through the ORM (e.g. bulk enrollments). """
+        session.info.setdefault('identities_changed', set()).update(user_ids)
+
+    @classmethod
+    def before_flush(cls, session, flush_context, instances):
+        """ Members of courses that are being deleted, whose enrollments are
+        deleted along with the course (so their users aren't changed). """
+        course_ids = [obj.id for obj in session.deleted if isinstance(obj, Course)]
+        if course_ids:
+            cls.identities_changed(session, session.execute(
+                db.select(enrollments.c.user_id)
+                  .where(enrollments.c.course_id.in_(course_ids))).scalars().all())
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """ Users whose columns or enrollments changed (enrolling changes both
+        the course's users and the user's courses). """
+        user_ids = [obj.id for obj in (*session.new, *session.dirty, *session.deleted)
+                    if isinstance(obj, cls)]
+        if user_ids:
+            cls.identities_changed(session, user_ids)
+
+    @classmethod
+    def after_commit(cls, session):
+        user_ids = session.info.pop('identities_changed', None)
+        if user_ids:
+            identities.forget(user_ids)
+
+    @classmethod
+    def after_rollback(cls, session):
+        session.info.pop('identities_changed', None)
+
+
+db.event.listen(db.session, 'before_flush', User.before_flush)
+db.event.listen(db.session, 'after_flush', User.after_flush)
+db.event.listen(db.session, 'after_commit', User.after_commit)
+db.event.listen(db.session, 'after_rollback', User.after_rollback)
+
 
 class UserSchema(Schema):
     class Meta:
@@ -985,6 +1479,8 @@ class UserSchema(Schema):
 
 class Objective(SearchableMixin, db.Model):
     __searchable__ = ['description']
+    __filterable__ = ['author_id', 'public', 'topic_id']
+    __versioned__ = True
 
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), index=True, unique=True)
@@ -997,6 +1493,12 @@ class Objective(SearchableMixin, db.Model):
                                 foreign_keys='Question.objective_id',
                                 backref='objective', lazy='dynamic')
 
+    # read-only view of questions, which can be eagerly loaded when dumping
+    # lists of objectives
+    all_questions = db.relationship('Question',
+                                    foreign_keys='Question.objective_id',
+                                    order_by='Question.id', viewonly=True)
+
     def __repr__(self):
         return f"<Objective {self.id}: {self.description}>"
 
@@ -1075,7 +1577,7 @@ class LearningObjectiveSchema(Schema):
 
     questions = fields.List(fields.Nested(QuestionSchema,
                                           only=('id', 'prompt')),
-                            dump_only=True)
+                            attribute='all_questions', dump_only=True)
 
     @validates("description")
     def unique_description(self, description):
@@ -1092,6 +1594,8 @@ class LearningObjectiveSchema(Schema):
 
 
 class Source(db.Model):
+    __versioned__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.Enum(SourceType), nullable=False)
 
@@ -1106,6 +1610,14 @@ class Source(db.Model):
                                  backref=db.backref('sources', lazy='dynamic'),
                                  lazy='dynamic')
 
+    # read-only view of the topics backref, which can be eagerly loaded when
+    # dumping lists of sources (e.g. the sections of textbooks)
+    all_topics = db.relationship('Topic',
+                                 secondary=topic_sources,
+                                 primaryjoin=('topic_sources.c.source_id == Source.id'),
+                                 secondaryjoin=('topic_sources.c.topic_id == Topic.id'),
+                                 order_by='Topic.text', viewonly=True)
+
     __mapper_args__ = {
         'polymorphic_identity': SourceType.GENERIC,
         'polymorphic_on': type
@@ -1129,7 +1641,7 @@ class SourceSchema(Schema):
 
     topics = fields.List(fields.Nested(TopicSchema,
                                        only=('id', 'text')),
-                            dump_only=True)
+                            attribute='all_topics', dump_only=True)
 
     def get_type(self, obj):
         return obj.type.value
@@ -1143,6 +1655,7 @@ class SourceSchema(Schema):
 
 class Textbook(SearchableMixin, db.Model):
     __searchable__ = ['title', 'authors']
+    __versioned__ = True
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -1161,6 +1674,12 @@ class Textbook(SearchableMixin, db.Model):
                                 foreign_keys='TextbookSection.textbook_id',
                                 backref='textbook', lazy='dynamic')
 
+    # read-only view of sections, which can be eagerly loaded when dumping
+    # lists of textbooks
+    all_sections = db.relationship('TextbookSection',
+                                   foreign_keys='TextbookSection.textbook_id',
+                                   order_by='TextbookSection.id', viewonly=True)
+
     def __repr__(self):
         return f"<Textbook {self.id}: '{self.title}' by {self.authors}>"
 
@@ -1180,7 +1699,7 @@ class TextbookSchema(Schema):
 
     sections = fields.List(fields.Nested("TextbookSectionSchema",
                                          only=('id', 'number', 'title', 'topics')),
-                           dump_only=True)
+                           attribute='all_sections', dump_only=True)
 
 
 class TextbookSection(Source):
@@ -1238,6 +1757,8 @@ class ClassMeetingSchema(SourceSchema):
 
 
 class Assessment(db.Model):
+    __versioned__ = True
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(50), index=True, nullable=False)
     description = db.Column(db.String, index=True)
@@ -1270,42 +1791,38 @@ class Assessment(db.Model):
         return f"<Assessment {self.id}: {self.description} at {str(self.time)}>"
 
 
+    def _review_states(self, user):
+        """ Returns assessment questions joined (outer) with the given user's
+        review state for each of them. """
+        return self.questions.outerjoin(
+            ReviewState, db.and_(ReviewState.question_id == Question.id,
+                                 ReviewState.user_id == user.id))
+
     def unattempted_questions(self, user):
         """ Returns all questions that don't have an attempt by the given user. """
-        return self.questions.filter(~ Question.attempts.any(Attempt.user_id == user.id))
+        return self._review_states(user).filter(ReviewState.question_id == None)
 
     def due_questions(self, user):
         """ Returns all assessment questions whose latest next_attempt for the
         given user is today."""
-
-        latest_next_attempts = user.latest_next_attempts().subquery()
-
-        return self.questions.join(
-            latest_next_attempts, db.and_(Question.id == latest_next_attempts.c.question_id,
-                                          latest_next_attempts.c.latest_next_attempt_time == date.today()))
+        return self._review_states(user).filter(ReviewState.next_attempt == date.today())
 
     def overdue_questions(self, user):
         """ Returns all assessment questions whose latest next_attempt for the
         given user was before today."""
-        latest_next_attempts = user.latest_next_attempts().subquery()
-
-        return self.questions.join(
-            latest_next_attempts, db.and_(Question.id == latest_next_attempts.c.question_id,
-                                          latest_next_attempts.c.latest_next_attempt_time < date.today()))
+        return self._review_states(user).filter(ReviewState.next_attempt < date.today())
 
     def waiting_questions(self, user):
         """ Returns all assessment questions whose latest next_attempt for the
         given user is after today (i.e. don't need any practice now)."""
-        latest_next_attempts = user.latest_next_attempts().subquery()
-
-        return self.questions.join(
-            latest_next_attempts, db.and_(Question.id == latest_next_attempts.c.question_id,
-                                          latest_next_attempts.c.latest_next_attempt_time > date.today()))
+        return self._review_states(user).filter(ReviewState.next_attempt > date.today())
 
     def fresh_questions(self, user):
         """ Returns all "fresh" assessment questions, where fresh is defined as needing
         to be practiced by the user for the FIRST time today. """
-        return self.unattempted_questions(user).union(self.due_questions(user)).union(self.overdue_questions(user))
+        return self._review_states(user).filter(
+            db.or_(ReviewState.question_id == None,
+                   ReviewState.next_attempt <= date.today()))
 
     def repeat_questions(self, user):
         """ Returns all assessment questions that the user has already attempted today
@@ -1403,6 +1920,29 @@ class Assessment(db.Model):
             return lo_review_sorted[0:max_num_objectives]
 
 
+    def progress_report(self, course, max_num_objectives=3, average_threshold=2.6):
+        """
+        Returns the progress of every student in the given course on this
+        assessment as a list of (user, number of questions to practice,
+        objectives to review) tuples, where the objectives to review are in
+        the same form as returned by objectives_to_review.
+
+        This computes the report for all students at once, using a constant
+        number of queries rather than a few per student.
+        """
+        statistics = course.statistics(self)
+        objectives = self.objectives.all()
+        students = course.users.filter_by(instructor=False)\
+                               .order_by(User.last_name, User.first_name)
+
+        return [(user,
+                 statistics.questions_remaining(user.id),
+                 statistics.objectives_to_review(user.id, objectives,
+                                                 max_num_objectives,
+                                                 average_threshold))
+                for user in students]
+
+
 class AssessmentSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(required=True)
@@ -1422,5 +1962,200 @@ class AssessmentSchema(Schema):
                              dump_only=True)
 
 
-from app.user_views import markdown_to_html
+class RenderedMarkdown(db.Model):
+    """ Persisted html for the markdown in question prompts, answer options,
+    and jumble blocks, keyed by the content_digest of the markdown. """
+
+    digest = db.Column(db.String(64), primary_key=True)
+    html = db.Column(db.String, nullable=False)
+
+    # (model, attribute, function mapping the attribute's value to the
+    # arguments used to render it)
+    sources = [
+        (Question, 'prompt', lambda question, prompt: (prompt, True)),
+        (AnswerOption, 'text', lambda option, text: (text, True)),
+        (JumbleBlock, 'code', lambda block, code: (block.markdown(code), False)),
+    ]
+
+    @classmethod
+    def lookup(cls, digest):
+        """ Returns the persisted html for the given digest (or None if it
+        hasn't been rendered). """
+        return db.session.execute(
+            db.select(cls.html).where(cls.digest == digest)).scalar()
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        """ Renders the markdown of any prompts, options, or jumble blocks
+        that were added or changed in this flush, removing the html for
+        their previous (or deleted) content unless something else (e.g.
+        another question's "True" option) still has the same content. """
+        if not persistence_enabled():
+            return
+
+        stale = {}
+        fresh = {}
+
+        for model, attr, markdown_args in cls.sources:
+            for obj in (*session.new, *session.dirty, *session.deleted):
+                if not isinstance(obj, model):
+                    continue
+
+                history = db.inspect(obj).attrs[attr].history
+                removed = list(history.deleted)
+                added = list(history.added)
+                if obj in session.deleted:
+                    removed += list(history.unchanged)
+                    added = []
+
+                for text in removed:
+                    if text is not None:
+                        stale[content_digest(*markdown_args(obj, text))] = text
+
+                for text in added:
+                    if text is not None:
+                        args = markdown_args(obj, text)
+                        fresh[content_digest(*args)] = args
+
+        stale = stale.keys() - fresh.keys() - cls.in_use(session, set(stale.values()))
+        for digest in stale:
+            rendering_cache.discard(digest)
+
+        connection = session.connection()
+        if stale:
+            connection.execute(cls.__table__.delete().where(cls.digest.in_(stale)))
+
+        if fresh:
+            connection.execute(
+                cls.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+                [{'digest': digest, 'html': render_markdown(*args)}
+                 for digest, args in fresh.items()])
+
+    @classmethod
+    def in_use(cls, session, texts):
+        """ Returns the digests of the markdown of the prompts, options, and
+        jumble blocks (as they are after the flush) with any of the given
+        texts. """
+        digests = set()
+        if not texts:
+            return digests
+
+        with session.no_autoflush:
+            for model, attr, markdown_args in cls.sources:
+                column = getattr(model, attr)
+                for obj in session.query(model).filter(column.in_(texts)):
+                    digests.add(content_digest(*markdown_args(obj, getattr(obj, attr))))
+
+        return digests
+
+
+db.event.listen(db.session, 'after_flush', RenderedMarkdown.after_flush)
+
+
+class GradedResponse(db.Model):
+    """ Persisted verdicts on responses to auto-graded questions, keyed by
+    their grading.verdict_digest, which are shared by all of the app's
+    workers. """
+
+    digest = db.Column(db.String(64), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'),
+                            nullable=False, index=True)
+    correct = db.Column(db.Boolean, nullable=False)
+
+    @classmethod
+    def lookup(cls, digest):
+        """ Returns the persisted verdict for the given digest (or None if
+        the response hasn't been graded). """
+        return db.session.execute(
+            db.select(cls.correct).where(cls.digest == digest)).scalar()
+
+    @classmethod
+    def store(cls, digest, question_id, correct):
+        # another worker may have graded the same response in the meantime
+        db.session.execute(
+            cls.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+            {'digest': digest, 'question_id': question_id, 'correct': correct})
+
+
+class ResourceVersion(db.Model):
+    """ Change counters for versioned models (those with __versioned__ set),
+    which let read APIs tell whether their responses have changed without
+    loading them.
+
+    Each flush bumps the counter for every table of a changed object (e.g.
+    'question' and 'short_answer_question') and the counter for the object
+    itself, named after its base table and id (e.g. 'question:3'). Changes to
+    an object's relationships (e.g. adding a topic to a course) count as
+    changes to the object. """
+
+    name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    modified = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def object_name(model, obj_id):
+        return f"{db.inspect(model).base_mapper.local_table.name}:{obj_id}"
+
+    @staticmethod
+    def table_names(model):
+        return [table.name for table in db.inspect(model).tables]
+
+    @classmethod
+    def current(cls, names):
+        """ Returns the (version, modified) of each of the named counters,
+        with (0, None) for those that have never been bumped. """
+        rows = db.session.execute(
+            db.select(cls.name, cls.version, cls.modified).where(cls.name.in_(names)))
+        versions = {name: (version, modified) for name, version, modified in rows}
+        return [versions.get(name, (0, None)) for name in names]
+
+    @classmethod
+    def changed_names(cls, model, obj_ids):
+        """ Returns the names of the counters that are bumped when the objects
+        of model with the given ids change (or an empty list if the model
+        isn't versioned). """
+        if not getattr(model, '__versioned__', False):
+            return []
+        return cls.table_names(model) + [cls.object_name(model, obj_id) for obj_id in obj_ids]
+
+    @classmethod
+    def bump(cls, connection, names):
+        """ Bumps the named counters, for changes that don't go through the
+        ORM (e.g. bulk inserts). """
+        if not names:
+            return
+
+        now = datetime.utcnow()
+        connection.execute(
+            cls.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite'),
+            [{'name': name, 'version': 0, 'modified': now} for name in names])
+        connection.execute(cls.__table__.update()
+                                        .where(cls.name.in_(names))
+                                        .values(version=cls.version + 1, modified=now))
+
+    @classmethod
+    def after_flush(cls, session, flush_context):
+        names = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if not getattr(obj, '__versioned__', False):
+                continue
+            elif obj in session.dirty and not session.is_modified(obj):
+                continue
+
+            names.update(cls.changed_names(type(obj), [obj.id]))
+
+        cls.bump(session.connection(), names)
+
+
+db.event.listen(db.session, 'after_flush', ResourceVersion.after_flush)
 
+
+from app.rendering import (
+    markdown_to_html, render_markdown, content_digest, persistence_enabled,
+    cache as rendering_cache
+)
+from app.statistics import AssessmentStatistics
+from app.grading import (
+    compile_answer, compile_code_answer, compile_regex_answer, InvalidAnswerError
+)
+from app.auth import identities
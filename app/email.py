@@ -1,22 +1,233 @@
+"""
+Sending emails, which is done off of the request threads.
+
+Messages are put on a bounded queue and sent by a small pool of worker
+threads. Each worker keeps its SMTP connection open while there are messages
+waiting, so a burst of emails (e.g. password resets at the start of a
+semester) is sent over a few connections instead of one per message, and
+messages that fail because of a temporary problem are retried with
+exponential backoff.
+"""
+
+import queue
+import smtplib
+import threading
+import weakref
+
 from flask import current_app
 from flask_mail import Message
-from threading import Thread
-
 from app import mail
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+def is_transient(error):
+    """ Returns whether sending might succeed if tried again later (e.g. the
+    server was unavailable), rather than the message being rejected. """
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+class MailQueue(object):
+    """ Sends messages from a bounded queue using a pool of worker threads,
+    which are started when the first message is queued.
+
+    Each worker reuses its connection for the messages that are waiting and
+    closes it once it has been idle for idle_timeout seconds. When the queue
+    is full, send() drops the message right away rather than making the
+    request wait for room, which is counted in `rejected`, along with the
+    most messages that were ever waiting (`max_backlog`).
+
+    These counters are logged (see stats) when the queue fills up past
+    warn_backlog messages, when it catches up again, when a message is
+    dropped, and when the workers are stopped. """
+
+    def __init__(self, app, workers=2, max_size=1000, idle_timeout=5,
+                 max_attempts=5, retry_backoff=1, max_backoff=60,
+                 warn_backlog=None):
+        # the workers only hold on to the app while sending, so the queue
+        # doesn't keep it alive
+        self._app = weakref.ref(app)
+        self.logger = app.logger
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.warn_backlog = warn_backlog or max(1, max_size // 2)
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections = 0
+        self.rejected = 0
+        self.max_backlog = 0
+
+        self._queue = queue.Queue(max_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._backed_up = False
+
+    @property
+    def backlog(self):
+        """ The number of messages waiting to be sent. """
+        return self._queue.qsize()
+
+    def stats(self):
+        """ Returns a summary of the counters, for logging. """
+        return (f"{self.backlog} waiting, {self.sent} sent, {self.failed} failed, "
+                f"{self.retries} retries, {self.rejected} dropped, "
+                f"at most {self.max_backlog} waiting")
+
+    def start(self):
+        """ Starts the worker threads (if they haven't been started yet). """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"mail-worker-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """ Stops the workers once they have sent the messages that are
+        waiting (or are given up on after timeout seconds). """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+
+        for _ in threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        self._stop.set()
+        for thread in threads:
+            thread.join(timeout)
+        self.logger.info(f"Mail queue stopped: {self.stats()}")
+
+    def join(self):
+        """ Waits until every queued message has been sent (or failed). """
+        self._queue.join()
+
+    def send(self, msg):
+        """ Queues the message to be sent by one of the workers. Returns
+        whether it was queued. """
+        self.start()
+
+        try:
+            self._queue.put_nowait(msg)
+        except queue.Full:
+            self.rejected += 1
+            self.logger.error(f"Mail queue is full: dropped message to {msg.recipients} "
+                              f"({self.stats()})")
+            return False
+
+        backlog = self._queue.qsize()
+        self.max_backlog = max(self.max_backlog, backlog)
+        if backlog >= self.warn_backlog and not self._backed_up:
+            self._backed_up = True
+            self.logger.warning(f"Mail queue is backing up: {self.stats()}")
+        return True
+
+    def backoff(self, attempts):
+        """ Returns how long to wait before the given retry attempt. """
+        return min(self.retry_backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                msg = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection = self._disconnect(connection)
+                continue
+
+            if msg is None:
+                self._disconnect(connection)
+                self._queue.task_done()
+                return
+
+            try:
+                connection = self._send(connection, msg)
+                if self._backed_up and self._queue.empty():
+                    self._backed_up = False
+                    self.logger.info(f"Mail queue has caught up: {self.stats()}")
+            finally:
+                self._queue.task_done()
+
+    def _send(self, connection, msg):
+        """ Delivers the message in the app's context (see _deliver). """
+        app = self._app()
+        if app is None:
+            self.failed += 1
+            self.logger.error(f"Could not send email to {msg.recipients}: the app is gone")
+            return self._disconnect(connection)
+
+        with app.app_context():
+            return self._deliver(connection, msg)
+
+    def _deliver(self, connection, msg):
+        """ Sends the message (connecting first if necessary), retrying on a
+        new connection if it fails. Returns the connection to use next. """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if connection is None:
+                    connection = mail.connect().__enter__()
+                    self.connections += 1
+                connection.send(msg)
+                self.sent += 1
+                return connection
+            except Exception as e:
+                connection = self._disconnect(connection)
+                if not is_transient(e) or attempt == self.max_attempts:
+                    self.failed += 1
+                    self.logger.exception(f"Could not send email to {msg.recipients}")
+                    return None
+
+                self.retries += 1
+                self._stop.wait(self.backoff(attempt))
+
+    def _disconnect(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass # the server may have already closed the connection
+        return None
 
 
 def send_email(subject, sender, recipients, text_body, html_body, sync=False):
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    if sync:
+    if sync or current_app.mail_queue is None:
         mail.send(msg)
     else:
-        Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
+        current_app.mail_queue.send(msg)
+
+
+def init_app(app):
+    """ Sets up the queue that emails are sent from, unless MAIL_WORKERS is 0
+    (in which case emails are sent right away). """
+    workers = app.config.get('MAIL_WORKERS', 2)
+    if not workers:
+        app.mail_queue = None
+        return
 
+    app.mail_queue = MailQueue(
+        app, workers=workers,
+        max_size=app.config.get('MAIL_QUEUE_SIZE', 1000),
+        idle_timeout=app.config.get('MAIL_IDLE_TIMEOUT', 5),
+        max_attempts=app.config.get('MAIL_MAX_ATTEMPTS', 5),
+        retry_backoff=app.config.get('MAIL_RETRY_BACKOFF', 1),
+        warn_backlog=app.config.get('MAIL_QUEUE_WARN_SIZE'))
 
+    # stopped (once the waiting messages are sent) at exit, or if the app is
+    # garbage collected before then
+    app.mail_finalizer = weakref.finalize(app, app.mail_queue.stop,
+                                          app.config.get('MAIL_STOP_TIMEOUT', 30))
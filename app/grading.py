@@ -0,0 +1,539 @@
+"""
+Grading of automatically checked questions.
+
+Each auto-check and single line of code question stores a compiled version of
+its answer (see compile_answer), computed when the question is saved, so that
+grading a response doesn't need to parse or validate the answer again.
+
+Students tend to submit the same few responses to a question, so verdicts are
+also cached (see VerdictCache), keyed by the question, its compiled answer,
+and the response. Editing the answer changes the key, so verdicts for the old
+answer are never used.
+
+Past attempts can be graded again, e.g. after fixing an answer or changing
+ast_solver, with 'flask grading regrade' (see regrade).
+"""
+
+import click
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from re import _parser as sre_parse # Python 3.11+
+except ImportError:
+    import sre_parse
+
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import bindparam
+
+from app import db, ast_solver
+
+
+grading_cli = AppGroup('grading')
+
+@grading_cli.command('regrade')
+@click.option("--question", "question_ids", type=int, multiple=True,
+              help="Only regrade attempts on this question (may be repeated).")
+@click.option("--chunk-size", default=2000, help="Number of attempts graded at a time.")
+@click.option("--workers", type=int, default=None,
+              help="Number of grading processes (0 grades in this process).")
+@with_appcontext
+def regrade_all(question_ids, chunk_size, workers):
+    """ Grades past attempts on auto-graded questions again, fixing the ones
+    whose verdict changed. """
+    if workers is None:
+        workers = current_app.config.get('GRADING_REGRADE_WORKERS', 4)
+
+    graded, changed = regrade(question_ids or None, chunk_size=chunk_size,
+                              workers=workers, report=click.echo)
+    click.echo(f"Regraded {graded} attempts: {changed} verdicts changed.")
+
+
+class InvalidAnswerError(ValueError):
+    """ Raised when a question's answer can't be compiled. """
+    pass
+
+
+def code_with_body(code, add_body):
+    code = code.strip()
+    if add_body:
+        code += "\n\tpass"
+    return code
+
+
+def compile_code_answer(answer, add_body=False):
+    """ Returns the hash of the canonical form of a single line of code
+    answer. """
+    try:
+        return ast_solver.code_hash(code_with_body(answer, add_body))
+    except (SyntaxError, ValueError):
+        raise InvalidAnswerError("Invalid line of code.")
+    except ast_solver.UnsupportedSyntaxError:
+        raise InvalidAnswerError("Line of code is not supported yet by the program.")
+
+
+REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+CHARACTERS = (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN)
+ZERO_WIDTH = (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT)
+
+CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: re.compile(r'\d'),
+    sre_parse.CATEGORY_NOT_DIGIT: re.compile(r'\D'),
+    sre_parse.CATEGORY_SPACE: re.compile(r'\s'),
+    sre_parse.CATEGORY_NOT_SPACE: re.compile(r'\S'),
+    sre_parse.CATEGORY_WORD: re.compile(r'\w'),
+    sre_parse.CATEGORY_NOT_WORD: re.compile(r'\W'),
+}
+
+# characters tried when checking whether two sets of characters overlap,
+# along with the literals and range bounds in the sets themselves
+SAMPLE_CHARACTERS = [chr(i) for i in range(128)] + ['\u00e9', '\u00b2', '\u0660', '\u2003', '\u4e00']
+
+
+def _flatten(items):
+    """ Returns the parsed items with groups replaced by their contents. """
+    flat = []
+    for op, args in items:
+        if op == sre_parse.SUBPATTERN:
+            flat += _flatten(args[-1])
+        else:
+            flat.append((op, args))
+    return flat
+
+
+def _first(items):
+    """ Returns the matchers (LITERAL, NOT_LITERAL, ANY or IN items) for the
+    characters that items can start with, and whether items can match the
+    empty string. """
+    first = []
+    for op, args in _flatten(items):
+        if op in CHARACTERS:
+            first.append((op, args))
+            return first, False
+        elif op in REPEATS:
+            body, empty = _first(args[2])
+            first += body
+            if args[0] > 0 and not empty:
+                return first, False
+        elif op == sre_parse.BRANCH:
+            empty = False
+            for alternative in args[1]:
+                body, alternative_empty = _first(alternative)
+                first += body
+                empty = empty or alternative_empty
+            if not empty:
+                return first, False
+        elif op not in ZERO_WIDTH:
+            # e.g. a backreference, which could be anything (or nothing)
+            first.append((sre_parse.ANY, None))
+
+    return first, True
+
+
+def _in_set(item, char):
+    op, args = item
+    if op == sre_parse.LITERAL:
+        return char == chr(args)
+    elif op == sre_parse.RANGE:
+        return args[0] <= ord(char) <= args[1]
+    elif op == sre_parse.CATEGORY and args in CATEGORIES:
+        return CATEGORIES[args].fullmatch(char) is not None
+    return True
+
+
+def _matches(matcher, char):
+    op, args = matcher
+    if op == sre_parse.LITERAL:
+        return char == chr(args)
+    elif op == sre_parse.NOT_LITERAL:
+        return char != chr(args)
+    elif op == sre_parse.IN:
+        negate = bool(args) and args[0][0] == sre_parse.NEGATE
+        return any(_in_set(item, char) for item in args[negate:]) != negate
+    return True
+
+
+def _overlap(first, other, ignore_case):
+    """ Returns True if some character is matched by both lists of
+    matchers. """
+    candidates = set(SAMPLE_CHARACTERS)
+    for op, args in first + other:
+        items = args if op == sre_parse.IN else [(op, args)]
+        for item_op, item_args in items:
+            if item_op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL):
+                candidates.add(chr(item_args))
+            elif item_op == sre_parse.RANGE:
+                candidates.update(map(chr, item_args))
+
+    for char in candidates:
+        variants = {char, char.lower(), char.upper()} if ignore_case else {char}
+        if any(_matches(m, c) for m in first for c in variants) and \
+                any(_matches(m, c) for m in other for c in variants):
+            return True
+
+    return False
+
+
+def _ambiguous(items, follow, ignore_case):
+    """ Returns True if items (flattened), followed by follow, can match the
+    same text in more than one way: a repetition in them could stop where
+    what comes after it could start, or two alternatives of a branch could
+    start with the same character. """
+    for i, (op, args) in enumerate(items):
+        rest = items[i+1:] + follow
+        if op in REPEATS and args[1] > 1:
+            if _overlap(_first(args[2])[0], _first(rest)[0], ignore_case):
+                return True
+
+        elif op == sre_parse.BRANCH:
+            alternatives = [_first(_flatten(alternative) + rest)[0]
+                            for alternative in args[1]]
+            for j, first in enumerate(alternatives):
+                if any(_overlap(first, other, ignore_case) for other in alternatives[:j]):
+                    return True
+
+            if any(_ambiguous(_flatten(alternative), rest, ignore_case)
+                   for alternative in args[1]):
+                return True
+
+    return False
+
+
+def _ambiguous_repeat(pattern, ignore_case):
+    """ Returns True if pattern (as parsed by sre_parse) repeats something
+    that can match the same text in more than one way (e.g. (a+)+, (a|aa)+ or
+    (.*a){12}), which can take exponential time to match. """
+    for op, args in pattern:
+        if op in REPEATS and args[1] > 1:
+            body = _flatten(args[2])
+            if _ambiguous(body, body, ignore_case):
+                return True
+
+        for arg in (args if isinstance(args, (tuple, list)) else [args]):
+            for subpattern in (arg if isinstance(arg, list) else [arg]):
+                if isinstance(subpattern, sre_parse.SubPattern) and \
+                        _ambiguous_repeat(subpattern, ignore_case):
+                    return True
+
+    return False
+
+
+def compile_regex_answer(pattern):
+    """ Checks that pattern is a regular expression that can be matched in a
+    reasonable amount of time, returning the pattern. """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as error:
+        raise InvalidAnswerError(f"Invalid regular expression: {error}.")
+
+    if _ambiguous_repeat(parsed, bool(parsed.state.flags & re.IGNORECASE)):
+        raise InvalidAnswerError("Regular expression repeats something that can match "
+                                 "the same text in more than one way (e.g. (a+)+ or "
+                                 "(a|aa)+), which can be too slow to match.")
+
+    return pattern
+
+
+@functools.lru_cache(maxsize=512)
+def compiled_regex(pattern):
+    return re.compile(pattern)
+
+
+def compile_answer(question):
+    """ Returns the compiled answer of an auto-check or single line of code
+    question, raising an InvalidAnswerError if the answer isn't valid. """
+    if question.type == QuestionType.SINGLE_LINE_CODE_QUESTION:
+        return compile_code_answer(question.answer, question.add_body)
+    elif question.type == QuestionType.AUTO_CHECK:
+        if question.regex:
+            return compile_regex_answer(question.answer)
+        return question.answer
+    else:
+        raise ValueError(f"{question.type} questions can't be graded automatically.")
+
+
+def answer_kind(question):
+    """ Returns how responses to the question are checked against its
+    compiled answer. """
+    if question.type == QuestionType.AUTO_CHECK and question.regex:
+        return 'regex'
+    return question.type.value
+
+
+def check_compiled(kind, answer, add_body, response, max_regex_length):
+    """ Returns whether response is correct given a compiled answer. This
+    doesn't need the question (or the app), so it can be used by the regrade
+    worker processes. """
+    if kind == QuestionType.SINGLE_LINE_CODE_QUESTION.value:
+        try:
+            return ast_solver.code_hash(code_with_body(response, add_body)) == answer
+        except (SyntaxError, ValueError, ast_solver.UnsupportedSyntaxError):
+            return False
+
+    elif kind == 'regex':
+        # bounds the time it takes to match, along with the check for ambiguous
+        # repetition when the answer was compiled
+        if len(response) > max_regex_length:
+            return False
+        return compiled_regex(answer).fullmatch(response) is not None
+
+    else:
+        return response == answer
+
+
+def max_regex_length():
+    return current_app.config.get('REGEX_MAX_RESPONSE_LENGTH', 1000)
+
+
+def check_response(question, answer, response):
+    """ Returns whether response is correct, given the question's compiled
+    answer. """
+    return check_compiled(answer_kind(question), answer,
+                          getattr(question, 'add_body', False), response,
+                          max_regex_length())
+
+
+def verdict_digest(question, answer, response):
+    """ Returns the cache key for the verdict on a response to a question with
+    the given compiled answer. """
+    key = f"{question.id}:{answer_kind(question)}:{len(answer)}:{answer}:{response}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def persistence_enabled():
+    return current_app.config.get('VERDICT_CACHE_PERSIST', False)
+
+
+class VerdictCache(object):
+    """ Thread-safe, bounded LRU cache of verdicts (whether a response is
+    correct), keyed by their verdict_digest.
+
+    If VERDICT_CACHE_PERSIST is set, verdicts are also stored in the
+    graded_response table, which is shared by all of the app's workers, and
+    looked up there when they aren't in memory. """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0 # hits that were found in the graded_response table
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _remember(self, digest, correct):
+        with self._lock:
+            self._entries[digest] = correct
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, digest):
+        """ Returns the cached verdict for the given digest, or None if the
+        response hasn't been graded. """
+        with self._lock:
+            correct = self._entries.get(digest)
+            if correct is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return correct
+
+        if persistence_enabled():
+            correct = GradedResponse.lookup(digest)
+            if correct is not None:
+                self._remember(digest, correct)
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                return correct
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, digest, question_id, correct):
+        self._remember(digest, correct)
+        if persistence_enabled():
+            GradedResponse.store(digest, question_id, correct)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.shared_hits = 0
+
+
+verdicts = VerdictCache()
+
+
+def grade_response(question, response):
+    """ Returns whether the (stripped) response to an auto-check or single
+    line of code question is correct, using the question's compiled answer
+    and the verdicts on previous responses. """
+    answer = question.compiled_answer
+    if answer is None:
+        # answer hasn't been compiled (yet) or isn't valid
+        try:
+            answer = compile_answer(question)
+        except InvalidAnswerError:
+            return False
+
+    digest = verdict_digest(question, answer, response)
+    correct = verdicts.get(digest)
+    if correct is None:
+        correct = check_response(question, answer, response)
+        verdicts.put(digest, question.id, correct)
+
+    return correct
+
+
+# compiled answers (question id -> (kind, answer, add_body)) and settings
+# used by a regrade worker process
+_regrade_answers = {}
+_regrade_max_regex_length = 1000
+
+def _init_regrade_worker(answers, regex_length):
+    global _regrade_answers, _regrade_max_regex_length
+    _regrade_answers = answers
+    _regrade_max_regex_length = regex_length
+
+
+def regrade_attempts(attempts):
+    """ Grades (id, question_id, response, correct) attempts, returning
+    (id, correct) for the ones whose verdict changed. """
+    changed = []
+    for attempt_id, question_id, response, correct in attempts:
+        kind, answer, add_body = _regrade_answers[question_id]
+        verdict = check_compiled(kind, answer, add_body, response.strip(),
+                                 _regrade_max_regex_length)
+        if verdict != correct:
+            changed.append((attempt_id, verdict))
+
+    return changed
+
+
+def stream_attempts(question_ids, chunk_size):
+    """ Yields the text attempts on the given questions, as lists of up to
+    chunk_size (id, question_id, response, correct) tuples. """
+    last_id = 0
+    while True:
+        chunk = db.session.execute(
+            db.select(TextAttempt.id, TextAttempt.question_id,
+                      TextAttempt.response, TextAttempt.correct)
+              .where(TextAttempt.question_id.in_(question_ids),
+                     TextAttempt.id > last_id)
+              .order_by(TextAttempt.id).limit(chunk_size)).all()
+        if not chunk:
+            return
+
+        yield [tuple(row) for row in chunk]
+        last_id = chunk[-1][0]
+
+
+def regrade(question_ids=None, chunk_size=2000, workers=4, report=None):
+    """ Grades the text attempts on auto-graded questions (all of them, or
+    the ones with the given ids) again, updating their correct flags.
+
+    Answers are compiled once, up front, and sent to a pool of worker
+    processes along with chunks of attempts streamed from the database. The
+    attempts whose verdict changed are updated in bulk. Returns the number of
+    attempts graded and the number whose verdict changed. """
+    query = Question.query.filter(Question.type.in_(
+        [QuestionType.AUTO_CHECK, QuestionType.SINGLE_LINE_CODE_QUESTION]))
+    if question_ids is not None:
+        query = query.filter(Question.id.in_(question_ids))
+
+    # recompile the answers, which changes them if ast_solver has changed
+    answers = {}
+    for question in query:
+        try:
+            question.compiled_answer = compile_answer(question)
+        except InvalidAnswerError:
+            question.compiled_answer = None
+            if report:
+                report(f"Question {question.id}: answer is not valid, skipping")
+            continue
+
+        answers[question.id] = (answer_kind(question), question.compiled_answer,
+                                getattr(question, 'add_body', False))
+
+    # persisted verdicts may also be out of date
+    db.session.execute(GradedResponse.__table__.delete().where(
+        GradedResponse.question_id.in_(answers.keys())))
+    db.session.commit()
+
+    update = Attempt.__table__.update()\
+        .where(Attempt.id == bindparam('attempt_id'))\
+        .values(correct=bindparam('verdict'))
+
+    start = time.perf_counter()
+    graded = 0
+    changed = 0
+
+    def save(chunk_size, results):
+        nonlocal graded, changed
+        graded += chunk_size
+        if results:
+            changed += len(results)
+            db.session.execute(update, [{'attempt_id': attempt_id, 'verdict': verdict}
+                                        for attempt_id, verdict in results])
+            db.session.commit()
+
+        if report:
+            rate = graded / max(time.perf_counter() - start, 1e-6)
+            report(f"Regraded {graded} attempts ({rate:.0f} attempts/s), "
+                   f"{changed} verdicts changed")
+
+    chunks = stream_attempts(list(answers), chunk_size)
+    if workers <= 0:
+        _init_regrade_worker(answers, max_regex_length())
+        for attempts in chunks:
+            save(len(attempts), regrade_attempts(attempts))
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_regrade_worker,
+                                 initargs=(answers, max_regex_length())) as pool:
+            pending = {}
+            for attempts in chunks:
+                pending[pool.submit(regrade_attempts, attempts)] = len(attempts)
+
+                # limit how many chunks are waiting in memory
+                if len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        save(pending.pop(future), future.result())
+
+            for future in wait(pending).done:
+                save(pending[future], future.result())
+
+    return graded, changed
+
+
+def init_app(app):
+    """ Sizes the verdict cache based on the app's configuration. """
+    verdicts.resize(app.config.get('VERDICT_CACHE_SIZE', 4096))
+
+
+from app.db_models import (
+    Question, QuestionType, Attempt, TextAttempt, GradedResponse
+)
@@ -21,6 +21,7 @@ from werkzeug.utils import secure_filename
 import os, csv, re, ast
 
 from app import db, ast_solver
+from app.grading import compile_regex_answer, InvalidAnswerError
 from app.user_views import (
     ShortAnswerForm, markdown_to_html, CodeJumbleForm, AutoCheckForm, SingleLineCodeForm,
     MultipleChoiceForm, MultipleSelectionForm
@@ -202,7 +203,7 @@ def add_students_from_roster(course, file_location, email_index,
     Adds students in a given roster file (CSV format) to the specified course.
 
     This will add new Users to the database if the student hasn't been created
-    before.
+    before. All of the changes are made in a single transaction.
     """
     try:
         with open(file_location, newline='', encoding='utf-8-sig') as roster_data:
@@ -219,82 +220,30 @@ def add_students_from_roster(course, file_location, email_index,
                         "danger")
                 return
 
-            new_students = []  # students who are not currently enrolled
-            duplicate_students = []  # students already enrolled
-            students_in_file = []  # all students listed in given file
+            students = [(line[email_index], line[last_name_index], line[first_name_index])
+                        for line in roster_reader]
 
-            initial_roster = course.users.filter_by(instructor=False).all()
-
-            if not initial_roster:
-                initial_roster = []
-
-            for line in roster_reader:
-                email = line[email_index]
-                last_name = line[last_name_index]
-                first_name = line[first_name_index]
-
-                # look for an existing user with that email
-                student_to_add = User.query.filter_by(email=email).first()
-
-                if student_to_add:
-                    # found the student already so no need to create a
-                    # new User object
-                    current_app.logger.debug(f"User with {email} already exists. Skipping creation!")
-                else:
-                    # Create new User and add to database
-                    student_to_add = User(email=email,
-                                          first_name=first_name,
-                                          last_name=last_name,
-                                          instructor=False,
-                                          admin=False)
-
-                    student_to_add.set_password(User.generate_password(20))
-                    db.session.add(student_to_add)
-                    db.session.commit()
-
-                    current_app.logger.info(f"Created student user with email {email}")
-
-                students_in_file.append(student_to_add)
-
-                if student_to_add in course.users:
-                    # student is already enrolled in this course so
-                    # nothing more to do
-                    duplicate_students.append(student_to_add.email)
-                else:
-                    # Add user to this course
-                    new_students.append(student_to_add.email)
-                    course.users.append(student_to_add)
-                    db.session.commit()
-
-                current_app.logger.debug(f"Skipped (Already enrolled): {duplicate_students}")
-                current_app.logger.info(f"Enrolled: {new_students}")
-
-                db.session.commit()
-
-            if add_drop:
-                # Find and remove students who were in the roster before but
-                # weren't part of the roster file.
-                students_to_remove = [s for s in initial_roster
-                                            if s not in students_in_file]
-
-                for student in students_to_remove:
-                    # remove student from course
-                    course.users.remove(student)
-                    current_app.logger.info(f"Removed {student.email} from course {course.id}")
+    except UnicodeError as e:
+        current_app.logger.warning(f"Roster file has incorrect encoding.")
+        flash(f"Roster file has incorrect encoding.", "danger")
+        return
 
-                db.session.commit()
+    created, new_students, duplicate_students, removed_students = \
+        course.update_roster(students, add_drop=add_drop)
+    db.session.commit()
 
-                if len(students_to_remove) > 0:
-                    flash(f"Removed {len(students_to_remove)} students from course.", "warning")
+    current_app.logger.info(f"Created student users: {created}")
+    current_app.logger.debug(f"Skipped (Already enrolled): {duplicate_students}")
+    current_app.logger.info(f"Enrolled: {new_students}")
 
-            if len(new_students) > 0:
-                flash(f"Added {len(new_students)} new students to course.", "info")
-            if len(duplicate_students) > 0:
-                flash(f"Skipped {len(duplicate_students)} who were already enrolled.", "warning")
+    if len(removed_students) > 0:
+        current_app.logger.info(f"Removed {removed_students} from course {course.id}")
+        flash(f"Removed {len(removed_students)} students from course.", "warning")
 
-    except UnicodeError as e:
-        current_app.logger.warning(f"Roster file has incorrect encoding.")
-        flash(f"Roster file has incorrect encoding.", "danger")
+    if len(new_students) > 0:
+        flash(f"Added {len(new_students)} new students to course.", "info")
+    if len(duplicate_students) > 0:
+        flash(f"Skipped {len(duplicate_students)} who were already enrolled.", "warning")
 
 
 
@@ -702,9 +651,13 @@ def assessment_statistics(course_name):
     except AuthorizationError:
         abort(401)
 
+    statistics = {assessment.id: course.statistics(assessment)
+                  for assessment in course.assessments}
+
     return render_template("assessment_statistics.html",
                            page_title="Cadet: Assessment Statistics",
-                           course=course)
+                           course=course,
+                           statistics=statistics)
 
 @instructor.route('/c/<course_name>/mission/<int:mission_id>/stats/progress')
 @login_required
@@ -730,7 +683,8 @@ def user_progress(course_name, mission_id):
     return render_template("user_progress.html",
                            page_title="Cadet: Assessment Statistics",
                            course=course,
-                           assessment=mission)
+                           assessment=mission,
+                           progress=mission.progress_report(course, average_threshold=3.0))
 
 
 
@@ -759,7 +713,8 @@ def assessment_objective_statistics(course_name, mission_id):
     return render_template("assessment_objective_statistics.html",
                            page_title="Cadet: Objective Statistics",
                            course=course,
-                           assessment=mission)
+                           assessment=mission,
+                           statistics=course.statistics(mission))
 
 @instructor.route('/c/<course_name>/mission/<int:mission_id>/objective/<int:objective_id>/stats')
 @login_required
@@ -911,6 +866,13 @@ class NewAutoCheckQuestionForm(FlaskForm):
     regex = BooleanField("Regex")
     submit = SubmitField("Continue...")
 
+    def validate_answer(form, field):
+        if form.regex.data:
+            try:
+                compile_regex_answer(field.data)
+            except InvalidAnswerError as error:
+                raise ValidationError(str(error))
+
 class NewSingleLineCodeQuestionForm(FlaskForm):
     prompt = TextAreaField("Question Prompt", [DataRequired()])
     answer = StringField("Question Answer", [DataRequired()])
@@ -927,8 +889,7 @@ class NewSingleLineCodeQuestionForm(FlaskForm):
             actual+= "\n\tpass"
             
         try:
-            ast.parse(actual)
-            ast_solver.same_ast_tree(actual, actual)
+            ast_solver.code_hash(actual)
             return True
         except SyntaxError:
             self.answer.errors = list(self.answer.errors)
@@ -0,0 +1,205 @@
+"""
+Logging for the app, which is done off of the request threads.
+
+Records logged by the app are put on a queue (which never blocks) and handled
+by a background listener thread that writes them to a rotating log file (in
+batches) and emails error reports as digests, so that neither log volume nor
+a slow or unavailable mail server affects how long requests take.
+"""
+
+import logging
+import logging.handlers
+import queue
+import smtplib
+import sys
+import threading
+import time
+import traceback
+import weakref
+from email.message import EmailMessage
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(filename)s:%(lineno)d - %(funcName)s] : %(message)s'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ Queue handler that drops records (counting them) when the queue is
+    full, rather than blocking or printing an error for each one. """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """ Queue listener that flushes its handlers whenever it has caught up
+    with the queue, so buffered handlers write in batches when busy without
+    holding on to records when idle. """
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+
+class DigestMailHandler(logging.Handler):
+    """ Emails the records it handles as digests, sending at most one email
+    every interval seconds.
+
+    The first record after a quiet period is sent right away, while any that
+    follow are collected (up to max_records, with the rest only counted) and
+    sent together once the interval is up. Emails are sent from a timer
+    thread, so handling a record never waits on the mail server. """
+
+    def __init__(self, mailhost, fromaddr, toaddrs, subject, interval=300,
+                 max_records=50, timeout=10):
+        super().__init__()
+        self.mailhost = mailhost
+        self.fromaddr = fromaddr
+        self.toaddrs = toaddrs
+        self.subject = subject
+        self.interval = interval
+        self.max_records = max_records
+        self.timeout = timeout
+
+        self.sent = 0
+        self._pending = []
+        self._skipped = 0
+        self._last_sent = None
+        self._scheduled = False
+        self._timer = None
+
+    def emit(self, record):
+        # called with self.lock held
+        if len(self._pending) < self.max_records:
+            self._pending.append(self.format(record))
+        else:
+            self._skipped += 1
+
+        if not self._scheduled:
+            delay = 0
+            if self._last_sent is not None:
+                delay = max(0, self._last_sent + self.interval - time.monotonic())
+
+            self._scheduled = True
+            self._timer = threading.Timer(delay, self.send_digest)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def send_digest(self):
+        """ Sends the records collected since the last digest (if any). """
+        with self.lock:
+            records, skipped = self._pending, self._skipped
+            self._pending, self._skipped = [], 0
+            self._scheduled = False
+            self._last_sent = time.monotonic()
+
+        if not records:
+            return
+
+        count = len(records) + skipped
+        message = EmailMessage()
+        message['From'] = self.fromaddr
+        message['To'] = ', '.join(self.toaddrs)
+        message['Subject'] = f"{self.subject} ({count} {'error' if count == 1 else 'errors'})"
+
+        body = "\n\n".join(records)
+        if skipped:
+            body += f"\n\n... and {skipped} more"
+        message.set_content(body)
+
+        try:
+            host, port = self.mailhost
+            with smtplib.SMTP(host, port, timeout=self.timeout) as smtp:
+                smtp.send_message(message)
+            self.sent += 1
+        except Exception:
+            # there's nowhere else to report it
+            traceback.print_exc(file=sys.stderr)
+
+    def close(self):
+        # send anything that's waiting (after any digest being sent)
+        with self.lock:
+            timer = self._timer
+        if timer is not None:
+            timer.cancel()
+            timer.join()
+        self.send_digest()
+
+        super().close()
+
+
+def init_app(app):
+    """ Sets up the app's logger to send its records through a queue to a
+    background thread that writes them to the log file (and emails error
+    reports, if EMAIL_ERRORS is set). """
+    formatter = logging.Formatter(LOG_FORMAT)
+    level = app.config.get('LOGGING_LEVEL', logging.INFO)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        app.config.get('LOG_FILE', 'cadet.log'),
+        maxBytes=app.config.get('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=app.config.get('LOG_FILE_BACKUPS', 5),
+        delay=True)
+    file_handler.setFormatter(formatter)
+
+    # errors are written right away, anything else when the buffer fills up
+    # or the listener catches up
+    buffered_handler = logging.handlers.MemoryHandler(
+        app.config.get('LOG_BUFFER_SIZE', 100), flushLevel=logging.ERROR,
+        target=file_handler)
+    buffered_handler.setLevel(level)
+    handlers = [buffered_handler]
+
+    if app.config.get('EMAIL_ERRORS', False):
+        # email error and critical events to admin(s)
+        mail_handler = DigestMailHandler(
+            mailhost=(app.config['MAIL_SERVER'], app.config.get('MAIL_PORT', 25)),
+            fromaddr=app.config['EMAIL_FROM'],
+            toaddrs=app.config['EMAIL_ERRORS_TO'],
+            subject="SpacedCadet Error Report",
+            interval=app.config.get('ERROR_DIGEST_INTERVAL', 300),
+            max_records=app.config.get('ERROR_DIGEST_MAX_RECORDS', 50))
+        mail_handler.setLevel(logging.ERROR)
+        mail_handler.setFormatter(formatter)
+        handlers.append(mail_handler)
+
+    log_queue = queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000))
+    app.log_handler = DroppingQueueHandler(log_queue)
+    app.logger.addHandler(app.log_handler)
+
+    app.log_listener = BatchingQueueListener(log_queue, *handlers,
+                                             respect_handler_level=True)
+    app.log_listener.start()
+
+    # stopped by stop_logging, or at exit if it wasn't (without keeping the
+    # app alive just to stop its listener)
+    app.log_finalizer = weakref.finalize(app, _stop_listener, app.logger,
+                                         app.log_handler, app.log_listener)
+
+
+def stop_logging(app):
+    """ Stops sending the app's records to the listener, which handles any
+    left on the queue and closes the handlers. Does nothing if the app's
+    logging has already been stopped. """
+    app.log_finalizer()
+
+
+def _stop_listener(logger, queue_handler, listener):
+    # the logger is shared by every app with the same name, so it would
+    # otherwise keep putting records on this queue
+    logger.removeHandler(queue_handler)
+    if listener._thread is not None:
+        listener.stop()
+
+    for handler in listener.handlers:
+        target = getattr(handler, 'target', None)
+        handler.close()
+        if target is not None:
+            target.close()
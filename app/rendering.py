@@ -0,0 +1,140 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+from flask import current_app
+
+
+def create_converter(code_linenums=True):
+    """ Returns a new Markdown converter with the extensions we use. """
+    return markdown.Markdown(extensions=['fenced_code',
+                                         'codehilite',
+                                         'pymdownx.arithmatex'],
+
+                             extension_configs = {
+                                 "pymdownx.arithmatex": {
+                                     "generic": True
+                                 },
+                                 "codehilite": {
+                                     "linenums": code_linenums
+                                 }
+                             })
+
+
+# Setting up the Markdown extensions is expensive, so each thread keeps one
+# preconfigured converter per code_linenums setting and resets it between
+# uses (converters aren't safe to share between threads).
+_converters = threading.local()
+
+def get_converter(code_linenums=True):
+    """ Returns this thread's converter for the given code_linenums setting,
+    creating it if necessary. """
+    pool = getattr(_converters, 'pool', None)
+    if pool is None:
+        pool = _converters.pool = {}
+
+    code_linenums = bool(code_linenums)
+    if code_linenums not in pool:
+        pool[code_linenums] = create_converter(code_linenums)
+
+    return pool[code_linenums]
+
+
+def render_markdown(markdown_text, code_linenums=True):
+    """ Convert markdown text to html, without using any cache. """
+    converter = get_converter(code_linenums)
+    try:
+        return converter.convert(markdown_text)
+    finally:
+        converter.reset()
+
+
+def content_digest(markdown_text, code_linenums=True):
+    """ Returns the cache key for rendering the given markdown text. """
+    key = f"{int(bool(code_linenums))}:{markdown_text}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class MarkdownCache(object):
+    """ Thread-safe, bounded LRU cache of rendered html, keyed by the
+    content_digest of the markdown it was rendered from. """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest):
+        with self._lock:
+            html = self._entries.get(digest)
+            if html is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+            return html
+
+    def put(self, digest, html):
+        with self._lock:
+            self._entries[digest] = html
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+cache = MarkdownCache()
+
+
+def persistence_enabled():
+    return current_app.config.get('MARKDOWN_CACHE_PERSIST', False)
+
+
+def markdown_to_html(markdown_text, code_linenums=True):
+    """ Convert markdown text to html.
+
+    Rendered html is cached in memory and, if MARKDOWN_CACHE_PERSIST is set,
+    looked up in the rendered_markdown table before falling back to
+    rendering it. """
+    digest = content_digest(markdown_text, code_linenums)
+
+    html = cache.get(digest)
+    if html is None:
+        if persistence_enabled():
+            html = RenderedMarkdown.lookup(digest)
+
+        if html is None:
+            html = render_markdown(markdown_text, code_linenums)
+
+        cache.put(digest, html)
+
+    return html
+
+
+def init_app(app):
+    """ Sizes the rendered markdown cache based on the app's configuration. """
+    cache.resize(app.config.get('MARKDOWN_CACHE_SIZE', 2048))
+
+
+from app.db_models import RenderedMarkdown
@@ -1,62 +1,118 @@
 import click
+import functools
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
 
 from flask import current_app
 from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import text, bindparam
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ConnectionError, TransportError
+from elasticsearch.helpers import bulk
 
 
 search_cli = AppGroup('search')
 
 @search_cli.command('reindex')
 @click.option("--analyzer", default="english")
+@click.option("--chunk-size", default=500, help="Number of rows sent per bulk request.")
+@click.option("--workers", type=int, default=None,
+              help="Number of threads sending bulk requests.")
 @with_appcontext
-def reindex_all(analyzer):
-    from app.db_models import SearchableMixin
-    if not current_app.elasticsearch:
-        click.echo("Elasticsearch is not configured and/or running.")
+def reindex_all(analyzer, chunk_size, workers):
+    if not current_app.search_backends:
+        click.echo("No search backend is configured and/or running.")
         return
 
-    for cls in SearchableMixin.__subclasses__():
-        index_name = cls.__tablename__
-        click.echo(f"Reindexing {index_name}, using analyzer '{analyzer}'")
-        cls.reindex(analyzer)
+    if workers is None:
+        workers = current_app.config.get('SEARCH_REINDEX_WORKERS', 4)
 
+    for backend in current_app.search_backends:
+        for cls in searchable_models():
+            click.echo(f"Reindexing {cls.index_name()} ({backend.name}), "
+                       f"using analyzer '{analyzer}'")
+            backend.reindex(cls, analyzer=analyzer, chunk_size=chunk_size,
+                            workers=workers, report=click.echo)
 
-def add_to_index(index, model):
+
+@search_cli.command('drain')
+@click.option("--all", "drain_all", is_flag=True,
+              help="Also send operations that are waiting to be retried.")
+@with_appcontext
+def drain(drain_all):
+    """ Sends all queued index operations to Elasticsearch. """
     if not current_app.elasticsearch:
+        click.echo("Elasticsearch is not configured and/or running.")
         return
 
+    # the background health probe may not have reached it yet
+    if current_app.search_health:
+        current_app.search_health.check()
+
+    if not current_app.search_indexer.breaker.closed:
+        click.echo("Elasticsearch is not available.")
+        return
+
+    sent, failed = current_app.search_indexer.drain(include_delayed=drain_all)
+    click.echo(f"Sent {sent} index operations ({failed} failed and will be retried).")
+
+
+def searchable_models():
+    """ Returns the searchable models, each of which has its own index. """
+    from app.db_models import SearchableMixin
+    return SearchableMixin.__subclasses__()
+
+
+def document(model):
+    """ Returns the search document for the given model, which includes the
+    fields that searches can be filtered on. """
     payload = {}
-    for field in model.__searchable__:
+    for field in model.__searchable__ + model.__filterable__:
         payload[field] = getattr(model, field)
-    current_app.elasticsearch.index(index=index, id=model.id, body=payload)
+    return payload
 
 
-def remove_from_index(index, model):
-    if not current_app.elasticsearch:
-        return
-    current_app.elasticsearch.delete(index=index, id=model.id)
+def write_alias(index):
+    """ Returns the alias that index operations for the given index are sent
+    to. This is normally the same index as searches use, except while the
+    index is being rebuilt. """
+    return f"{index}-write"
 
 
-def clear_index(index, analyzer="english"):
-    """ Clears the contents of the given index. """
-    if not current_app.elasticsearch:
-        return
+def write_targets(index):
+    """ Returns the indices that changes to documents in the given index are
+    written to: its write index and, while it is being rebuilt, also the
+    index that searches still use, so that nothing is lost if the rebuild is
+    abandoned. """
+    targets = indices_for(write_alias(index))
+    targets += [i for i in indices_for(index) if i not in targets]
+    return targets or [write_alias(index)]
 
-    # If the index exists, delete it. Otherwise, just create the empty index.
-    if current_app.elasticsearch.indices.exists(index):
-        current_app.elasticsearch.indices.delete(index)
 
-    __create_index(index, analyzer)
+def indices_for(name):
+    """ Returns the names of the indices that the given alias (or index)
+    refers to. """
+    es = current_app.elasticsearch
+    if es.indices.exists_alias(name=name):
+        return list(es.indices.get_alias(name=name))
+    elif es.indices.exists(index=name):
+        return [name]
+    else:
+        return []
 
 
-def __create_index(index, analyzer="english"):
-    if not current_app.elasticsearch:
-        return
+def create_index(index, analyzer="english", aliases=None):
+    """ Creates a new, uniquely named (versioned) index for the given index
+    name, returning its name. """
+    versioned = f"{index}-{datetime.now():%Y%m%d%H%M%S%f}"
 
-    if current_app.elasticsearch.indices.exists(index):
-        raise ValueError(f"index with name {index} already exists")
-
-    current_app.elasticsearch.indices.create(index, body={
+    current_app.elasticsearch.indices.create(versioned, body={
         'settings': {
             "analysis": {
                 "analyzer": {
@@ -65,29 +121,766 @@ def __create_index(index, analyzer="english"):
                     }
                 }
             }
-        }
+        },
+        'aliases': aliases or {}
     })
 
+    return versioned
 
-def query_index(index, query, page, per_page):
-    if not current_app.elasticsearch:
-        return [], 0
 
-    search = current_app.elasticsearch.search(
-        index=index,
-        body={'query': {'multi_match': {'query': query, 'fields': ['*']}},
-              'from': page * per_page, 'size': per_page})
-    ids = [int(hit['_id']) for hit in search['hits']['hits']]
-    return ids, search['hits']['total']['value']
+def stream_documents(model, chunk_size):
+    """ Yields the search documents for all rows of the given model, as lists
+    of (id, document) tuples of up to chunk_size rows. """
+    from app import db
+
+    last_id = 0
+    while True:
+        chunk = model.query.filter(model.id > last_id)\
+                           .order_by(model.id).limit(chunk_size).all()
+        if not chunk:
+            return
+
+        documents = [(obj.id, document(obj)) for obj in chunk]
+        last_id = chunk[-1].id
+        for obj in chunk:
+            db.session.expunge(obj)
+
+        yield documents
+
+
+def send_documents(es, index, documents):
+    """ Adds the given (id, document) tuples to the index in one bulk
+    request, returning the number of documents that were sent. """
+    actions = [{'_op_type': 'create', '_index': index, '_id': doc_id, '_source': doc}
+               for doc_id, doc in documents]
+
+    # documents that already exist were written by the indexer after we read
+    # them, so they are newer than ours
+    _, errors = bulk(es, actions, raise_on_error=False)
+    errors = [e for e in errors if e['create'].get('status') != 409]
+    if errors:
+        raise RuntimeError(f"Failed to index {len(errors)} documents in {index}: {errors[0]}")
+
+    return len(documents)
+
+
+def remove_deleted(es, index, model, doc_ids):
+    """ Removes the documents whose rows have since been deleted from the
+    index, returning how many were removed. A document sent by reindex after
+    the indexer sent its delete (which found nothing to delete) would
+    otherwise come back. """
+    from app import db
+
+    existing = {row_id for row_id, in db.session.query(model.id).filter(model.id.in_(doc_ids))}
+    deleted = [doc_id for doc_id in doc_ids if doc_id not in existing]
+    if deleted:
+        bulk(es, [{'_op_type': 'delete', '_index': index, '_id': doc_id}
+                  for doc_id in deleted], raise_on_error=False)
+
+    return len(deleted)
+
+
+def reindex(model, analyzer="english", chunk_size=500, workers=4, report=None):
+    """ Rebuilds the search index for the given model.
+
+    Documents are streamed from the database in chunks and sent in bulk from
+    a pool of threads into a new index. Searches keep using the old index
+    until the new one is complete, at which point the alias is atomically
+    swapped over and the old index removed. If the rebuild fails, the new
+    index is removed instead (the old one is kept up to date meanwhile, see
+    write_targets). """
+    es = current_app.elasticsearch
+    alias = model.index_name()
+    old_indices = indices_for(alias)
+    old_write_indices = indices_for(write_alias(alias))
+
+    new_index = create_index(alias, analyzer)
+
+    # send any changes made while we reindex to the new index
+    actions = [{'remove': {'index': i, 'alias': write_alias(alias)}}
+               for i in old_write_indices]
+    actions.append({'add': {'index': new_index, 'alias': write_alias(alias),
+                            'is_write_index': True}})
+    es.indices.update_aliases(body={'actions': actions})
+
+    start = time.perf_counter()
+    indexed = 0
+    chunk_ids = {}
+
+    def report_progress(done):
+        nonlocal indexed
+        for future in done:
+            indexed += future.result()
+
+            # rows deleted after they were read
+            indexed -= remove_deleted(es, new_index, model, chunk_ids.pop(future))
+
+            if report:
+                rate = indexed / max(time.perf_counter() - start, 1e-6)
+                report(f"{alias}: indexed {indexed} documents ({rate:.0f} docs/s)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for documents in stream_documents(model, chunk_size):
+                future = pool.submit(send_documents, es, new_index, documents)
+                chunk_ids[future] = [doc_id for doc_id, _ in documents]
+                pending.add(future)
+
+                # limit how many chunks are waiting in memory
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    report_progress(done)
+
+            report_progress(wait(pending).done)
+
+    except BaseException:
+        # go back to writing to the old index, which is still up to date
+        actions = [{'add': {'index': i, 'alias': write_alias(alias), 'is_write_index': True}}
+                   for i in old_write_indices]
+        actions.append({'remove_index': {'index': new_index}})
+        es.indices.update_aliases(body={'actions': actions})
+        raise
+
+    # switch searches over to the new index, removing the old one(s)
+    actions = [{'add': {'index': new_index, 'alias': alias}}]
+    actions += [{'remove_index': {'index': i}} for i in old_indices]
+    es.indices.update_aliases(body={'actions': actions})
+
+    return indexed
+
+
+def query_index(model, query, page, per_page, filters=()):
+    """ Returns (id, score) tuples for the rows in the given page of search
+    results, ordered by relevance, along with the total number of results.
+    See SearchableMixin.search for the format of filters.
+
+    The backends are tried in order, so searches fall back to the next one
+    (e.g. SQLite's full-text search) while Elasticsearch is unavailable. """
+    for backend in current_app.search_backends:
+        try:
+            return backend.query(model, query, page, per_page, filters)
+        except SearchUnavailableError:
+            continue
+
+    return [], 0
+
+
+class SearchUnavailableError(Exception):
+    """ Raised by a search backend that can't be searched right now. """
+    pass
+
+
+def is_unavailable(error):
+    """ Returns whether the Elasticsearch error means the cluster couldn't be
+    reached or is overloaded (rather than, e.g., a missing index). """
+    if isinstance(error, ConnectionError):
+        return True
+    return isinstance(error.status_code, int) and error.status_code >= 500
+
+
+class CircuitBreaker(object):
+    """ Keeps track of whether requests to a service should be attempted.
+
+    The breaker opens after failure_threshold consecutive failures, after
+    which requests fail fast (allow() is False) instead of waiting on a
+    service that is down. Once reset_timeout seconds have passed, a single
+    trial request is allowed through, which closes the breaker if it
+    succeeds and opens it again if it doesn't. """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self):
+        return self._opened_at is None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            elif self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            else:
+                return "half-open"
+
+    def allow(self):
+        """ Returns whether a request should be attempted. """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self._opened_at is not None or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def trip(self):
+        """ Opens the breaker right away. """
+        with self._lock:
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class SearchBackend(ABC):
+    """ Interface for the search engines that searchable models are indexed
+    in. Backends are kept up to date by SearchableMixin's session hooks, which
+    pass them the (object, SearchOperation) changes that are being flushed. """
+    name = None
+
+    def before_flush(self, session, changes):
+        pass
+
+    def after_flush(self, session, changes):
+        pass
+
+    @abstractmethod
+    def query(self, model, expression, page, per_page, filters=()):
+        """ Returns (id, score) tuples for the given page of the model's rows
+        that match the expression and filters, ordered by relevance (highest
+        score first), and the total number of matches. """
+
+    @abstractmethod
+    def reindex(self, model, report=None, **options):
+        """ Rebuilds the index for the given model from its table. """
+
+
+class ElasticsearchBackend(SearchBackend):
+    """ Searches using Elasticsearch. Changes are queued in the search_outbox
+    table, which the SearchIndexer sends to Elasticsearch in bulk.
+
+    Searches aren't attempted while the circuit breaker is open, and raise
+    SearchUnavailableError (so the next backend is used) if they fail.
+    Changes are still queued, and are sent once Elasticsearch is back. """
+    name = "elasticsearch"
+
+    def __init__(self, breaker=None):
+        self.breaker = breaker or CircuitBreaker()
+
+    def after_flush(self, session, changes):
+        """ Queue index operations for the changes. The queued operations are
+        committed along with the objects themselves. """
+        from app.db_models import SearchOutbox
+
+        if not current_app.elasticsearch or not changes:
+            return
+
+        operations = [{'index': obj.index_name(), 'doc_id': obj.id, 'op': op}
+                      for obj, op in changes]
+        session.connection().execute(SearchOutbox.__table__.insert(), operations)
+        session.info['search_queued'] = True
+
+    def query(self, model, expression, page, per_page, filters=()):
+        if not current_app.elasticsearch or not self.breaker.allow():
+            raise SearchUnavailableError
+
+        # each filter matches documents with any of its field values
+        clauses = []
+        for any_of in filters:
+            terms = [{'terms': {field: value}} if isinstance(value, (list, tuple, set))
+                     else {'term': {field: value}}
+                     for field, value in any_of.items()]
+            clauses.append({'bool': {'should': terms, 'minimum_should_match': 1}})
+
+        try:
+            search = current_app.elasticsearch.search(
+                index=model.index_name(),
+                body={'query': {'bool': {
+                          'must': {'multi_match': {'query': expression,
+                                                   'fields': model.__searchable__}},
+                          'filter': clauses}},
+                      'from': page * per_page, 'size': per_page})
+        except TransportError as e:
+            if is_unavailable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            current_app.logger.warning(f"Elasticsearch search failed: {e}")
+            raise SearchUnavailableError from e
+
+        self.breaker.record_success()
+        hits = [(int(hit['_id']), hit['_score']) for hit in search['hits']['hits']]
+        return hits, search['hits']['total']['value']
+
+    def reindex(self, model, report=None, **options):
+        return reindex(model, report=report, **options)
+
+
+@functools.lru_cache(maxsize=None)
+def fts5_supported():
+    """ Returns True if the SQLite library was compiled with FTS5. """
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute("CREATE VIRTUAL TABLE fts5_check USING fts5(text)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+
+def fts_query(expression):
+    """ Converts a search expression into an FTS5 query that matches any of
+    its words (like Elasticsearch's multi_match does), so that user input
+    can't be interpreted as FTS5 query syntax. """
+    return " OR ".join(f'"{word}"' for word in re.findall(r"\w+", expression))
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """ Searches using SQLite's FTS5 extension, so no external service is
+    needed.
+
+    Each searchable table has an external-content FTS5 table (<table>_fts)
+    that only stores the index, reading the documents themselves from the
+    table. It is updated in the same transaction as the table, so results are
+    always current. Matches are ranked with BM25. """
+    name = "sqlite"
+
+    @staticmethod
+    def table_name(index):
+        return f"{index}_fts"
+
+    @classmethod
+    def create_tables(cls, target, connection, **kwargs):
+        """ Creates the FTS5 tables for all searchable models (when the
+        database is SQLite). """
+        if connection.dialect.name != 'sqlite' or not fts5_supported():
+            return
+
+        for model in searchable_models():
+            index = model.index_name()
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {cls.table_name(index)} "
+                f"USING fts5({', '.join(model.__searchable__)}, content='{index}', "
+                f"content_rowid='id', tokenize='porter unicode61')"))
+
+    @classmethod
+    def drop_tables(cls, target, connection, **kwargs):
+        if connection.dialect.name != 'sqlite':
+            return
+
+        for model in searchable_models():
+            connection.execute(text(
+                f"DROP TABLE IF EXISTS {cls.table_name(model.index_name())}"))
+
+    def _copy_rows(self, session, model, ids, command=None):
+        """ Adds the given rows of the model's table to its FTS5 table, or
+        runs an FTS5 command (e.g. 'delete') with them. """
+        index = model.index_name()
+        table = self.table_name(index)
+        columns = ", ".join(model.__searchable__)
+
+        if command:
+            statement = text(
+                f"INSERT INTO {table}({table}, rowid, {columns}) "
+                f"SELECT :command, id, {columns} FROM {index} WHERE id IN :ids")
+        else:
+            statement = text(
+                f"INSERT INTO {table}(rowid, {columns}) "
+                f"SELECT id, {columns} FROM {index} WHERE id IN :ids")
+
+        session.connection().execute(
+            statement.bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(ids), 'command': command})
+
+    def before_flush(self, session, changes):
+        """ Removes the index entries of rows that are about to be updated or
+        deleted. Removing an entry from an external-content table requires
+        the values that were indexed, which are only in the table until the
+        flush. """
+        models = {}
+        rows = defaultdict(set)
+        for obj, op in changes:
+            if obj not in session.new:
+                models[obj.index_name()] = type(obj)
+                rows[obj.index_name()].add(obj.id)
+
+        for index, ids in rows.items():
+            self._copy_rows(session, models[index], ids, command='delete')
+
+        # reindexed after the flush, unless they were deleted
+        session.info['fts_pending'] = (models, rows)
+
+    def after_flush(self, session, changes):
+        """ Indexes the new and updated rows. """
+        models, rows = session.info.pop('fts_pending', ({}, defaultdict(set)))
+        for obj, op in changes:
+            if obj in session.new:
+                models[obj.index_name()] = type(obj)
+                rows[obj.index_name()].add(obj.id)
+
+        # deleted rows are no longer in the table so won't be copied
+        for index, ids in rows.items():
+            self._copy_rows(session, models[index], ids)
+
+    def query(self, model, expression, page, per_page, filters=()):
+        from app import db
+
+        match = fts_query(expression)
+        if not match:
+            return [], 0
+
+        # filters are applied to the table itself, which is joined by rowid
+        table = db.inspect(model).base_mapper.local_table
+        name = self.table_name(table.name)
+        fts = db.table(name, db.column('rowid'), db.column('rank'), db.column(name))
+
+        matches = db.select(table.c.id).select_from(fts.join(table, table.c.id == fts.c.rowid))\
+                    .where(fts.c[name].match(match), model.filter_expression(filters, table))
+
+        # rank is the bm25() score of each match (lower is better)
+        rows = db.session.execute(
+            matches.add_columns(fts.c.rank, db.func.count().over())
+                   .order_by(fts.c.rank).limit(per_page).offset(page * per_page)).all()
+
+        if rows:
+            return [(row[0], -row[1]) for row in rows], rows[0][2]
+        elif page == 0:
+            return [], 0
+
+        # past the last page
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(matches.subquery())).scalar()
+        return [], total
+
+    def reindex(self, model, report=None, **options):
+        """ Rebuilds the model's FTS5 table, e.g. after rows were changed
+        without going through the ORM. """
+        from app import db
+
+        index = model.index_name()
+        table = self.table_name(index)
+        db.session.execute(text(f"INSERT INTO {table}({table}) VALUES('rebuild')"))
+        db.session.commit()
+
+        count = model.query.count()
+        if report:
+            report(f"{index}: indexed {count} documents")
+        return count
+
+
+class SearchIndexer(object):
+    """ Sends the index operations queued in the search_outbox table to
+    Elasticsearch using its bulk API.
+
+    Operations on the same document are coalesced so only the latest one is
+    sent, with the document built from the current database row. Operations
+    that fail are retried later, with exponential backoff, and nothing is sent
+    while the circuit breaker is open. Normally this runs in a background
+    thread that is woken up whenever operations are committed, but drain() can
+    also be called directly (e.g. by `flask search drain`). """
+
+    def __init__(self, app, batch_size=500, retry_backoff=1, max_backoff=300,
+                 poll_interval=30, breaker=None):
+        self.app = app
+        self.breaker = breaker or CircuitBreaker()
+        self.batch_size = batch_size
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Starts draining the outbox in a background thread. """
+        self._thread = threading.Thread(target=self._run, name="search-indexer",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def wake(self):
+        """ Lets the background thread know there are operations waiting. """
+        self._wake.set()
+
+    def drain_after_request(self, response):
+        """ Drains the outbox at the end of a request, for when there is no
+        background thread (e.g. with a shared in-memory database). """
+        if self._wake.is_set():
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception:
+                current_app.logger.exception("Error while draining search outbox")
+
+        return response
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+            with self.app.app_context():
+                try:
+                    self.drain()
+                except Exception:
+                    self.app.logger.exception("Error while draining search outbox")
+
+    def backoff(self, attempts):
+        """ Returns how long to wait before the given retry attempt. """
+        return timedelta(seconds=min(self.retry_backoff * 2 ** (attempts - 1),
+                                     self.max_backoff))
+
+    def drain(self, include_delayed=False):
+        """ Sends queued operations until none are ready to be sent. Returns
+        the number of operations that were sent and that failed. """
+        sent = failed = 0
+        if not self.breaker.closed:
+            return sent, failed
+
+        while True:
+            batch_sent, batch_failed = self.drain_batch(include_delayed)
+            sent += batch_sent
+            failed += batch_failed
+
+            # stop once nothing could be sent, or if failed operations would
+            # be retried right away
+            if batch_sent == 0 or (include_delayed and batch_failed):
+                return sent, failed
+
+    def drain_batch(self, include_delayed=False):
+        """ Sends one batch of queued operations in a single bulk request. """
+        from app import db
+        from app.db_models import SearchOutbox, SearchOperation
+
+        now = datetime.now()
+        query = SearchOutbox.query
+        if not include_delayed:
+            query = query.filter(SearchOutbox.next_try <= now)
+        queued = query.order_by(SearchOutbox.id).limit(self.batch_size).all()
+        if not queued:
+            return 0, 0
+
+        # coalesce operations so the last one for each document wins
+        latest = {}
+        for entry in queued:
+            latest[(entry.index, entry.doc_id)] = entry
+
+        models = {cls.index_name(): cls for cls in searchable_models()}
+        documents = {}
+        for index in {index for index, _ in latest}:
+            doc_ids = [doc_id for i, doc_id in latest if i == index]
+            model = models.get(index)
+            if model is not None:
+                for obj in model.query.filter(model.id.in_(doc_ids)):
+                    documents[(index, obj.id)] = document(obj)
+
+        keys = list(latest)
+        try:
+            targets = {index: write_targets(index) for index in {index for index, _ in keys}}
+
+            # one action for each index the document is written to
+            body, owners = [], []
+            for key in keys:
+                index, doc_id = key
+                for target in targets[index]:
+                    action = {'_index': target, '_id': doc_id}
+                    if latest[key].op == SearchOperation.INDEX and key in documents:
+                        body.append({'index': action})
+                        body.append(documents[key])
+                    else:
+                        # deleted (or no longer existing) documents
+                        body.append({'delete': action})
+                    owners.append(key)
+
+            response = current_app.elasticsearch.bulk(body=body)
+            results = [next(iter(item.items())) for item in response['items']]
+            self.breaker.record_success()
+        except TransportError as e:
+            current_app.logger.warning(f"Bulk indexing request failed: {e}")
+            owners, results = keys, [(None, {'status': None})] * len(keys)
+            if is_unavailable(e):
+                self.breaker.record_failure()
+
+        # operations only succeed if they succeeded in every index
+        failed_keys = set()
+        for key, (op, result) in zip(owners, results):
+            status = result.get('status') or 0
+            if not (200 <= status < 300 or (op == 'delete' and status == 404)):
+                failed_keys.add(key)
+        succeeded = [key for key in keys if key not in failed_keys]
+        failed = [key for key in keys if key in failed_keys]
+
+        last_id = queued[-1].id
+        for index, doc_id in succeeded:
+            SearchOutbox.query.filter(SearchOutbox.index == index,
+                                      SearchOutbox.doc_id == doc_id,
+                                      SearchOutbox.id <= last_id)\
+                              .delete(synchronize_session=False)
+
+        for key in failed:
+            entry = latest[key]
+            entry.attempts += 1
+            entry.next_try = now + self.backoff(entry.attempts)
+            if entry.attempts % 10 == 0:
+                current_app.logger.error(f"Failed to index {key} after {entry.attempts} attempts")
+
+            # older operations on the document are superseded by this one
+            SearchOutbox.query.filter(SearchOutbox.index == entry.index,
+                                      SearchOutbox.doc_id == entry.doc_id,
+                                      SearchOutbox.id < entry.id)\
+                              .delete(synchronize_session=False)
+
+        db.session.commit()
+        return len(succeeded), len(failed)
+
+
+class HealthProbe(object):
+    """ Checks whether Elasticsearch can be reached every interval seconds
+    from a background thread, so that the app doesn't have to wait on it
+    while starting up.
+
+    The circuit breaker is opened while Elasticsearch can't be reached, and
+    closed again (after making sure the indices exist) once it can, at which
+    point the indexer is woken up to send the operations that were queued in
+    the meantime. """
+
+    def __init__(self, app, breaker, indexer=None, interval=30, timeout=2):
+        self.app = app
+        self.breaker = breaker
+        self.indexer = indexer
+        self.interval = interval
+        self.timeout = timeout
+
+        self.ready = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="search-health",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.check()
+                except Exception:
+                    self.app.logger.exception("Error while checking Elasticsearch")
+
+            self._stop.wait(self.interval)
+
+    def check(self):
+        """ Pings Elasticsearch, updating the breaker. Returns whether it
+        could be reached. """
+        try:
+            healthy = current_app.elasticsearch.ping(request_timeout=self.timeout)
+            if healthy and not self.ready:
+                ensure_indices()
+                self.ready = True
+        except TransportError:
+            healthy = False
+
+        if healthy and not self.breaker.closed:
+            current_app.logger.info("Elasticsearch is available")
+            self.breaker.record_success()
+            if self.indexer:
+                self.indexer.wake()
+
+        elif not healthy and self.breaker.closed:
+            current_app.logger.warning("Could not connect to Elasticsearch server")
+            self.breaker.trip()
+
+        return healthy
 
 
 def init_app(app):
-    """ Initializes the app by making sure all indicies are created. """
-    from app.db_models import SearchableMixin
-    for cls in SearchableMixin.__subclasses__():
-        index_name = cls.__tablename__
-        if not app.elasticsearch.indices.exists(index_name):
-            app.logger.info(f"Creating index {index_name}")
-            with app.app_context():
-                __create_index(index_name)
+    """ Sets up the search backends: Elasticsearch (if it is configured), whose
+    indices are updated by a background indexer, and SQLite's full-text search
+    (if the database is SQLite).
+
+    Searches use the first of these that is available. The full-text search
+    tables are kept up to date even when Elasticsearch is used, so they can
+    take over while it can't be reached.
+
+    Nothing is sent to Elasticsearch here: the client connects when it is
+    first used, and a background health probe decides when it is used. """
+    app.search_backends = []
+    app.search_health = None
+
+    es_url = app.config.get('ELASTICSEARCH_URL')
+    app.elasticsearch = None
+    if es_url:
+        app.elasticsearch = Elasticsearch(
+            es_url, timeout=app.config.get('ELASTICSEARCH_TIMEOUT', 5))
+
+        # open until the health probe has reached Elasticsearch
+        app.search_breaker = CircuitBreaker(
+            failure_threshold=app.config.get('SEARCH_BREAKER_THRESHOLD', 3),
+            reset_timeout=app.config.get('SEARCH_BREAKER_RESET_TIMEOUT', 30))
+        app.search_breaker.trip()
+
+        app.search_indexer = SearchIndexer(
+            app,
+            batch_size=app.config.get('SEARCH_INDEX_BATCH_SIZE', 500),
+            retry_backoff=app.config.get('SEARCH_INDEX_RETRY_BACKOFF', 1),
+            breaker=app.search_breaker)
+
+        if app.config.get('SEARCH_INDEX_WORKER', True):
+            app.search_indexer.start()
+        else:
+            app.after_request(app.search_indexer.drain_after_request)
+
+        app.search_health = HealthProbe(
+            app, app.search_breaker, app.search_indexer,
+            interval=app.config.get('SEARCH_HEALTH_INTERVAL', 30),
+            timeout=app.config.get('SEARCH_HEALTH_TIMEOUT', 2))
+        app.search_health.start()
+
+        app.search_backends.append(ElasticsearchBackend(app.search_breaker))
+
+    if (app.config.get('SEARCH_FULL_TEXT', True)
+            and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+            and fts5_supported()):
+        app.search_backends.append(SQLiteSearchBackend())
+
+
+def ensure_indices():
+    """ Makes sure the index (and its write alias) exist for every searchable
+    model. """
+    es = current_app.elasticsearch
+    for cls in searchable_models():
+        index_name = cls.index_name()
+        if not es.indices.exists(index=index_name):
+            current_app.logger.info(f"Creating index {index_name}")
+            create_index(index_name, aliases={
+                index_name: {},
+                write_alias(index_name): {'is_write_index': True}
+            })
 
+        elif not es.indices.exists_alias(name=write_alias(index_name)):
+            # index from before we used aliases
+            es.indices.put_alias(index=index_name, name=write_alias(index_name),
+                                 body={'is_write_index': True})
@@ -1,4 +1,4 @@
-import { getCookie, fetchOrRefresh, authenticatedFetch } from './helpers.js';
+import { getCookie, fetchOrRefresh, authenticatedFetch, fetchAllPages } from './helpers.js';
 
 const refresh_url = Flask.url_for('auth.refresh_jwts');
 
@@ -128,19 +128,19 @@ export async function searchObjectives(search_string, topic_search_string="") {
         url = url + "&topics_q=" + encodeURIComponent(topic_search_string);
     }
 
-    return await fetchOrRefresh(url, 'GET', refresh_url);
+    // text search results come in a single page, but searching only by topic
+    // lists every matching objective, a page at a time
+    return await fetchAllPages(url, "learning_objectives");
 }
 
 export async function getObjectivesForTopics(topic_ids) {
     const url = Flask.url_for('objectives_api', {"topics": topic_ids.join()});
-    const response = await authenticatedFetch(url);
-    return response["learning_objectives"];
+    return await fetchAllPages(url, "learning_objectives");
 }
 
 export async function getQuestionsForObjectives(objective_ids) {
     const url = Flask.url_for('questions_api', {"objectives": objective_ids.join()});
-    const response = await authenticatedFetch(url);
-    return response.questions;
+    return await fetchAllPages(url, "questions");
 }
 
 export async function getCourseTextbooks(course_id) {
@@ -1,17 +1,28 @@
 import { ref, isRef, unref, watchEffect } from './vue.esm-browser.js';
-import { authenticatedFetch } from './helpers.js';
+import { fetchAllPages } from './helpers.js';
 
 export function useFilterableList(url, name, filter_func) {
   const all_data = ref([]);
   const filtered_data = ref([]);
   const error = ref(null);
+  let latest_fetch = 0;
 
   function doFetch() {
     all_data.value = [];
     error.value = [];
-    
-    authenticatedFetch(unref(url))
-      .then(res => all_data.value = res[name])
+
+    const fetch_url = unref(url);
+    if (!fetch_url) {
+      return;
+    }
+
+    // show each page as it arrives, ignoring pages from an earlier url
+    const fetch_id = ++latest_fetch;
+    fetchAllPages(fetch_url, name, items => {
+        if (fetch_id === latest_fetch) {
+          all_data.value = [...items];
+        }
+      })
       .catch(e => error.value = e);
   }
 
@@ -62,6 +62,34 @@ export async function authenticatedFetch(url, http_method='GET', config={}) {
     throw `Bad response: ${response.status}`;
 }
 
+/*
+ * Fetches every page of a paginated list resource (e.g. questions_api),
+ * following the 'next' cursor of each page, and returns all of the items in
+ * the list with the given name. If given, onPage is called with the items
+ * fetched so far after each page.
+ */
+export async function fetchAllPages(url, name, onPage) {
+    const items = [];
+    let cursor = null;
+
+    do {
+        const page_url = new URL(url, window.location.origin);
+        page_url.searchParams.set('limit', 500);
+        if (cursor) {
+            page_url.searchParams.set('after', cursor);
+        }
+
+        const response = await authenticatedFetch(page_url.toString());
+        items.push(...response[name]);
+        if (onPage) {
+            onPage(items);
+        }
+        cursor = response.next;
+    } while (cursor);
+
+    return items;
+}
+
 export async function fetchOrRefresh(url, http_method, refresh_url, config) {
     config = (typeof config !== 'undefined') ? config : {
         method: http_method,
@@ -46,12 +46,11 @@ export default {
       objectives_modal.hide();
     },
 
-    async displaySearchResults(query_response) {
-      if (query_response.ok) {
-        const r = await query_response.json();
-        this.objectives = r["learning_objectives"];
+    async displaySearchResults(search_string, topic_search_string) {
+      try {
+        this.objectives = await searchObjectives(search_string, topic_search_string);
       }
-      else {
+      catch (e) {
         const modal_el = document.getElementById('setObjectiveModal');
         const objectives_modal = bootstrap.Modal.getInstance(modal_el);
         objectives_modal.hide();
@@ -62,16 +61,14 @@ export default {
     async searchByDescription() {
       if (this.search_string !== "") {
         // Only search if a non-empty string given
-        const response = await searchObjectives(this.search_string);
-        await this.displaySearchResults(response);
+        await this.displaySearchResults(this.search_string, "");
       }
     },
 
     async searchByTopic() {
       if (this.search_string !== "") {
         // Only search if a non-empty string given
-        const response = await searchObjectives("", this.search_string);
-        await this.displaySearchResults(response);
+        await this.displaySearchResults("", this.search_string);
       }
     },
 
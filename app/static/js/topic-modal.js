@@ -1,7 +1,6 @@
-import { showSnackbarMessage, fetchOrRefresh } from './helpers.js';
+import { showSnackbarMessage, fetchAllPages } from './helpers.js';
 import { createNewTopic } from './cadet-api.js';
 
-const refresh_url = Flask.url_for('auth.refresh_jwts');
 
 export default {
   compilerOptions: {
@@ -52,12 +51,13 @@ export default {
       if (this.search_string) {
         url = url + "?q=" + encodeURIComponent(this.search_string);
       }
-      const response = await fetchOrRefresh(url, 'GET', refresh_url);
-      if (response.ok) {
-        const r = await response.json();
-        this.topics = r["topics"];
+
+      try {
+        // search results come in a single page, but listing all topics
+        // needs to page through them
+        this.topics = await fetchAllPages(url, "topics");
       }
-      else {
+      catch (e) {
         const modal_el = document.getElementById(this.name);
         const modal = bootstrap.Modal.getInstance(modal_el);
         modal.hide();
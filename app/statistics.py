@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import datetime, date
+
+from app import db
+
+
+class AssessmentStatistics(object):
+    """ Course-wide statistics for a single assessment.
+
+    All per-student and per-objective aggregates are computed up front using
+    a handful of grouped queries over the review_state table (which holds the
+    latest attempt state of every user/question pair), rather than looping
+    over students and questions in Python. """
+
+    def __init__(self, course, assessment):
+        self.course = course
+        self.assessment = assessment
+
+        self.user_ids = [user_id for (user_id,) in
+                         db.session.query(enrollments.c.user_id)
+                                   .filter(enrollments.c.course_id == course.id)]
+
+        self.num_questions = assessment.questions.count()
+
+        self._e_factor_averages = self._load_e_factor_averages()
+        self._questions_remaining = self._load_questions_remaining()
+
+    def _enrolled_states(self):
+        """ Returns a query over the review states of enrolled users for
+        questions in this assessment. """
+        return db.session.query(ReviewState)\
+            .join(assessment_questions,
+                  db.and_(assessment_questions.c.question_id == ReviewState.question_id,
+                          assessment_questions.c.assessment_id == self.assessment.id))\
+            .join(enrollments,
+                  db.and_(enrollments.c.user_id == ReviewState.user_id,
+                          enrollments.c.course_id == self.course.id))
+
+    def _load_e_factor_averages(self):
+        """ Returns a dictionary mapping (user_id, objective_id) to the
+        average e_factor of the user's latest attempts on the objective's
+        questions in this assessment. """
+        rows = self._enrolled_states()\
+            .join(Question, Question.id == ReviewState.question_id)\
+            .with_entities(ReviewState.user_id, Question.objective_id,
+                           db.func.avg(ReviewState.e_factor))\
+            .group_by(ReviewState.user_id, Question.objective_id)
+
+        return {(user_id, objective_id): float(f"{average:.3f}")
+                for user_id, objective_id, average in rows}
+
+    def _load_questions_remaining(self):
+        """ Returns a dictionary mapping user_id to the number of questions
+        (fresh and repeat) the user still needs to practice today. """
+
+        # every question is fresh unless it is waiting for a future date
+        waiting = self._enrolled_states()\
+            .filter(ReviewState.next_attempt > date.today())\
+            .with_entities(ReviewState.user_id, db.func.count())\
+            .group_by(ReviewState.user_id)
+
+        remaining = defaultdict(lambda: self.num_questions)
+        for user_id, num_waiting in waiting:
+            remaining[user_id] = self.num_questions - num_waiting
+
+        # repeat questions were attempted today without a quality of 4+
+        midnight_today = datetime.combine(date.today(), datetime.min.time())
+
+        poor_attempts = db.session.query(Attempt.user_id, Attempt.question_id)\
+            .join(assessment_questions,
+                  db.and_(assessment_questions.c.question_id == Attempt.question_id,
+                          assessment_questions.c.assessment_id == self.assessment.id))\
+            .join(enrollments,
+                  db.and_(enrollments.c.user_id == Attempt.user_id,
+                          enrollments.c.course_id == self.course.id))\
+            .filter(Attempt.time >= midnight_today)\
+            .group_by(Attempt.user_id, Attempt.question_id)\
+            .having(db.func.max(Attempt.quality) < 4)\
+            .subquery()
+
+        repeats = db.session.query(poor_attempts.c.user_id, db.func.count())\
+                            .group_by(poor_attempts.c.user_id)
+
+        for user_id, num_repeats in repeats:
+            remaining[user_id] += num_repeats
+
+        return remaining
+
+    def e_factor_average(self, user_id, objective):
+        """ Returns the user's average e_factor for the objective's questions,
+        or 0 if they haven't attempted any of them. """
+        return self._e_factor_averages.get((user_id, objective.id), 0)
+
+    def questions_remaining(self, user_id):
+        """ Returns the number of questions the user still needs to practice
+        today. """
+        return self._questions_remaining[user_id]
+
+    def objectives_to_review(self, user_id, objectives, max_num_objectives=3,
+                             average_threshold=2.6):
+        """ Returns up to max_num_objectives of the given objectives whose
+        average e_factor for the user is below average_threshold, as a list
+        of (objective, e_factor average) tuples sorted from lowest to highest
+        average. """
+        lo_review = []
+        for lo in objectives:
+            average = self.e_factor_average(user_id, lo)
+            if (average < average_threshold) and (average > 0.1):
+                lo_review.append((lo, average))
+
+        lo_review.sort(key=lambda i: i[-1])
+        return lo_review[:max_num_objectives]
+
+    def total_questions_remaining(self):
+        """ Returns the number of questions needing practice, summed over all
+        users in the course. """
+        return sum(self.questions_remaining(user_id) for user_id in self.user_ids)
+
+    def star_rating(self, objective):
+        """ Returns the number of full stars based on the average e_factor of
+        the objective """
+        average = sum(self.e_factor_average(user_id, objective)
+                      for user_id in self.user_ids)
+
+        if len(self.user_ids) == 0 or average == 0:
+            return 0
+
+        rating = average / len(self.user_ids) # average of all the user's average e_factors
+        if rating < 2:
+            return 1
+        elif rating < 3:
+            return 2
+        elif rating < 5:
+            return 3
+        elif rating < 7:
+            return 4
+        else:
+            return 5
+
+    def questions_remaining_breakdown(self):
+        """ Returns a tuple with the number of users that have (0, 1-2, 3-5,
+        6-10, 11+) questions remaining. """
+        zero = very_little = little = some = lots = 0
+
+        for user_id in self.user_ids:
+            questions_remaining = self.questions_remaining(user_id)
+            if questions_remaining == 0:
+                zero += 1
+            elif questions_remaining < 3:
+                very_little += 1
+            elif questions_remaining < 6:
+                little += 1
+            elif questions_remaining < 11:
+                some += 1
+            else:
+                lots += 1
+
+        return (zero, very_little, little, some, lots)
+
+    def skill_breakdown(self, objective):
+        """ Returns the number of users with various levels of proficiency
+        (proficient, limited, undeveloped) for the objective. """
+        proficient_count = limited_count = undeveloped_count = 0
+
+        for user_id in self.user_ids:
+            user_ave = self.e_factor_average(user_id, objective)
+            if user_ave < 3:
+                undeveloped_count += 1
+            elif user_ave < 4:
+                limited_count += 1
+            else:
+                proficient_count += 1
+
+        return (proficient_count, limited_count, undeveloped_count)
+
+
+from app.db_models import (
+    Attempt, Question, ReviewState, assessment_questions, enrollments
+)
@@ -0,0 +1,182 @@
+import json
+import threading
+from types import SimpleNamespace
+
+from elasticsearch.exceptions import ConnectionError, NotFoundError
+from elasticsearch.serializer import JSONSerializer
+
+
+class FakeIndices(object):
+    def __init__(self, es):
+        self.es = es
+
+    def exists(self, index):
+        return index in self.es.indices_data or index in self.es.aliases
+
+    def create(self, index, body=None):
+        self.es.indices_data[index] = {}
+        for alias, options in (body or {}).get('aliases', {}).items():
+            self.es.aliases.setdefault(alias, {})[index] = dict(options)
+
+    def delete(self, index):
+        if index not in self.es.indices_data:
+            raise NotFoundError(404, "index_not_found_exception")
+        self.es.remove_index(index)
+
+    def exists_alias(self, name):
+        return name in self.es.aliases
+
+    def get_alias(self, name):
+        if name not in self.es.aliases:
+            raise NotFoundError(404, "alias_not_found_exception")
+        return {index: {'aliases': {name: options}}
+                for index, options in self.es.aliases[name].items()}
+
+    def put_alias(self, index, name, body=None):
+        self.es.aliases.setdefault(name, {})[index] = dict(body or {})
+
+    def update_aliases(self, body):
+        """ Applies all of the alias actions at once. """
+        with self.es.lock:
+            for action in body['actions']:
+                (op, params), = action.items()
+                if op == 'add':
+                    options = {k: v for k, v in params.items() if k not in ('index', 'alias')}
+                    self.es.aliases.setdefault(params['alias'], {})[params['index']] = options
+                elif op == 'remove':
+                    self.es.aliases[params['alias']].pop(params['index'])
+                    if not self.es.aliases[params['alias']]:
+                        del self.es.aliases[params['alias']]
+                elif op == 'remove_index':
+                    self.es.remove_index(params['index'])
+
+        return {'acknowledged': True}
+
+
+class FakeElasticsearch(object):
+    """ In-process stand-in for the parts of the Elasticsearch client that we
+    use, storing documents in dictionaries.
+
+    Set fail_requests to make the next N requests raise a ConnectionError (or
+    available to False to make them all fail), or add ids to fail_documents
+    to make bulk operations on documents with those ids fail. """
+
+    def __init__(self):
+        self.indices_data = {}
+        self.aliases = {}
+        self.indices = FakeIndices(self)
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.lock = threading.RLock()
+
+        self.requests = []
+        self.fail_requests = 0
+        self.fail_documents = set()
+        self.available = True
+
+    def _request(self, name):
+        self.requests.append(name)
+        if not self.available:
+            raise ConnectionError("N/A", "Fake connection failure", None)
+        if self.fail_requests > 0:
+            self.fail_requests -= 1
+            raise ConnectionError("N/A", "Fake connection failure", None)
+
+    def remove_index(self, index):
+        del self.indices_data[index]
+        for alias in list(self.aliases):
+            self.aliases[alias].pop(index, None)
+            if not self.aliases[alias]:
+                del self.aliases[alias]
+
+    def resolve(self, name, write=False):
+        """ Returns the names of the indices that name refers to. When
+        writing, this is a single index (the alias' write index). """
+        if name in self.aliases:
+            indices = self.aliases[name]
+            if write and len(indices) > 1:
+                return [i for i, options in indices.items() if options.get('is_write_index')]
+            return list(indices)
+
+        if write:
+            self.indices_data.setdefault(name, {}) # created automatically
+        return [name] if name in self.indices_data else []
+
+    def documents(self, name):
+        """ Returns all documents in the given index (or alias). """
+        docs = {}
+        for index in self.resolve(name):
+            docs.update(self.indices_data[index])
+        return docs
+
+    def ping(self, **kwargs):
+        return self.available
+
+    def bulk(self, body, **kwargs):
+        self._request('bulk')
+
+        if isinstance(body, str):
+            body = [json.loads(line) for line in body.splitlines() if line.strip()]
+
+        items = []
+        lines = iter(body)
+        with self.lock:
+            for line in lines:
+                (op, action), = line.items()
+                index, = self.resolve(action['_index'], write=True)
+                doc_id = str(action['_id'])
+                docs = self.indices_data[index]
+
+                if op in ('index', 'create'):
+                    source = next(lines)
+                    if int(doc_id) in self.fail_documents:
+                        status = 503
+                    elif op == 'create' and doc_id in docs:
+                        status = 409
+                    else:
+                        docs[doc_id] = dict(source)
+                        status = 201
+
+                elif op == 'delete':
+                    if int(doc_id) in self.fail_documents:
+                        status = 503
+                    elif doc_id in docs:
+                        del docs[doc_id]
+                        status = 200
+                    else:
+                        status = 404
+
+                result = {'_index': index, '_id': doc_id, 'status': status}
+                if status >= 300:
+                    result['error'] = {'type': 'fake_error'}
+                items.append({op: result})
+
+        return {'errors': any('error' in item[op] for item in items for op in item),
+                'items': items}
+
+    def search(self, index, body):
+        self._request('search')
+
+        query = body['query']['bool']
+        terms = query['must']['multi_match']['query'].lower().split()
+        fields = query['must']['multi_match']['fields']
+
+        def matches(source, clause):
+            for option in clause['bool']['should']:
+                (kind, spec), = option.items()
+                (field, value), = spec.items()
+                if source.get(field) in (value if kind == 'terms' else [value]):
+                    return True
+            return False
+
+        # scored by the number of times the terms appear
+        hits = []
+        for doc_id, source in self.documents(index).items():
+            text = " ".join(str(source.get(field, "")) for field in fields).lower()
+            score = sum(text.count(term) for term in terms)
+            if score and all(matches(source, clause) for clause in query['filter']):
+                hits.append({'_id': doc_id, '_score': float(score)})
+
+        hits.sort(key=lambda hit: -hit['_score'])
+        start, size = body.get('from', 0), body.get('size', 10)
+        return {'hits': {'total': {'value': len(hits)},
+                         'hits': hits[start:start+size]}}
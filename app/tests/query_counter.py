@@ -0,0 +1,23 @@
+import time
+from app import db
+
+
+class QueryCounter(object):
+    """ Context manager that counts the SQL statements executed on an
+    engine. """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        db.event.listen(self.engine, 'before_cursor_execute', self._count)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
+        db.event.remove(self.engine, 'before_cursor_execute', self._count)
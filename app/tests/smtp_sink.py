@@ -0,0 +1,77 @@
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """ Speaks just enough SMTP for smtplib to deliver messages. """
+
+    def reply(self, line):
+        self.wfile.write(line.encode('utf-8') + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+            refuse = sink.refuse > 0
+            if refuse:
+                sink.refuse -= 1
+
+        if refuse:
+            self.reply("421 Service not available")
+            return
+
+        self.reply("220 localhost SMTP sink")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8').strip().upper()
+
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("MAIL FROM"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT TO"):
+                recipients.append(line.decode('utf-8').split(":", 1)[1].strip(" <>\r\n"))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    data.append(data_line)
+                with sink.lock:
+                    sink.messages.append((recipients, b"".join(data)))
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(object):
+    """ Local SMTP server that keeps the messages it receives (instead of
+    delivering them), for testing code that sends email. The first `refuse`
+    connections are turned away as if the server were unavailable. """
+
+    def __init__(self, refuse=0):
+        self.messages = []
+        self.connections = 0
+        self.refuse = refuse
+        self.lock = threading.Lock()
+
+        self.server = socketserver.ThreadingTCPServer(("localhost", 0), SMTPHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
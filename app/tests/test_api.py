@@ -0,0 +1,497 @@
+import unittest
+from datetime import date, datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.db_models import (
+    User, Question, QuestionSchema, ShortAnswerQuestion, Topic, TopicSchema,
+    Course, Objective, Textbook, TextbookSection, ClassMeeting, Assessment,
+    ResourceVersion
+)
+from app.api import eager_load_options, load_only_options, list_schema
+from app.auth import identities
+from app.tests.query_counter import QueryCounter
+
+class PaginationCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.instructor = User(email="instructor@test.com", first_name="Test",
+                               last_name="Instructor", instructor=True)
+        self.instructor.set_password("password")
+        self.admin = User(email="admin@test.com", first_name="Test",
+                          last_name="Admin", admin=True)
+        self.admin.set_password("password")
+        db.session.add_all([self.instructor, self.admin])
+        db.session.commit()
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, url, user=None):
+        token = create_access_token(identity=user or self.instructor)
+        return self.client.get(url, headers={'Authorization': f"Bearer {token}"})
+
+    def get_all(self, url, name, user=None):
+        """ Follows the next cursors from url, returning all of the items
+        and the number of pages. """
+        items = []
+        pages = 0
+        separator = '&' if '?' in url else '?'
+        next_url = url
+        while next_url:
+            response = self.get(next_url, user)
+            self.assertEqual(200, response.status_code)
+            items += response.json[name]
+            pages += 1
+            cursor = response.json['next']
+            next_url = f"{url}{separator}after={cursor}" if cursor else None
+
+        return items, pages
+
+    def test_questions(self):
+        other = User(email="other@test.com", first_name="Other", last_name="User")
+        other.set_password("password")
+        db.session.add_all([ShortAnswerQuestion(prompt=f"Question {i}", answer="?",
+                                                public=(i % 3 != 0), author=other)
+                            for i in range(10)])
+        db.session.commit()
+
+        questions, pages = self.get_all('/api/questions?limit=3', 'questions')
+        self.assertEqual([f"Question {i}" for i in range(10) if i % 3 != 0],
+                         [q['prompt'] for q in questions])
+        self.assertEqual(2, pages)
+
+        # the total is only counted when asked for
+        response = self.get('/api/questions?limit=3')
+        self.assertNotIn('X-Total-Count', response.headers)
+        response = self.get('/api/questions?limit=3&count')
+        self.assertEqual('6', response.headers['X-Total-Count'])
+
+        # each page is a single query
+        with QueryCounter(db.engine) as counter:
+            response = self.get(f"/api/questions?limit=3&after={response.json['next']}")
+        self.assertEqual(["Question 5", "Question 7", "Question 8"],
+                         [q['prompt'] for q in response.json['questions']])
+        self.assertLessEqual(counter.count, 3) # includes loading the user
+
+        self.assertEqual(400, self.get('/api/questions?after=nonsense').status_code)
+
+    def test_topics_ordered_by_text(self):
+        db.session.add_all([Topic(text=text) for text in ["b", "a", "c", "a2", "B"]])
+        db.session.commit()
+
+        topics, pages = self.get_all('/api/topics?limit=2', 'topics')
+        self.assertEqual(["B", "a", "a2", "b", "c"], [t['text'] for t in topics])
+        self.assertEqual(3, pages)
+
+    def test_courses_and_objectives(self):
+        courses = [Course(name=f"course{i}", title=f"Course {i}", description="",
+                          start_date=date.today(), end_date=date.today() + timedelta(days=1))
+                   for i in range(4)]
+        courses[1].users.append(self.instructor)
+        courses[3].users.append(self.instructor)
+        db.session.add_all(courses)
+        db.session.add_all([Objective(description=f"Objective {i}", public=True)
+                            for i in range(5)])
+        db.session.commit()
+
+        found, _ = self.get_all('/api/courses?limit=1', 'courses')
+        self.assertEqual({"course1", "course3"}, {c['name'] for c in found})
+
+        found, pages = self.get_all('/api/courses?limit=3', 'courses', self.admin)
+        self.assertEqual([c.name for c in Course.query.order_by(Course.id)],
+                         [c['name'] for c in found])
+        self.assertEqual(2, pages)
+
+        found, pages = self.get_all('/api/objectives?limit=2', 'learning_objectives')
+        self.assertEqual([f"Objective {i}" for i in range(5)], [o['description'] for o in found])
+        self.assertEqual(3, pages)
+
+    def test_objectives_searched_by_topic(self):
+        loops = Topic(text="Loops")
+        other = Topic(text="Recursion")
+        db.session.add_all([Objective(description=f"Objective {i}", public=True,
+                                      topic=loops if i % 4 else other)
+                            for i in range(160)])
+        db.session.commit()
+
+        # more objectives than fit in a (default) page have the topic
+        response = self.get('/api/objectives/search?html&topics_q=loops')
+        self.assertEqual(100, len(response.json['learning_objectives']))
+        self.assertIsNotNone(response.json['next'])
+
+        found, pages = self.get_all('/api/objectives/search?html&topics_q=loops',
+                                    'learning_objectives')
+        self.assertEqual([f"<p>Objective {i}</p>" for i in range(160) if i % 4],
+                         [o['description'] for o in found])
+        self.assertEqual(2, pages)
+
+
+class EagerLoadingCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.admin = User(email="admin@test.com", first_name="Test",
+                          last_name="Admin", admin=True)
+        self.admin.set_password("password")
+        db.session.add(self.admin)
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.added = 0
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_items(self, n):
+        """ Adds n of each type of item, each of which is related to others. """
+        for i in range(self.added, self.added + n):
+            author = User(email=f"author{i}@test.com", first_name="Test",
+                          last_name=f"Author {i}", instructor=True)
+            author.set_password("password")
+            topic = Topic(text=f"Topic {i}")
+            objective = Objective(description=f"Objective {i}", author=author, topic=topic)
+            for j in range(2):
+                ShortAnswerQuestion(prompt=f"Question {i}.{j}", answer="?",
+                                    author=author, objective=objective)
+
+            section = TextbookSection(title=f"Section {i}", number=f"{i}.1")
+            section.topics.append(topic)
+            textbook = Textbook(title=f"Textbook {i}", authors="Test Author")
+            textbook.sections.append(section)
+
+            course = Course(name=f"course{i}", title=f"Course {i}", description="",
+                            start_date=date.today(), end_date=date.today())
+            course.meetings.append(ClassMeeting(title=f"Meeting {i}"))
+            course.topics.append(topic)
+            course.textbooks.append(textbook)
+            course.assessments.append(Assessment(title=f"Assessment {i}",
+                                                 time=datetime.now()))
+
+            db.session.add_all([author, objective, textbook, course])
+
+        db.session.commit()
+        self.added += n
+
+    def count_queries(self, url, collection_name, expected_length):
+        token = create_access_token(identity=self.admin)
+
+        # start with an empty session (and no cached identity), as in a new
+        # request
+        db.session.expunge_all()
+        identities.clear()
+        with QueryCounter(db.engine) as counter:
+            response = self.client.get(url, headers={'Authorization': f"Bearer {token}"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected_length, len(response.json[collection_name]))
+        return counter.count
+
+    def test_constant_queries(self):
+        endpoints = [('/api/questions', 'questions', 2),
+                     ('/api/objectives', 'learning_objectives', 1),
+                     ('/api/courses', 'courses', 1),
+                     ('/api/textbooks', 'textbooks', 1),
+                     ('/api/topics', 'topics', 1)]
+
+        self.add_items(2)
+        few = [self.count_queries(url, name, 2 * n) for url, name, n in endpoints]
+        self.add_items(8)
+        many = [self.count_queries(url, name, 10 * n) for url, name, n in endpoints]
+        self.assertEqual(few, many)
+
+        # relationships are included in the results
+        response = self.client.get('/api/objectives', headers={
+            'Authorization': f"Bearer {create_access_token(identity=self.admin)}"})
+        objective = response.json['learning_objectives'][0]
+        self.assertEqual("Topic 0", objective['topic']['text'])
+        self.assertEqual(["Question 0.0", "Question 0.1"],
+                         [q['prompt'] for q in objective['questions']])
+
+    def test_topic_schema(self):
+        self.add_items(3)
+        schema = TopicSchema(many=True)
+
+        db.session.expunge_all()
+        with QueryCounter(db.engine) as counter:
+            topics = Topic.query.options(*eager_load_options(Topic, schema)).all()
+            result = schema.dump(topics)
+
+        self.assertEqual(3, counter.count) # topics, their sources, and objectives
+        self.assertEqual(["Section 0"], [s['title'] for s in result[0]['sources']])
+        self.assertEqual(["Objective 2"], [o['description'] for o in result[2]['objectives']])
+
+
+class SparseFieldsCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.instructor = User(email="instructor@test.com", first_name="Test",
+                               last_name="Instructor", instructor=True)
+        self.instructor.set_password("password")
+        topic = Topic(text="Loops")
+        objective = Objective(description="Write *for* loops", public=True,
+                              author=self.instructor, topic=topic)
+        db.session.add_all([self.instructor, objective] +
+                           [ShortAnswerQuestion(prompt=f"Question {i}", answer="?",
+                                                explanation="Because", objective=objective)
+                            for i in range(3)])
+        db.session.commit()
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, url):
+        token = create_access_token(identity=self.instructor)
+        return self.client.get(url, headers={'Authorization': f"Bearer {token}"})
+
+    def test_fields(self):
+        response = self.get('/api/questions?fields=prompt,id')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([{'id': q.id, 'prompt': q.prompt} for q in Question.query],
+                         response.json['questions'])
+
+        response = self.get('/api/objectives?fields=description,topic&html')
+        self.assertEqual([{'description': "<p>Write <em>for</em> loops</p>",
+                           'topic': {'id': 1, 'text': "Loops"}}],
+                         response.json['learning_objectives'])
+
+        response = self.get('/api/questions?fields=id,answer')
+        self.assertEqual(400, response.status_code)
+        self.assertIn("answer", response.json['message'])
+
+    def test_schemas_shared(self):
+        self.get('/api/questions?fields=prompt,id')
+        hits = list_schema.cache_info().hits
+        self.get('/api/questions?fields=id,prompt')
+        self.assertEqual(hits + 1, list_schema.cache_info().hits)
+
+    def test_selected_columns(self):
+        schema = list_schema(QuestionSchema, ('id', 'prompt'))
+        statement = str(Question.query.options(*load_only_options(Question, schema)))
+        self.assertIn("question.prompt", statement)
+        self.assertNotIn("question.explanation", statement)
+
+        # all of the columns are loaded when all of the fields are dumped
+        statement = str(Question.query.options(
+            *load_only_options(Question, list_schema(QuestionSchema))))
+        self.assertIn("question.explanation", statement)
+
+
+class ConditionalGetCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.instructor = User(email="instructor@test.com", first_name="Test",
+                               last_name="Instructor", instructor=True)
+        self.instructor.set_password("password")
+        self.course = Course(name="course", title="Course", description="",
+                             start_date=date.today(), end_date=date.today())
+        self.course.users.append(self.instructor)
+        self.topics = [Topic(text="Loops"), Topic(text="Recursion")]
+        self.course.topics.append(self.topics[0])
+        section = TextbookSection(title="Iteration", number="1.1")
+        section.topics.append(self.topics[0])
+        self.textbook = Textbook(title="Textbook", authors="Test Author")
+        self.textbook.sections.append(section)
+        self.course.textbooks.append(self.textbook)
+        db.session.add_all([self.course, *self.topics])
+        db.session.commit()
+        self.course_id = self.course.id
+        self.topic_ids = [topic.id for topic in self.topics]
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def request(self, method, url, etag=None, json=None):
+        headers = {'Authorization': f"Bearer {create_access_token(identity=self.instructor)}"}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.client.open(url, method=method, headers=headers, json=json)
+
+    def test_not_modified(self):
+        url = f"/api/course/{self.course_id}/topics"
+        response = self.request('GET', url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["Loops"], [t['text'] for t in response.json['topics']])
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        # the collection isn't loaded when the client already has it
+        db.session.expunge_all()
+        with QueryCounter(db.engine) as counter:
+            response = self.request('GET', url, etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.data)
+        self.assertEqual(etag, response.headers['ETag'])
+        self.assertEqual(2, counter.count) # course and versions (the user is cached)
+
+        # adding to the collection changes it
+        self.request('POST', url, json={'ids': [self.topic_ids[1]]})
+        response = self.request('GET', url, etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["Loops", "Recursion"], [t['text'] for t in response.json['topics']])
+        self.assertNotEqual(etag, response.headers['ETag'])
+        etag = response.headers['ETag']
+
+        # as does changing one of the topics
+        Topic.query.get(self.topic_ids[0]).text = "Iteration"
+        db.session.commit()
+        self.assertEqual(200, self.request('GET', url, etag).status_code)
+
+    def test_nested_changes(self):
+        url = f"/api/course/{self.course_id}/textbooks"
+        etag = self.request('GET', url).headers['ETag']
+        self.assertEqual(304, self.request('GET', url, etag).status_code)
+
+        # changes to other courses (or unrelated tables) don't change it
+        other = Course(name="other", title="Other", description="",
+                       start_date=date.today(), end_date=date.today())
+        db.session.add_all([other, ShortAnswerQuestion(prompt="Question", answer="?")])
+        db.session.commit()
+        self.assertEqual(304, self.request('GET', url, etag).status_code)
+
+        # but the topics of the textbook's sections are included
+        section = TextbookSection.query.one()
+        section.topics.append(Topic.query.get(self.topic_ids[1]))
+        db.session.commit()
+        response = self.request('GET', url, etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["Loops", "Recursion"],
+                         [t['text'] for t in response.json['textbooks'][0]['sections'][0]['topics']])
+
+    def test_versions(self):
+        course_name = ResourceVersion.object_name(Course, self.course.id)
+        (version, modified), = ResourceVersion.current([course_name])
+
+        self.course.topics.remove(Topic.query.get(self.topic_ids[0]))
+        db.session.commit()
+        self.assertEqual(version + 1, ResourceVersion.current([course_name])[0][0])
+
+        # unchanged objects aren't bumped
+        self.course.title = self.course.title
+        db.session.commit()
+        self.assertEqual(version + 1, ResourceVersion.current([course_name])[0][0])
+        self.assertEqual([(0, None)], ResourceVersion.current(["course:0"]))
+
+
+class CollectionUpdateCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.instructor = User(email="instructor@test.com", first_name="Test",
+                               last_name="Instructor", instructor=True)
+        self.instructor.set_password("password")
+        self.course = Course(name="course", title="Course", description="",
+                             start_date=date.today(), end_date=date.today())
+        self.course.users.append(self.instructor)
+        self.assessment = Assessment(title="Assessment")
+        self.course.assessments.append(self.assessment)
+        db.session.add(self.course)
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.course_id, self.assessment_id = self.course.id, self.assessment.id
+        self.url = f"/api/course/{self.course_id}/assessment/{self.assessment_id}/questions"
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def request(self, method, url, ids):
+        token = create_access_token(identity=self.instructor)
+        db.session.expunge_all()
+        with QueryCounter(db.engine) as counter:
+            response = self.client.open(url, method=method, json={'ids': ids},
+                                        headers={'Authorization': f"Bearer {token}"})
+        self.assertEqual(200, response.status_code)
+        return response.json, counter.count
+
+    def add_questions(self, n):
+        questions = [ShortAnswerQuestion(prompt=f"Question {i}", answer="?") for i in range(n)]
+        db.session.add_all(questions)
+        db.session.commit()
+        return [q.id for q in questions]
+
+    def test_constant_queries(self):
+        first_id, *few_ids = self.add_questions(6)
+        many_ids = self.add_questions(500)
+        self.request('PATCH', self.url, [first_id])
+
+        result, few = self.request('PATCH', self.url, few_ids + [0])
+        self.assertEqual(few_ids, [q['id'] for q in result['added']])
+        self.assertEqual([first_id], [q['id'] for q in result['removed']])
+
+        result, many = self.request('PATCH', self.url, many_ids + [0])
+        self.assertEqual(few, many)
+        self.assertEqual(many_ids, [q['id'] for q in result['added']])
+        self.assertEqual(few_ids, [q['id'] for q in result['removed']])
+        self.assertEqual([0], result['invalid-ids'])
+
+        assessment = Assessment.query.get(self.assessment_id)
+        self.assertEqual(set(many_ids), {q.id for q in assessment.questions})
+
+    def test_add_and_remove(self):
+        topics = [Topic(text=f"Topic {i}") for i in range(4)]
+        db.session.add_all(topics)
+        db.session.commit()
+        ids = [t.id for t in topics]
+
+        # posting only adds
+        url = f"/api/course/{self.course_id}/topics"
+        self.request('POST', url, ids[:2])
+        result, _ = self.request('POST', url, [ids[2], ids[1], ids[2]])
+        self.assertEqual([ids[2]], [t['id'] for t in result['added']])
+        self.assertEqual([ids[1]], [t['id'] for t in result['previously-added']])
+        self.assertEqual([], result['removed'])
+
+        # while patching replaces the collection
+        self.request('PATCH', self.url, self.add_questions(3))
+        new_ids = self.add_questions(1)
+        result, _ = self.request('PATCH', self.url, new_ids)
+        self.assertEqual(3, len(result['removed']))
+        assessment = Assessment.query.get(self.assessment_id)
+        self.assertEqual(new_ids, [q.id for q in assessment.questions])
+        self.assertEqual(ids[:3], sorted(t.id for t in Course.query.get(self.course_id).topics))
+
+    def test_one_to_many(self):
+        meetings = [ClassMeeting(title=f"Meeting {i}") for i in range(3)]
+        db.session.add_all(meetings)
+        db.session.commit()
+        meeting_ids = [m.id for m in meetings]
+
+        url = f"/api/course/{self.course_id}/meetings"
+        result, _ = self.request('POST', url, meeting_ids[:2])
+        self.assertEqual(["Meeting 0", "Meeting 1"], [m['title'] for m in result['added']])
+        self.assertEqual(set(meeting_ids[:2]),
+                         {m.id for m in Course.query.get(self.course_id).meetings})
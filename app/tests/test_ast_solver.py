@@ -1,6 +1,6 @@
 
 import unittest
-from app.ast_solver import same_ast_tree
+from app.ast_solver import same_ast_tree, code_hash, UnsupportedSyntaxError
 
 class TestASTSolver(unittest.TestCase):
     def test_basics(self):
@@ -154,5 +154,29 @@ class TestASTSolver(unittest.TestCase):
         self.assertEqual(True, same_ast_tree("apples and oranges", " oranges and apples"))
         self.assertEqual(False, same_ast_tree("apples and oranges", " oranges or apples"))
 
+    def test_canonical_forms(self):
+        self.assertEqual(True, same_ast_tree("x>y", "y<x"))
+        self.assertEqual(False, same_ast_tree("x>y", "x<y")) # only the operator was mirrored
+        self.assertEqual(True, same_ast_tree("x==y", "y==x"))
+        self.assertEqual(True, same_ast_tree("x>y>=z", "z<=y<x"))
+        self.assertEqual(False, same_ast_tree("x>y>=z", "z<y<=x"))
+        self.assertEqual(True, same_ast_tree("a and b and c", "c and a and b"))
+        self.assertEqual(False, same_ast_tree("a or b", "b or a"))
+        self.assertEqual(True, same_ast_tree("x**2", "x**2"))
+        self.assertEqual(False, same_ast_tree("x**2", "2**x")) # not commutative
+        self.assertEqual(False, same_ast_tree("x%2", "2%x"))
+        self.assertEqual(True, same_ast_tree("foo(a=1, b=2)", "foo(b=2, a=1)"))
+        self.assertEqual(False, same_ast_tree("foo(a=1)", "foo(a=2)"))
+        self.assertEqual(True, same_ast_tree("p.x += 1", "p.x = 1 + p.x"))
+        self.assertEqual(True, same_ast_tree("x[0] *= y", "x[0] = y * x[0]"))
+        self.assertEqual(False, same_ast_tree("if x:\n\tpass\n\tbreak", "if x:\n\tpass"))
+        self.assertEqual(False, same_ast_tree("x=1", "x=1\ny=2"))
+
+    def test_code_hash(self):
+        self.assertEqual(code_hash("x = a + b"), code_hash("x=b+a"))
+        self.assertNotEqual(code_hash("x = a - b"), code_hash("x=b-a"))
+        self.assertRaises(SyntaxError, code_hash, "x = ")
+        self.assertRaises(UnsupportedSyntaxError, code_hash, "x = 1; y = 2")
+
     def test_super_complex(self):
         pass
\ No newline at end of file
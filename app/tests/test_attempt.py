@@ -1,6 +1,6 @@
 import unittest
 from app import create_app, db
-from app.db_models import ShortAnswerQuestion, TextAttempt, Assessment, User
+from app.db_models import ShortAnswerQuestion, TextAttempt, Assessment, User, ReviewState
 from datetime import date, timedelta, datetime
 
 class AttemptModelCase(unittest.TestCase):
@@ -93,5 +93,57 @@ class AttemptModelCase(unittest.TestCase):
         self.assertEqual(q1_attempt.quality, 3) 
 
 
+    def test_review_state_tracks_latest_attempt(self):
+        self.assertEqual(0, ReviewState.query.count())
 
+        a1 = TextAttempt(response="Attempt1", user=self.u1, question=self.q1,
+                         time=datetime.now() - timedelta(days=2),
+                         next_attempt=date.today() + timedelta(days=6),
+                         e_factor=2.5, interval=6, quality=4)
+        db.session.add(a1)
+        db.session.commit()
+
+        state = ReviewState.query.get((self.u1.id, self.q1.id))
+        self.assertEqual(date.today() + timedelta(days=6), state.next_attempt)
+        self.assertEqual(4, state.quality)
+
+        # a newer attempt changes everything except the latest next_attempt,
+        # which is the max over all of the user's attempts
+        a2 = TextAttempt(response="Attempt2", user=self.u1, question=self.q1,
+                         time=datetime.now(), next_attempt=date.today(),
+                         e_factor=2.3, interval=1, quality=2)
+        db.session.add(a2)
+        db.session.commit()
+
+        state = ReviewState.query.get((self.u1.id, self.q1.id))
+        self.assertEqual(date.today() + timedelta(days=6), state.next_attempt)
+        self.assertEqual(2.3, state.e_factor)
+        self.assertEqual(1, state.interval)
+        self.assertEqual(2, state.quality)
+
+        # updating an attempt (e.g. via sm2_update) refreshes the state
+        a2.sm2_update(5)
+        db.session.commit()
+        state = ReviewState.query.get((self.u1.id, self.q1.id))
+        self.assertEqual(5, state.quality)
+
+        # removing all attempts removes the state
+        db.session.delete(a1)
+        db.session.delete(a2)
+        db.session.commit()
+        self.assertEqual(0, ReviewState.query.count())
+
+    def test_review_state_rebuild(self):
+        a1 = TextAttempt(response="Attempt1", user=self.u1, question=self.q1,
+                         time=datetime.now(), next_attempt=date.today(),
+                         e_factor=2.5, interval=1, quality=3)
+        db.session.add(a1)
+        db.session.commit()
+
+        db.session.execute(ReviewState.__table__.delete())
+        self.assertEqual(0, ReviewState.query.count())
 
+        ReviewState.rebuild()
+        state = ReviewState.query.get((self.u1.id, self.q1.id))
+        self.assertEqual(date.today(), state.next_attempt)
+        self.assertEqual(3, state.quality)
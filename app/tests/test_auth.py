@@ -1,10 +1,14 @@
+import time
 import unittest
 import warnings
 from urllib.parse import urlparse
 from flask import url_for
+from flask_jwt_extended import create_access_token
 
 from app import create_app, db
+from app.auth import identities, load_identity, is_enrolled
 from app.db_models import User, Course, ShortAnswerQuestion, TextAttempt
+from app.tests.query_counter import QueryCounter
 from datetime import date, datetime, timedelta
 
 class AuthenticationTests(unittest.TestCase):
@@ -66,5 +70,148 @@ class AuthenticationTests(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"Could not sign in", response.data)
 
+
+class IdentityCacheCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(email="student@example.com", first_name="Test", last_name="Student")
+        self.user.set_password("password")
+        self.courses = [Course(name=f"course{i}", title=f"Course {i}", description="",
+                               start_date=date.today(), end_date=date.today())
+                        for i in range(2)]
+        self.courses[0].users.append(self.user)
+        db.session.add_all([self.user] + self.courses)
+        db.session.commit()
+        self.user_id = self.user.id
+        self.course_ids = [c.id for c in self.courses]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def load(self, method='GET'):
+        """ Loads the user as in a new request, returning the user, the
+        number of queries that took, and which courses they're enrolled in. """
+        db.session.expunge_all()
+        with self.app.test_request_context(method=method):
+            with QueryCounter(db.engine) as counter:
+                user = load_identity(self.user_id)
+                courses = [c.id for c in Course.query.order_by(Course.id)
+                           if is_enrolled(user, c)]
+            return user, counter.count - 1, courses
+
+    def test_cached(self):
+        user, queries, courses = self.load()
+        self.assertEqual("student@example.com", user.email)
+        self.assertEqual(1, queries) # the user and their enrollments
+        self.assertEqual(self.course_ids[:1], courses)
+
+        user, queries, courses = self.load()
+        self.assertEqual(0, queries)
+        self.assertEqual(self.course_ids[:1], courses)
+        self.assertEqual(("student@example.com", False), (user.email, user.instructor))
+        self.assertTrue(user.check_password("password"))
+        self.assertEqual((1, 1), (identities.hits, identities.misses))
+
+        # the user is in the session, as if they had been queried
+        user.first_name = "Changed"
+        db.session.commit()
+        self.assertEqual("Changed", User.query.get(self.user_id).first_name)
+
+        with self.app.test_request_context():
+            self.assertIsNone(load_identity(self.user_id + 100))
+
+    def test_forgotten_when_changed(self):
+        self.load()
+
+        # rosters (which are updated in bulk)
+        course = Course.query.get(self.course_ids[0])
+        course.update_roster([("new@example.com", "Student", "New")], add_drop=True)
+        db.session.commit()
+        user, queries, courses = self.load()
+        self.assertEqual(([], 1), (courses, queries))
+
+        # enrollments through the ORM
+        Course.query.get(self.course_ids[1]).users.append(User.query.get(self.user_id))
+        db.session.commit()
+        user, queries, courses = self.load()
+        self.assertEqual((self.course_ids[1:], 1), (courses, queries))
+
+        # role changes
+        User.query.get(self.user_id).instructor = True
+        db.session.commit()
+        user, queries, _ = self.load()
+        self.assertEqual((True, 1), (user.instructor, queries))
+
+        # deleted courses (whose enrollments go with them)
+        db.session.delete(Course.query.get(self.course_ids[1]))
+        db.session.commit()
+        user, queries, courses = self.load()
+        self.assertEqual(([], 1), (courses, queries))
+
+        # but not if the changes are rolled back
+        User.query.get(self.user_id).admin = True
+        db.session.flush()
+        db.session.rollback()
+        user, queries, _ = self.load()
+        self.assertEqual((False, 0), (user.admin, queries))
+
+    def test_loaded_for_writes(self):
+        self.load()
+        self.assertEqual(0, self.load('HEAD')[1])
+
+        # e.g. in case another worker changed their roles
+        user, queries, courses = self.load('POST')
+        self.assertEqual((1, self.course_ids[:1]), (queries, courses))
+        self.assertEqual(1, self.load('DELETE')[1])
+
+    def test_expires(self):
+        identities.configure(ttl=0.05, maxsize=10)
+        self.load()
+        self.assertEqual(0, self.load()[1])
+        time.sleep(0.06)
+        self.assertEqual(1, self.load()[1])
+
+        # or isn't cached at all
+        identities.configure(ttl=0, maxsize=10)
+        self.load()
+        self.assertEqual(0, len(identities))
+
+    def test_api_requests(self):
+        instructor = User(email="instructor@example.com", first_name="Test",
+                          last_name="Instructor", instructor=True)
+        instructor.set_password("password")
+        self.courses[0].users.append(instructor)
+        db.session.add(instructor)
+        db.session.commit()
+
+        token = create_access_token(identity=instructor)
+        url = f"/api/course/{self.course_ids[0]}/topics"
+        client = self.app.test_client()
+
+        # the user and their enrollments are loaded with one query, which is
+        # saved once they're cached
+        counts = []
+        for _ in range(2):
+            db.session.expunge_all()
+            with QueryCounter(db.engine) as counter:
+                response = client.get(url, headers={'Authorization': f"Bearer {token}"})
+            self.assertEqual(200, response.status_code)
+            counts.append(counter.count)
+        self.assertEqual(counts[0] - 1, counts[1])
+
+        # dropping the instructor takes effect right away
+        course = Course.query.get(self.course_ids[0])
+        course.users.remove(User.query.filter_by(email="instructor@example.com").one())
+        db.session.commit()
+        response = client.get(url, headers={'Authorization': f"Bearer {token}"})
+        self.assertEqual(401, response.status_code)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
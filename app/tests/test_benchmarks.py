@@ -0,0 +1,402 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.db_models import (
+    Course, Assessment, Objective, User, Question, Attempt, ReviewState,
+    QuestionType, ResponseType, TextAttempt, SingleLineCodeQuestion,
+    enrollments, assessment_questions
+)
+from app.grading import regrade
+from app.instructor import add_students_from_roster
+from app.rendering import render_markdown, create_converter
+from app import ast_solver
+from app.tests.query_counter import QueryCounter
+from datetime import date, timedelta, datetime
+
+# The timed benchmarks only run (at full, production-like scale) when
+# CADET_BENCHMARK is set. The checks that don't depend on timing (e.g. the
+# number of queries) always run, at a smaller scale.
+FULL_SCALE = bool(os.environ.get('CADET_BENCHMARK'))
+
+NUM_STUDENTS = 500 if FULL_SCALE else 20
+NUM_QUESTIONS = 200 if FULL_SCALE else 20
+NUM_DAYS = 30 if FULL_SCALE else 5
+NUM_OBJECTIVES = 10
+NUM_CONVERSIONS = 2000 if FULL_SCALE else 200
+EXPRESSION_DEPTH = 11 if FULL_SCALE else 9
+NUM_REGRADE_ATTEMPTS = 100000 if FULL_SCALE else 5000
+NUM_LISTED_QUESTIONS = 500
+NUM_ROSTER_STUDENTS = 1000
+
+# prompts in the style of the ones used in our courses
+PROMPT_CORPUS = [
+    "Type in something similar to the following: **list comprehension**",
+    "What is the output of the following code?\n\n"
+    "```python\nnums = [1, 2, 3]\nprint([n * 2 for n in nums])\n```\n",
+    "Write a single line of code that assigns the sum of `x` and `y` to a "
+    "variable named `total`.",
+    "The running time of binary search is $O(\\log n)$. What is the running "
+    "time of linear search?",
+    "Which of the following are *mutable* types in Python?\n\n"
+    "* `list`\n* `tuple`\n* `dict`\n* `str`\n",
+    "Put the following lines in order to define a function that returns the "
+    "largest element of a list:\n\n```python\ndef largest(lst):\n"
+    "    best = lst[0]\n    for x in lst:\n        if x > best:\n"
+    "            best = x\n    return best\n```\n",
+    "Given $$f(n) = \\sum_{i=1}^{n} i$$ what is $f(10)$?",
+]
+
+
+class SeededCase(unittest.TestCase):
+    """ Base for the cases that seed the database in bulk. """
+
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def bulk_insert(self, table, rows, chunk_size=10000):
+        for i in range(0, len(rows), chunk_size):
+            db.session.execute(table.insert(), rows[i:i+chunk_size])
+
+    def seed_course(self):
+        """ Seeds a course with one assessment, using bulk inserts to avoid
+        the overhead of the ORM. Every student attempts every question once
+        per day for NUM_DAYS days. """
+        self.course = Course(name="bench", title="Benchmark Course", description="",
+                             start_date=date.today()-timedelta(days=NUM_DAYS),
+                             end_date=date.today()+timedelta(days=NUM_DAYS))
+        self.assessment = Assessment(title="Benchmark assessment")
+        self.course.assessments.append(self.assessment)
+        db.session.add(self.course)
+
+        self.objectives = [Objective(description=f"Objective {i}")
+                           for i in range(NUM_OBJECTIVES)]
+        for objective in self.objectives:
+            self.assessment.objectives.append(objective)
+        db.session.commit()
+
+        self.bulk_insert(User.__table__, [
+            {'id': i+1, 'email': f"student{i}@test.com", 'first_name': f"Student{i}",
+             'last_name': "User", 'password_hash': "!", 'admin': False,
+             'instructor': False}
+            for i in range(NUM_STUDENTS)])
+
+        self.bulk_insert(Question.__table__, [
+            {'id': i+1, 'type': QuestionType.GENERIC, 'prompt': f"Question {i}",
+             'public': True, 'enabled': True,
+             'objective_id': self.objectives[i % NUM_OBJECTIVES].id}
+            for i in range(NUM_QUESTIONS)])
+
+        self.bulk_insert(enrollments, [
+            {'course_id': self.course.id, 'user_id': i+1} for i in range(NUM_STUDENTS)])
+
+        self.bulk_insert(assessment_questions, [
+            {'assessment_id': self.assessment.id, 'question_id': i+1}
+            for i in range(NUM_QUESTIONS)])
+
+        today = datetime.combine(date.today(), datetime.min.time())
+        attempts = []
+        for day in range(NUM_DAYS, 0, -1):
+            for u in range(NUM_STUDENTS):
+                for q in range(NUM_QUESTIONS):
+                    quality = (u + q + day) % 6
+                    attempts.append({
+                        'type': ResponseType.GENERIC, 'user_id': u+1, 'question_id': q+1,
+                        'time': today - timedelta(days=day, hours=-9),
+                        'correct': quality >= 3,
+                        'next_attempt': date.today() + timedelta(days=(u * q) % 7 - day + 1),
+                        'e_factor': 1.3 + quality * 0.3,
+                        'interval': 1, 'quality': quality})
+            self.bulk_insert(Attempt.__table__, attempts)
+            attempts = []
+
+        ReviewState.rebuild()
+        db.session.commit()
+
+        # reload the objects expired by the commit so they aren't counted
+        for obj in [self.course, self.assessment, *self.objectives]:
+            db.session.refresh(obj)
+
+    def seed_questions(self):
+        """ Seeds NUM_LISTED_QUESTIONS questions written by an instructor,
+        who is returned. """
+        instructor = User(email="instructor@test.com", first_name="Test",
+                          last_name="Instructor", instructor=True, password_hash="!")
+        objectives = [Objective(description=f"Objective {i}")
+                      for i in range(NUM_OBJECTIVES)]
+        db.session.add_all([instructor, *objectives])
+        db.session.commit()
+        self.bulk_insert(Question.__table__, [
+            {'type': QuestionType.GENERIC, 'prompt': PROMPT_CORPUS[i % len(PROMPT_CORPUS)],
+             'public': True, 'enabled': True, 'author_id': instructor.id,
+             'objective_id': objectives[i % NUM_OBJECTIVES].id}
+            for i in range(NUM_LISTED_QUESTIONS)])
+        db.session.commit()
+        return instructor
+
+    def seed_roster(self, temp_dir):
+        """ Seeds a course and writes a roster for it with
+        NUM_ROSTER_STUDENTS students. Returns the course and the roster's
+        location. """
+        course = Course(name="roster", title="Roster Course", description="",
+                        start_date=date.today(), end_date=date.today())
+        db.session.add(course)
+        db.session.commit()
+
+        # a fifth of the students already have accounts, and half of those
+        # are already enrolled
+        self.bulk_insert(User.__table__, [
+            {'id': i+1, 'email': f"student{i}@test.com", 'first_name': f"Student{i}",
+             'last_name': "User", 'password_hash': "!", 'admin': False,
+             'instructor': False}
+            for i in range(NUM_ROSTER_STUDENTS // 5)])
+        self.bulk_insert(enrollments, [
+            {'course_id': course.id, 'user_id': i+1} for i in range(NUM_ROSTER_STUDENTS // 10)])
+        db.session.commit()
+
+        file_location = os.path.join(temp_dir, "roster.csv")
+        with open(file_location, 'w', newline='') as roster_file:
+            writer = csv.writer(roster_file)
+            writer.writerow(["Email", "Last", "First"])
+            writer.writerows([f"student{i}@test.com", "User", f"Student{i}"]
+                             for i in range(NUM_ROSTER_STUDENTS))
+
+        return course, file_location
+
+    def list_questions(self, instructor, fields=None):
+        """ Lists the instructor's questions (only the given fields, if
+        any), returning the response. """
+        url = f"/api/questions?author=self&limit={NUM_LISTED_QUESTIONS}"
+        if fields:
+            url += f"&fields={fields}"
+
+        headers = {'Authorization': f"Bearer {create_access_token(identity=instructor)}"}
+        db.session.expunge_all()
+        response = self.app.test_client().get(url, headers=headers)
+        self.assertEqual(NUM_LISTED_QUESTIONS, len(response.json['questions']))
+        return response
+
+
+class ScaleCase(SeededCase):
+    """ The parts of the benchmarks that don't depend on timing, so they
+    always run. """
+
+    def test_progress_report(self):
+        self.seed_course()
+
+        with QueryCounter(db.engine) as counter:
+            report = self.assessment.progress_report(self.course, average_threshold=3.0)
+
+        self.assertEqual(NUM_STUDENTS, len(report))
+        self.assertLessEqual(counter.count, 10)
+
+        # spot check against the per-user methods
+        user = User.query.get(1)
+        report = {u.id: (remaining, objectives) for u, remaining, objectives in report}
+        self.assertEqual(self.assessment.num_questions_to_practice(user),
+                         report[user.id][0])
+        self.assertEqual(self.assessment.objectives_to_review(user, average_threshold=3.0),
+                         report[user.id][1])
+
+    def test_course_statistics(self):
+        self.seed_course()
+
+        with QueryCounter(db.engine) as counter:
+            statistics = self.course.statistics(self.assessment)
+            statistics.questions_remaining_breakdown()
+            for objective in self.objectives:
+                statistics.star_rating(objective)
+                statistics.skill_breakdown(objective)
+
+        self.assertLessEqual(counter.count, 10)
+
+    def test_sparse_fieldsets(self):
+        instructor = self.seed_questions()
+        full = self.list_questions(instructor)
+        sparse = self.list_questions(instructor, "id,prompt")
+
+        self.assertLess(len(sparse.data), len(full.data) / 2)
+        self.assertEqual({'id', 'prompt'}, set(sparse.json['questions'][0]))
+
+    def test_roster_import(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            course, file_location = self.seed_roster(temp_dir)
+            with self.app.test_request_context(), QueryCounter(db.engine) as counter:
+                add_students_from_roster(course, file_location, 0, 1, 2, add_drop=True)
+
+        self.assertEqual(NUM_ROSTER_STUDENTS, course.users.count())
+        self.assertLessEqual(counter.count, 10)
+
+
+@unittest.skipUnless(FULL_SCALE, "set CADET_BENCHMARK to run the benchmarks")
+class BenchmarkCase(SeededCase):
+    def test_progress_report(self):
+        self.seed_course()
+
+        with QueryCounter(db.engine) as counter:
+            report = self.assessment.progress_report(self.course, average_threshold=3.0)
+
+        self.assertEqual(NUM_STUDENTS, len(report))
+        self.assertLessEqual(counter.count, 10)
+        print(f"\nprogress_report: {NUM_STUDENTS} students x {NUM_QUESTIONS} questions "
+              f"in {counter.elapsed:.3f}s ({counter.count} queries)")
+
+        # spot check against the per-user methods
+        user = User.query.get(1)
+        report = {u.id: (remaining, objectives) for u, remaining, objectives in report}
+        self.assertEqual(self.assessment.num_questions_to_practice(user),
+                         report[user.id][0])
+        self.assertEqual(self.assessment.objectives_to_review(user, average_threshold=3.0),
+                         report[user.id][1])
+
+    def test_course_statistics(self):
+        self.seed_course()
+
+        with QueryCounter(db.engine) as counter:
+            statistics = self.course.statistics(self.assessment)
+            statistics.questions_remaining_breakdown()
+            for objective in self.objectives:
+                statistics.star_rating(objective)
+                statistics.skill_breakdown(objective)
+
+        self.assertLessEqual(counter.count, 10)
+        print(f"\nstatistics: {NUM_STUDENTS} students x {NUM_OBJECTIVES} objectives "
+              f"in {counter.elapsed:.3f}s ({counter.count} queries)")
+
+    def test_regrade(self):
+        question = SingleLineCodeQuestion(prompt="Sum", answer="total = x - y",
+                                          add_body=False, language="python")
+        db.session.add(question)
+        db.session.commit()
+
+        # students' responses, about half of which are correct once the
+        # answer is fixed
+        responses = ["total = x + y", "total = y + x", "total=x+y", "total = x - y",
+                     "total = sum([x, y])", "total += x + y", "total = x +"]
+        self.bulk_insert(Attempt.__table__, [
+            {'id': i+1, 'type': ResponseType.TEXT, 'question_id': question.id,
+             'user_id': 1, 'correct': responses[i % len(responses)] == "total = x - y",
+             'next_attempt': date.today(), 'e_factor': 2.5, 'interval': 1, 'quality': -1}
+            for i in range(NUM_REGRADE_ATTEMPTS)])
+        self.bulk_insert(TextAttempt.__table__, [
+            {'id': i+1, 'response': responses[i % len(responses)]}
+            for i in range(NUM_REGRADE_ATTEMPTS)])
+        question.answer = "total = x + y"
+        db.session.commit()
+
+        start = time.perf_counter()
+        graded, changed = regrade(workers=2)
+        elapsed = time.perf_counter() - start
+
+        print(f"\nregrade: {graded} attempts in {elapsed:.3f}s "
+              f"({graded / elapsed:.0f} attempts/s, {changed} changed)")
+        self.assertEqual(NUM_REGRADE_ATTEMPTS, graded)
+        self.assertEqual(Attempt.query.filter_by(correct=True).count(),
+                         sum(1 for i in range(NUM_REGRADE_ATTEMPTS) if i % 7 < 3))
+        self.assertLess(elapsed, 60)
+
+    def test_sparse_fieldsets(self):
+        instructor = self.seed_questions()
+
+        def timed_list(fields=None):
+            """ Returns the size of the response and the best time (over a
+            few rounds) to list the questions. """
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                response = self.list_questions(instructor, fields)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            return len(response.data), best
+
+        full_size, full_time = timed_list()
+        sparse_size, sparse_time = timed_list("id,prompt")
+
+        print(f"\nquestion list: {NUM_LISTED_QUESTIONS} questions, "
+              f"{full_size} bytes in {full_time:.3f}s with all fields, "
+              f"{sparse_size} bytes in {sparse_time:.3f}s with id and prompt")
+        self.assertLess(sparse_time, full_time)
+
+    def test_roster_import(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            course, file_location = self.seed_roster(temp_dir)
+            with self.app.test_request_context():
+                start = time.perf_counter()
+                add_students_from_roster(course, file_location, 0, 1, 2, add_drop=True)
+                elapsed = time.perf_counter() - start
+
+        print(f"\nroster import: {NUM_ROSTER_STUDENTS} students in {elapsed:.3f}s")
+        self.assertEqual(NUM_ROSTER_STUDENTS, course.users.count())
+        self.assertLess(elapsed, 1)
+
+
+@unittest.skipUnless(FULL_SCALE, "set CADET_BENCHMARK to run the benchmarks")
+class MarkdownBenchmarkCase(unittest.TestCase):
+    def conversions_per_second(self, convert):
+        """ Returns the best rate (over a few rounds) at which convert
+        handles the prompt corpus. """
+        best = 0
+        for _ in range(3):
+            start = time.perf_counter()
+            for i in range(NUM_CONVERSIONS):
+                convert(PROMPT_CORPUS[i % len(PROMPT_CORPUS)])
+            best = max(best, NUM_CONVERSIONS / (time.perf_counter() - start))
+
+        return best
+
+    def test_converter_pool(self):
+        # a new converter for every conversion (how we used to render)
+        unpooled = self.conversions_per_second(
+            lambda text: create_converter().convert(text))
+        pooled = self.conversions_per_second(render_markdown)
+
+        print(f"\nmarkdown: {unpooled:.0f} conversions/s unpooled, "
+              f"{pooled:.0f} conversions/s pooled")
+        self.assertGreater(pooled, unpooled)
+
+        for text in PROMPT_CORPUS:
+            self.assertEqual(create_converter().convert(text), render_markdown(text))
+            self.assertEqual(create_converter(False).convert(text),
+                             render_markdown(text, code_linenums=False))
+
+
+def full_expression(depth, last="y", mirrored=False):
+    """ Returns a full binary tree of additions with 2**depth operands, all x
+    except the last one. If mirrored, the operands of every addition are
+    swapped, which made the old (pairwise) matcher try every ordering of
+    the operands. """
+    if depth == 0:
+        return last
+
+    left = full_expression(depth-1, "x", mirrored)
+    right = full_expression(depth-1, last, mirrored)
+    return f"({right} + {left})" if mirrored else f"({left} + {right})"
+
+
+@unittest.skipUnless(FULL_SCALE, "set CADET_BENCHMARK to run the benchmarks")
+class AstSolverBenchmarkCase(unittest.TestCase):
+    def test_canonical_hashing(self):
+        expected = full_expression(EXPRESSION_DEPTH)
+        for actual, equivalent in [(full_expression(EXPRESSION_DEPTH, mirrored=True), True),
+                                   (full_expression(EXPRESSION_DEPTH, "z", True), False)]:
+            ast_solver.code_hash.cache_clear()
+            start = time.perf_counter()
+            result = ast_solver.same_ast_tree(expected, actual)
+            elapsed = time.perf_counter() - start
+
+            print(f"\nast_solver: depth {EXPRESSION_DEPTH} {'equivalent' if equivalent else 'different'} "
+                  f"expressions in {elapsed:.4f}s")
+            self.assertEqual(equivalent, result)
+            self.assertLess(elapsed, 1)
@@ -375,3 +375,42 @@ class CourseModelCase(unittest.TestCase):
 
         self.assertEqual(self.c.student_skill_breakdown(lo1, a), (1, 1, 1))
 
+
+    def test_update_roster(self):
+        existing = User(email="existing@test.com", first_name="Existing", last_name="Student")
+        existing.set_password("test")
+        enrolled = User(email="enrolled@test.com", first_name="Enrolled", last_name="Student")
+        enrolled.set_password("test")
+        missing = User(email="missing@test.com", first_name="Missing", last_name="Student")
+        missing.set_password("test")
+        teacher = User(email="teacher@test.com", first_name="Teacher", last_name="User",
+                       instructor=True)
+        teacher.set_password("test")
+        self.c.users.extend([enrolled, missing, teacher])
+        db.session.add(existing)
+        db.session.commit()
+
+        students = [("new@test.com", "Student", "New"), ("existing@test.com", "Student", "Existing"),
+                    ("enrolled@test.com", "Student", "Enrolled"), ("new@test.com", "Student", "New")]
+        created, added, already, dropped = self.c.update_roster(students, add_drop=True)
+        db.session.commit()
+
+        self.assertEqual(["new@test.com"], created)
+        self.assertEqual(["new@test.com", "existing@test.com"], added)
+        self.assertEqual(["enrolled@test.com"], already)
+        self.assertEqual(["missing@test.com"], dropped)
+        self.assertEqual({"new@test.com", "existing@test.com", "enrolled@test.com", "teacher@test.com"},
+                         {u.email for u in self.c.users})
+
+        # new users can't log in until they reset their password
+        new = User.query.filter_by(email="new@test.com").one()
+        self.assertEqual(("New", "Student"), (new.first_name, new.last_name))
+        self.assertFalse(new.has_usable_password())
+        self.assertFalse(new.check_password(User.UNUSABLE_PASSWORD))
+        new.set_password("test")
+        self.assertTrue(new.check_password("test"))
+
+        # nothing is dropped unless asked
+        self.assertEqual(([], [], ["new@test.com"], []),
+                         self.c.update_roster([("new@test.com", "Student", "New")]))
+        self.assertEqual(4, self.c.users.count())
@@ -0,0 +1,167 @@
+import gc
+import logging
+import threading
+import time
+import weakref
+import unittest
+from unittest.mock import patch
+from config import TestConfig
+from app import create_app, db
+from app.db_models import User
+from app.email import send_email
+from app.tests.smtp_sink import SMTPSink
+
+
+class EmailCase(unittest.TestCase):
+    def setUp(self):
+        self.sink = SMTPSink()
+        self.sink.start()
+
+    def tearDown(self):
+        self.sink.stop()
+
+    def create_app(self, **config):
+        settings = dict(MAIL_SERVER="localhost", MAIL_PORT=self.sink.port,
+                        MAIL_SUPPRESS_SEND=False, MAIL_RETRY_BACKOFF=0.01)
+        settings.update(config)
+        app = create_app(type('EmailConfig', (TestConfig,), settings))
+        self.addCleanup(app.mail_queue.stop if app.mail_queue else lambda: None)
+        return app
+
+    def send(self, app, count):
+        with app.test_request_context():
+            for i in range(count):
+                send_email(f"Message {i}", sender="cadet@test.com",
+                           recipients=[f"student{i}@test.com"],
+                           text_body=f"Message {i}", html_body=f"<p>Message {i}</p>")
+
+    def test_connections_reused(self):
+        app = self.create_app(MAIL_WORKERS=2)
+        self.send(app, 50)
+        app.mail_queue.join()
+
+        self.assertEqual(50, len(self.sink.messages))
+        self.assertEqual({f"student{i}@test.com" for i in range(50)},
+                         {recipients[0] for recipients, _ in self.sink.messages})
+
+        # one connection per worker, not per message
+        self.assertLessEqual(self.sink.connections, 2)
+        self.assertEqual((50, 0), (app.mail_queue.sent, app.mail_queue.failed))
+        self.assertEqual(2, len([t for t in threading.enumerate()
+                                 if t.name.startswith("mail-worker")]))
+
+    def test_idle_connection_closed(self):
+        app = self.create_app(MAIL_WORKERS=1, MAIL_IDLE_TIMEOUT=0.05)
+        self.send(app, 1)
+        app.mail_queue.join()
+        time.sleep(0.2)
+        self.send(app, 1)
+        app.mail_queue.join()
+
+        self.assertEqual(2, len(self.sink.messages))
+        self.assertEqual(2, self.sink.connections)
+
+    def test_retried_when_unavailable(self):
+        self.sink.refuse = 2
+        app = self.create_app(MAIL_WORKERS=1)
+        self.send(app, 3)
+        app.mail_queue.join()
+
+        self.assertEqual(3, len(self.sink.messages))
+        self.assertEqual((3, 0, 2), (app.mail_queue.sent, app.mail_queue.failed,
+                                     app.mail_queue.retries))
+
+    def test_given_up_on(self):
+        self.sink.refuse = 10
+        app = self.create_app(MAIL_WORKERS=1, MAIL_MAX_ATTEMPTS=3)
+        self.send(app, 1)
+        app.mail_queue.join()
+
+        self.assertEqual(0, len(self.sink.messages))
+        self.assertEqual((0, 1, 2), (app.mail_queue.sent, app.mail_queue.failed,
+                                     app.mail_queue.retries))
+        self.assertEqual(3, self.sink.connections)
+
+    def test_backpressure(self):
+        app = self.create_app(MAIL_WORKERS=1, MAIL_QUEUE_SIZE=2, MAIL_QUEUE_WARN_SIZE=2)
+        queue = app.mail_queue
+
+        # hold up the worker so the queue fills up
+        sending = threading.Event()
+        release = threading.Event()
+        def slow_deliver(connection, msg):
+            sending.set()
+            release.wait(5)
+            return connection
+
+        with patch.object(queue, '_deliver', side_effect=slow_deliver), \
+                self.assertLogs(app.logger, logging.INFO) as logs:
+            self.send(app, 1)
+            sending.wait(5)
+            self.send(app, 4)
+
+            # messages that don't fit are dropped rather than waited on
+            self.assertEqual((2, 2), (queue.backlog, queue.rejected))
+            self.assertEqual(2, queue.max_backlog)
+            release.set()
+            queue.join()
+            queue.stop()
+        self.assertEqual(0, queue.backlog)
+
+        # the counters are logged as the queue backs up and catches up (the
+        # patched _deliver doesn't count messages as sent)
+        messages = [record.getMessage() for record in logs.records]
+        self.assertIn("Mail queue is backing up: 2 waiting, 0 sent, 0 failed, 0 retries, "
+                      "0 dropped, at most 2 waiting", messages)
+        self.assertEqual(2, len([m for m in messages if "dropped message" in m]))
+        self.assertIn("Mail queue has caught up: 0 waiting, 0 sent, 0 failed, 0 retries, "
+                      "2 dropped, at most 2 waiting", messages)
+        self.assertIn("Mail queue stopped: 0 waiting, 0 sent, 0 failed, 0 retries, "
+                      "2 dropped, at most 2 waiting", messages)
+
+    def test_sent_right_away_without_workers(self):
+        app = self.create_app(MAIL_WORKERS=0)
+        self.assertIsNone(app.mail_queue)
+        self.send(app, 2)
+        self.assertEqual(2, len(self.sink.messages))
+
+    def test_stop_sends_waiting_messages(self):
+        app = self.create_app(MAIL_WORKERS=1)
+        self.send(app, 20)
+        app.mail_queue.stop()
+        self.assertEqual(20, len(self.sink.messages))
+
+    def test_app_not_kept_alive(self):
+        app = self.create_app(MAIL_WORKERS=1)
+        self.send(app, 1)
+        app.mail_queue.join()
+        threads = list(app.mail_queue._threads)
+        app_ref = weakref.ref(app)
+
+        # (extensions such as JSGlue hold on to the last app created)
+        self.create_app(MAIL_WORKERS=0)
+        del app
+        gc.collect()
+
+        # the workers are stopped along with the app
+        self.assertIsNone(app_ref())
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def test_forgot_password(self):
+        app = self.create_app(MAIL_WORKERS=1)
+        with app.app_context():
+            db.create_all()
+            user = User(email="test@test.com", first_name="Test", last_name="User")
+            user.set_password("test")
+            db.session.add(user)
+            db.session.commit()
+
+            client = app.test_client()
+            response = client.post("/auth/forgot", data={'email': "test@test.com"})
+            self.assertEqual(302, response.status_code)
+            app.mail_queue.join()
+
+            self.assertEqual(1, len(self.sink.messages))
+            self.assertEqual(["test@test.com"], self.sink.messages[0][0])
+            db.session.remove()
+            db.drop_all()
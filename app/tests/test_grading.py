@@ -0,0 +1,259 @@
+import unittest
+from unittest.mock import patch
+from marshmallow import ValidationError
+from app import create_app, db
+from app.db_models import (
+    AutoCheckQuestion, AutoCheckQuestionSchema, SingleLineCodeQuestion,
+    SingleLineCodeQuestionSchema, GradedResponse, ShortAnswerQuestion, User,
+    TextAttempt
+)
+from app.grading import (
+    compile_regex_answer, compile_code_answer, grade_response, check_response,
+    InvalidAnswerError, VerdictCache, verdicts, regrade
+)
+
+class CompileAnswerCase(unittest.TestCase):
+    def test_regex_answers(self):
+        for pattern in ["a+b", "(ab|cd)*", "[a-z]+(,[a-z]+)*", "(?:x+y)+", "(a*)?",
+                        "(cat|dog)+", r"(\w+\s)+", "(0|[1-9][0-9]*)(\\.[0-9]+)?",
+                        r"(\w|\d)+"]:
+            self.assertEqual(pattern, compile_regex_answer(pattern))
+
+        # repeating something that can match the same text in more than one
+        # way can take exponential time to match
+        for pattern in ["(a+)+", "(a*b?)*$", "x(y(a{2,3})*)", "(a|a)*", "(a|aa)+",
+                        "(.*a){12}", r"(\d+\s?)+", "((ab|a)(c|bc))+", "(?i)(a|AB)+", "("]:
+            with self.subTest(pattern=pattern):
+                self.assertRaises(InvalidAnswerError, compile_regex_answer, pattern)
+
+    def test_code_answers(self):
+        self.assertEqual(compile_code_answer("x = a + b"), compile_code_answer("x=b+a"))
+        self.assertEqual(compile_code_answer("if x:", add_body=True),
+                         compile_code_answer("if x:\n\tpass"))
+        self.assertRaises(InvalidAnswerError, compile_code_answer, "if x:")
+        self.assertRaises(InvalidAnswerError, compile_code_answer, "x = 1; y = 2")
+
+
+class VerdictCacheCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_lru_eviction(self):
+        c = VerdictCache(maxsize=2)
+        self.assertIsNone(c.get("a"))
+        c.put("a", 1, True)
+        c.put("b", 1, False)
+        self.assertTrue(c.get("a")) # a is now most recently used
+        self.assertFalse(c.get("b"))
+
+        c.put("c", 2, False)
+        self.assertEqual(2, len(c))
+        self.assertIsNone(c.get("a"))
+        self.assertEqual((2, 2), (c.hits, c.misses))
+        self.assertEqual(0.5, c.hit_rate)
+
+
+class GradingCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        verdicts.clear()
+
+    def tearDown(self):
+        verdicts.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_compiled_when_saved(self):
+        code = SingleLineCodeQuestion(prompt="Code", answer="for x in y:",
+                                      add_body=True, language="python")
+        pattern = AutoCheckQuestion(prompt="Regex", answer="[0-9]+", regex=True)
+        invalid = AutoCheckQuestion(prompt="Invalid", answer="(a+)+", regex=True)
+        db.session.add_all([code, pattern, invalid])
+        db.session.commit()
+
+        self.assertEqual(compile_code_answer("for x in y:", True), code.compiled_answer)
+        self.assertEqual("[0-9]+", pattern.compiled_answer)
+        self.assertIsNone(invalid.compiled_answer)
+
+        code.answer = "while x:"
+        db.session.commit()
+        self.assertEqual(compile_code_answer("while x:", True), code.compiled_answer)
+
+    def test_grading(self):
+        code = SingleLineCodeQuestion(prompt="Code", answer="x += y * 2",
+                                      add_body=False, language="python")
+        block = SingleLineCodeQuestion(prompt="Block", answer="if x > y:",
+                                       add_body=True, language="python")
+        pattern = AutoCheckQuestion(prompt="Regex", answer="[0-9]+", regex=True)
+        literal = AutoCheckQuestion(prompt="Literal", answer="[0-9]+", regex=False)
+        db.session.add_all([code, block, pattern, literal])
+        db.session.commit()
+
+        # grading uses the compiled answers instead of compiling them again
+        with patch('app.grading.compile_answer') as compile_answer:
+            self.assertTrue(grade_response(code, "x = 2 * y + x"))
+            self.assertFalse(grade_response(code, "x = y * 2"))
+            self.assertFalse(grade_response(code, "x = "))
+            self.assertTrue(grade_response(block, "if y < x:"))
+            self.assertFalse(grade_response(block, "if y > x:"))
+
+            self.assertTrue(grade_response(pattern, "123"))
+            self.assertFalse(grade_response(pattern, "123a"))
+            self.assertFalse(grade_response(pattern, "1" * 1001))
+            self.assertTrue(grade_response(literal, "[0-9]+"))
+            self.assertFalse(grade_response(literal, "123"))
+            self.assertEqual(0, compile_answer.call_count)
+
+        # answers from before they were compiled still work
+        code.compiled_answer = None
+        self.assertTrue(grade_response(code, "x = x + y * 2"))
+
+    def test_schemas_reject_invalid_answers(self):
+        with self.assertRaises(ValidationError) as cm:
+            AutoCheckQuestionSchema().load({'type': 'auto-check', 'prompt': "Regex",
+                                            'answer': "(a+)+", 'regex': True})
+        self.assertIn('answer', cm.exception.messages)
+
+        with self.assertRaises(ValidationError):
+            SingleLineCodeQuestionSchema().load({'type': 'single-line-code', 'prompt': "Code",
+                                                 'answer': "if x:", 'add_body': False,
+                                                 'language': "python"})
+
+        # partial updates are checked against the rest of the question
+        question = AutoCheckQuestion(prompt="Regex", answer="(a+)+", regex=False)
+        db.session.add(question)
+        db.session.commit()
+
+        schema = AutoCheckQuestionSchema()
+        with self.assertRaises(ValidationError):
+            schema.update_obj(question, schema.load({'regex': True}, partial=True))
+
+    def test_verdicts_cached(self):
+        question = SingleLineCodeQuestion(prompt="Code", answer="x = a + b",
+                                          add_body=False, language="python")
+        db.session.add(question)
+        db.session.commit()
+
+        with patch('app.grading.check_response', wraps=check_response) as check:
+            for _ in range(3):
+                self.assertTrue(grade_response(question, "x = b + a"))
+                self.assertFalse(grade_response(question, "x = a - b"))
+            self.assertEqual(2, check.call_count)
+            self.assertEqual((4, 2), (verdicts.hits, verdicts.misses))
+
+            # editing the answer invalidates the previous verdicts
+            question.answer = "x = a - b"
+            db.session.commit()
+            self.assertFalse(grade_response(question, "x = b + a"))
+            self.assertTrue(grade_response(question, "x = a - b"))
+            self.assertEqual(4, check.call_count)
+
+        # verdicts are only persisted if enabled
+        self.assertEqual(0, GradedResponse.query.count())
+
+    def test_persisted_verdicts(self):
+        self.app.config['VERDICT_CACHE_PERSIST'] = True
+
+        question = AutoCheckQuestion(prompt="Regex", answer="[0-9]+", regex=True)
+        literal = AutoCheckQuestion(prompt="Literal", answer="[0-9]+", regex=False)
+        db.session.add_all([question, literal])
+        db.session.commit()
+
+        self.assertTrue(grade_response(question, "42"))
+        self.assertFalse(grade_response(literal, "42"))
+        db.session.commit()
+        self.assertEqual(2, GradedResponse.query.count())
+
+        # another worker (with nothing in memory) uses the persisted verdicts
+        verdicts.clear()
+        with patch('app.grading.check_response') as check:
+            self.assertTrue(grade_response(question, "42"))
+            self.assertFalse(grade_response(literal, "42"))
+            self.assertEqual(0, check.call_count)
+        self.assertEqual(2, verdicts.shared_hits)
+
+        # which are removed when the answer changes or the question is deleted
+        question.answer = "[a-z]+"
+        db.session.commit()
+        self.assertEqual(0, GradedResponse.query.filter_by(question_id=question.id).count())
+        self.assertFalse(grade_response(question, "42"))
+
+        db.session.delete(literal)
+        db.session.commit()
+        self.assertEqual(0, GradedResponse.query.filter_by(question_id=literal.id).count())
+
+
+class RegradeCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.user = User(email="test@test.com", first_name="Test", last_name="User")
+        self.user.set_password("test")
+        self.code = SingleLineCodeQuestion(prompt="Code", answer="x = a - b",
+                                           add_body=False, language="python")
+        self.pattern = AutoCheckQuestion(prompt="Regex", answer="[0-9]+", regex=True)
+        self.short = ShortAnswerQuestion(prompt="Short", answer="Anything")
+        db.session.add_all([self.user, self.code, self.pattern, self.short])
+        db.session.commit()
+
+        # graded against the (wrong) original answers
+        for question, responses in [(self.code, ["x = a - b", " x=a-b ", "x = b - a", "x ="]),
+                                    (self.pattern, ["42", "4 2"]),
+                                    (self.short, ["Something"])]:
+            for response in responses:
+                db.session.add(TextAttempt(response=response, user=self.user, question=question,
+                                           correct=(response.strip() != "x = b - a")))
+        db.session.commit()
+        self.code_id, self.pattern_id = self.code.id, self.pattern.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def verdicts(self, question_id):
+        return {attempt.response: attempt.correct
+                for attempt in TextAttempt.query.filter_by(question_id=question_id)}
+
+    def test_regrade(self):
+        # fix the answer without changing the compiled answer (as if the
+        # grading code had changed)
+        db.session.execute(SingleLineCodeQuestion.__table__.update().values(
+            answer="x = b - a"))
+        db.session.commit()
+
+        graded, changed = regrade(chunk_size=2, workers=0)
+        self.assertEqual((6, 5), (graded, changed))
+        self.assertEqual({"x = a - b": False, " x=a-b ": False, "x = b - a": True,
+                          "x =": False}, self.verdicts(self.code_id))
+        self.assertEqual({"42": True, "4 2": False}, self.verdicts(self.pattern_id))
+        self.assertEqual({"Something": True}, self.verdicts(self.short.id))
+        self.assertEqual(compile_code_answer("x = b - a"), self.code.compiled_answer)
+
+        # nothing changes the second time around
+        self.assertEqual((6, 0), regrade(chunk_size=2, workers=0))
+
+    def test_regrade_command(self):
+        self.code.answer = "x = b - a"
+        db.session.commit()
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['grading', 'regrade', '--question', str(self.code_id),
+                                     '--workers', '2', '--chunk-size', '1'])
+        self.assertIsNone(result.exception)
+        self.assertIn("Regraded 4 attempts: 4 verdicts changed.", result.output)
+        self.assertEqual({"x = a - b": False, " x=a-b ": False, "x = b - a": True,
+                          "x =": False}, self.verdicts(self.code_id))
+        self.assertEqual({"42": True, "4 2": True}, self.verdicts(self.pattern_id))
@@ -0,0 +1,178 @@
+import os
+import logging
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from config import TestConfig
+from app import create_app
+from app.log import DigestMailHandler, stop_logging
+
+
+class FakeSMTP(object):
+    """ Stands in for smtplib.SMTP, recording the messages sent. Connecting
+    sets the connecting event and then waits for the release event (so a
+    test can hold it up like a slow mail server). """
+    messages = []
+    connecting = threading.Event()
+    release = threading.Event()
+
+    def __init__(self, host, port, timeout=None):
+        FakeSMTP.connecting.set()
+        FakeSMTP.release.wait(5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def send_message(self, message):
+        FakeSMTP.messages.append(message)
+
+
+class LoggingCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.temp_dir.name, "cadet.log")
+        FakeSMTP.messages = []
+        FakeSMTP.connecting = threading.Event()
+        FakeSMTP.release = threading.Event()
+        FakeSMTP.release.set()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_app(self, **config):
+        settings = dict(LOG_FILE=self.log_file, LOGGING_LEVEL=logging.INFO)
+        settings.update(config)
+        app = create_app(type('LoggingConfig', (TestConfig,), settings))
+        app.logger.setLevel(logging.INFO)
+        self.addCleanup(stop_logging, app)
+        return app
+
+    def read_log(self):
+        with open(self.log_file) as log_file:
+            return log_file.read()
+
+    def test_file_written_in_background(self):
+        app = self.create_app(LOG_BUFFER_SIZE=1000)
+        for i in range(100):
+            app.logger.info(f"Message {i}")
+        app.logger.debug("Not logged")
+
+        # records are written once the listener catches up with the queue
+        app.log_listener.queue.join()
+        log = self.read_log()
+        self.assertIn("Message 99", log)
+
+        stop_logging(app)
+        log = self.read_log()
+        self.assertEqual(100, len(log.splitlines()))
+        self.assertIn("INFO", log)
+        self.assertNotIn("Not logged", log)
+
+    def test_full_queue(self):
+        app = self.create_app(LOG_QUEUE_SIZE=5)
+
+        # stop the listener so nothing is taken off of the queue
+        app.log_listener.stop()
+        for i in range(10):
+            app.logger.warning(f"Message {i}")
+        self.assertEqual(5, app.log_handler.dropped)
+
+        app.log_listener.start()
+        stop_logging(app)
+        self.assertEqual(5, len(self.read_log().splitlines()))
+
+    def test_stopped(self):
+        app = self.create_app()
+        thread = app.log_listener._thread
+        app.logger.warning("Before stopping")
+        stop_logging(app)
+        stop_logging(app)
+
+        # the listener is gone and the (shared) logger no longer uses its
+        # queue, even when another app is created
+        self.assertFalse(thread.is_alive())
+        self.assertNotIn(app.log_handler, app.logger.handlers)
+        other = self.create_app(LOG_FILE=os.path.join(self.temp_dir.name, "other.log"))
+        other.logger.warning("After stopping")
+        stop_logging(other)
+        self.assertEqual(1, len(self.read_log().splitlines()))
+        self.assertIn("Before stopping", self.read_log())
+
+    def test_error_emails(self):
+        with patch('smtplib.SMTP', FakeSMTP):
+            FakeSMTP.release.clear()
+            app = self.create_app(EMAIL_ERRORS=True, MAIL_SERVER="localhost",
+                                  EMAIL_FROM="cadet@test.com",
+                                  EMAIL_ERRORS_TO=["admin@test.com"])
+
+            # logging the error doesn't wait for the mail server
+            app.logger.error("Something went wrong")
+            self.assertTrue(FakeSMTP.connecting.wait(5))
+            self.assertEqual([], FakeSMTP.messages)
+
+            FakeSMTP.release.set()
+            stop_logging(app)
+            self.assertEqual(1, len(FakeSMTP.messages))
+            self.assertIn("Something went wrong", FakeSMTP.messages[0].get_content())
+            self.assertIn("Something went wrong", self.read_log())
+
+    def digest_logger(self, interval):
+        handler = DigestMailHandler(("localhost", 25), "cadet@test.com", ["admin@test.com"],
+                                    "Error Report", interval=interval, max_records=2)
+        logger = logging.getLogger("test_digests")
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger, handler
+
+    def test_digests(self):
+        logger, handler = self.digest_logger(interval=0.3)
+
+        with patch('smtplib.SMTP', FakeSMTP):
+            # the first error is sent on its own, right away...
+            FakeSMTP.release.clear()
+            logger.error("Error 0")
+            first_timer = handler._timer
+            self.assertTrue(FakeSMTP.connecting.wait(5))
+
+            # ... and handling the rest doesn't wait for the mail server
+            for i in range(1, 5):
+                logger.error(f"Error {i}")
+            self.assertEqual([], FakeSMTP.messages)
+
+            # they are sent in a digest once the interval is up
+            digest_timer = handler._timer
+            FakeSMTP.release.set()
+            first_timer.join(5)
+            digest_timer.join(5)
+
+            self.assertEqual(2, len(FakeSMTP.messages))
+            first, digest = FakeSMTP.messages
+            self.assertEqual("Error Report (1 error)", first['Subject'])
+            self.assertEqual("Error Report (4 errors)", digest['Subject'])
+            self.assertIn("Error 1", digest.get_content())
+            self.assertIn("Error 2", digest.get_content())
+            self.assertNotIn("Error 3", digest.get_content())
+            self.assertIn("... and 2 more", digest.get_content())
+
+    def test_digest_sent_when_closed(self):
+        logger, handler = self.digest_logger(interval=300)
+
+        with patch('smtplib.SMTP', FakeSMTP):
+            logger.error("Error 0")
+            handler._timer.join(5)
+
+            # anything waiting for the interval is sent when the handler is
+            # closed
+            logger.error("Error 1")
+            logger.error("Error 2")
+            self.assertEqual(1, len(FakeSMTP.messages))
+            handler.close()
+
+            self.assertEqual(2, len(FakeSMTP.messages))
+            self.assertEqual("Error Report (2 errors)", FakeSMTP.messages[-1]['Subject'])
+            self.assertIn("Error 2", FakeSMTP.messages[-1].get_content())
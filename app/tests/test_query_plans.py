@@ -0,0 +1,92 @@
+import re
+import unittest
+from app import create_app, db
+from app.db_models import User, Assessment, ShortAnswerQuestion, TextAttempt, Attempt
+from app.user_views import get_last_attempt
+from datetime import date, timedelta, datetime
+
+FULL_ATTEMPT_SCAN = re.compile(r'^SCAN (TABLE )?attempt\b')
+
+class QueryPlanCase(unittest.TestCase):
+    """ Checks that the hot queries on the attempt table are answered using
+    an index rather than a full table scan. """
+
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.a = Assessment(title="Test assessment")
+        self.u1 = User(email="test@test.com", first_name="Test", last_name="User")
+        self.u1.set_password("test")
+        db.session.add_all([self.a, self.u1])
+
+        self.q1 = ShortAnswerQuestion(prompt="Question 1", answer="Answer 1")
+        self.q2 = ShortAnswerQuestion(prompt="Question 2", answer="Answer 2")
+        self.a.questions.append(self.q1)
+        self.a.questions.append(self.q2)
+
+        self.attempt = TextAttempt(response="Attempt1", user=self.u1, question=self.q1,
+                                   time=datetime.now(), correct=True, quality=3)
+        db.session.add(self.attempt)
+        db.session.add(TextAttempt(response="Attempt2", user=self.u1, question=self.q2,
+                                   time=datetime.now() - timedelta(days=1),
+                                   correct=False, quality=1))
+        db.session.commit()
+
+        self.statements = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.record_statement)
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.record_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "attempt" in statement:
+            self.statements.append((statement, parameters))
+
+    def assertNoAttemptScans(self):
+        """ Runs EXPLAIN QUERY PLAN on every recorded query that reads from
+        the attempt table, failing if any of them scans the whole table. """
+        self.assertTrue(self.statements)
+        statements, self.statements = self.statements, []
+
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement,
+                                              parameters).all()
+            details = [row[-1] for row in plan]
+            for detail in details:
+                self.assertIsNone(FULL_ATTEMPT_SCAN.match(detail),
+                                  f"Full scan of attempt table: {details}\n{statement}")
+
+    def test_last_attempt(self):
+        get_last_attempt(self.u1.id, self.q1.id)
+        self.assertNoAttemptScans()
+
+        self.q1.get_latest_attempt(self.u1)
+        self.assertNoAttemptScans()
+
+    def test_previous_attempt(self):
+        # same query as used by the difficulty and self_review views
+        Attempt.query.filter(Attempt.user_id == self.attempt.user_id,
+                             Attempt.question_id == self.attempt.question_id,
+                             Attempt.time < self.attempt.time)\
+                     .order_by(Attempt.time.desc()).first()
+        self.assertNoAttemptScans()
+
+    def test_repeat_questions(self):
+        self.a.repeat_questions(self.u1).all()
+        self.assertNoAttemptScans()
+
+    def test_breakdown_today(self):
+        self.a.breakdown_today(self.u1)
+        self.assertNoAttemptScans()
+
+    def test_review_state_refresh(self):
+        self.attempt.quality = 5
+        db.session.commit()
+        self.assertNoAttemptScans()
@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import patch
+from app import create_app, db
+from app.db_models import (
+    ShortAnswerQuestion, MultipleChoiceQuestion, AnswerOption, CodeJumbleQuestion,
+    JumbleBlock, RenderedMarkdown
+)
+from app.rendering import (
+    MarkdownCache, markdown_to_html, render_markdown, content_digest, cache,
+    get_converter, create_converter
+)
+import threading
+
+class MarkdownCacheCase(unittest.TestCase):
+    def test_lru_eviction(self):
+        c = MarkdownCache(maxsize=2)
+        c.put("a", "A")
+        c.put("b", "B")
+        self.assertEqual("A", c.get("a")) # a is now most recently used
+
+        c.put("c", "C")
+        self.assertEqual(2, len(c))
+        self.assertIsNone(c.get("b"))
+        self.assertEqual("A", c.get("a"))
+        self.assertEqual("C", c.get("c"))
+        self.assertEqual((3, 1), (c.hits, c.misses))
+
+        c.resize(1)
+        self.assertEqual(1, len(c))
+        self.assertEqual("C", c.get("c"))
+
+    def test_digest(self):
+        self.assertEqual(content_digest("x"), content_digest("x", True))
+        self.assertNotEqual(content_digest("x"), content_digest("x", False))
+        self.assertNotEqual(content_digest("x"), content_digest("y"))
+
+    def test_converter_pool(self):
+        # converters are reused within a thread...
+        self.assertIs(get_converter(True), get_converter(True))
+        self.assertIsNot(get_converter(True), get_converter(False))
+
+        # ... but not shared between threads
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_converter(True)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(get_converter(True), other[0])
+
+        # state (e.g. link references) doesn't leak between conversions
+        self.assertIn("href", render_markdown("[link][1]\n\n[1]: http://example.com"))
+        self.assertNotIn("href", render_markdown("[link][1]"))
+
+        # pooled converters render the same as new ones
+        for text in ["Some *emphasis*", "```python\nx = 1\n```\n", "$O(\\log n)$"]:
+            self.assertEqual(create_converter().convert(text), render_markdown(text))
+            self.assertEqual(create_converter(False).convert(text),
+                             render_markdown(text, code_linenums=False))
+
+
+class RenderingCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cached_rendering(self):
+        text = "Some `code`:\n\n```python\nx = 1\n```\n"
+        expected = render_markdown(text)
+
+        with patch('app.rendering.render_markdown', wraps=render_markdown) as render:
+            self.assertEqual(expected, markdown_to_html(text))
+            self.assertEqual(expected, markdown_to_html(text))
+            self.assertEqual(1, render.call_count)
+
+            # line numbers give different html so they are cached separately
+            self.assertEqual(render_markdown(text, code_linenums=False),
+                             markdown_to_html(text, code_linenums=False))
+            self.assertEqual(2, render.call_count)
+
+    def test_not_persisted_by_default(self):
+        q = ShortAnswerQuestion(prompt="Question *1*", answer="Answer 1")
+        db.session.add(q)
+        db.session.commit()
+        self.assertEqual(0, RenderedMarkdown.query.count())
+
+    def test_persisted_rendering(self):
+        self.app.config['MARKDOWN_CACHE_PERSIST'] = True
+
+        q = MultipleChoiceQuestion(prompt="Question *1*")
+        option = AnswerOption(text="Option **A**", correct=True)
+        q.options.append(option)
+        jq = CodeJumbleQuestion(prompt="Order these", language="python")
+        block = JumbleBlock(code="x = 1", correct_index=0, correct_indent=0)
+        jq.blocks.append(block)
+        db.session.add_all([q, jq])
+        db.session.commit()
+
+        prompt_digest = content_digest(q.prompt)
+        self.assertEqual(render_markdown(q.prompt), RenderedMarkdown.lookup(prompt_digest))
+        self.assertIsNotNone(RenderedMarkdown.lookup(content_digest(option.text)))
+        self.assertEqual(render_markdown(block.markdown(), code_linenums=False),
+                         RenderedMarkdown.lookup(content_digest(block.markdown(), False)))
+
+        # rendering uses the persisted html instead of rendering again
+        with patch('app.rendering.render_markdown') as render:
+            self.assertEqual(render_markdown(q.prompt), markdown_to_html(q.prompt))
+            self.assertEqual(render_markdown(option.text), markdown_to_html(option.text))
+            self.assertEqual(0, render.call_count)
+
+        # changing the markdown replaces the persisted html
+        old_block_digest = content_digest(block.markdown(), False)
+        q.prompt = "Question *2*"
+        block.code = "y = 2"
+        db.session.commit()
+
+        self.assertIsNone(RenderedMarkdown.lookup(prompt_digest))
+        self.assertIsNone(RenderedMarkdown.lookup(old_block_digest))
+        self.assertIsNotNone(RenderedMarkdown.lookup(content_digest("Question *2*")))
+        self.assertIsNotNone(RenderedMarkdown.lookup(content_digest(block.markdown(), False)))
+        self.assertEqual(4, RenderedMarkdown.query.count()) # includes jq.prompt
+
+        # as does deleting the object
+        db.session.delete(option)
+        db.session.commit()
+        self.assertIsNone(RenderedMarkdown.lookup(content_digest("Option **A**")))
+
+    def test_shared_rendering(self):
+        self.app.config['MARKDOWN_CACHE_PERSIST'] = True
+
+        questions = [MultipleChoiceQuestion(prompt=f"Question {i}") for i in range(2)]
+        for q in questions:
+            q.options.append(AnswerOption(text="True", correct=True))
+            q.options.append(AnswerOption(text="False", correct=False))
+        jumbles = [CodeJumbleQuestion(prompt="Order these", language="python")
+                   for _ in range(2)]
+        for jq in jumbles:
+            jq.blocks.append(JumbleBlock(code="x = 1", correct_index=0, correct_indent=0))
+        db.session.add_all([*questions, *jumbles])
+        db.session.commit()
+
+        true_digest = content_digest("True")
+        block_digest = content_digest(jumbles[0].blocks[0].markdown(), False)
+
+        # the html is kept while anything else has the same markdown...
+        questions[0].options[0].text = "Yes"
+        db.session.delete(jumbles[0])
+        db.session.commit()
+        self.assertIsNotNone(RenderedMarkdown.lookup(true_digest))
+        self.assertIsNotNone(RenderedMarkdown.lookup(block_digest))
+        self.assertIsNotNone(RenderedMarkdown.lookup(content_digest("Order these")))
+
+        # ... and removed once nothing does
+        db.session.delete(questions[1])
+        jumbles[1].blocks[0].code = "y = 2"
+        db.session.commit()
+        self.assertIsNone(RenderedMarkdown.lookup(true_digest))
+        self.assertIsNone(RenderedMarkdown.lookup(block_digest))
+
+        # markdown that is added back is rendered again
+        questions[0].options[1].text = "True"
+        db.session.commit()
+        self.assertEqual(render_markdown("True"), RenderedMarkdown.lookup(true_digest))
+        self.assertIsNone(RenderedMarkdown.lookup(content_digest("False")))
@@ -0,0 +1,611 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.db_models import (
+    User, Question, ShortAnswerQuestion, Objective, Textbook, SearchOutbox
+)
+from app.search import (
+    SearchIndexer, ElasticsearchBackend, SQLiteSearchBackend, ensure_indices,
+    reindex, send_documents, stream_documents, write_alias, fts_query,
+    CircuitBreaker, HealthProbe
+)
+from config import TestConfig
+from app.tests.fake_elasticsearch import FakeElasticsearch
+from app.tests.query_counter import QueryCounter
+
+class SearchIndexerCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.es = FakeElasticsearch()
+        self.app.elasticsearch = self.es
+        self.app.search_indexer = SearchIndexer(self.app)
+        self.app.search_backends = [ElasticsearchBackend()]
+        ensure_indices()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def indexed(self, index, field):
+        """ Returns the given field of each document in the index. """
+        return {doc_id: doc[field] for doc_id, doc in self.es.documents(index).items()}
+
+    def test_operations_are_queued(self):
+        q1 = ShortAnswerQuestion(prompt="What is a list?", answer="A sequence")
+        q2 = ShortAnswerQuestion(prompt="What is a dict?", answer="A mapping")
+        lo = Objective(description="Use data structures")
+        db.session.add_all([q1, q2, lo])
+        db.session.commit()
+
+        # nothing is sent to Elasticsearch while committing
+        self.assertEqual([], self.es.requests)
+        self.assertEqual(3, SearchOutbox.query.count())
+
+        self.assertEqual((3, 0), self.app.search_indexer.drain())
+        self.assertEqual(['bulk'], self.es.requests)
+        self.assertEqual(0, SearchOutbox.query.count())
+
+        # subclasses are indexed with their base class
+        self.assertDictEqual({str(q1.id): "What is a list?", str(q2.id): "What is a dict?"},
+                             self.indexed('question', 'prompt'))
+        self.assertDictEqual({str(lo.id): {'description': "Use data structures",
+                                           'author_id': None, 'public': True,
+                                           'topic_id': None}},
+                             self.es.documents('objective'))
+
+    def test_only_search_fields_are_queued(self):
+        q = ShortAnswerQuestion(prompt="What is a list?", answer="A sequence")
+        db.session.add(q)
+        db.session.commit()
+        self.app.search_indexer.drain()
+
+        q.enabled = True
+        db.session.commit()
+        self.assertEqual(0, SearchOutbox.query.count())
+
+        q.prompt = "What is a tuple?"
+        db.session.commit()
+        self.assertEqual(1, SearchOutbox.query.count())
+
+    def test_coalescing(self):
+        q1 = ShortAnswerQuestion(prompt="First", answer="1")
+        q2 = ShortAnswerQuestion(prompt="Second", answer="2")
+        db.session.add_all([q1, q2])
+        db.session.commit()
+
+        q1.prompt = "First (edited)"
+        db.session.commit()
+        q1.prompt = "First (edited again)"
+        db.session.commit()
+        db.session.delete(q2)
+        db.session.commit()
+
+        self.assertEqual(5, SearchOutbox.query.count())
+        self.assertEqual((2, 0), self.app.search_indexer.drain())
+        self.assertEqual(['bulk'], self.es.requests)
+        self.assertDictEqual({str(q1.id): "First (edited again)"},
+                             self.indexed('question', 'prompt'))
+
+    def test_retry_with_backoff(self):
+        q1 = ShortAnswerQuestion(prompt="First", answer="1")
+        q2 = ShortAnswerQuestion(prompt="Second", answer="2")
+        db.session.add_all([q1, q2])
+        db.session.commit()
+
+        # the whole request fails
+        self.es.fail_requests = 1
+        self.assertEqual((0, 2), self.app.search_indexer.drain())
+        for entry in SearchOutbox.query:
+            self.assertEqual(1, entry.attempts)
+
+        # not retried until the backoff is over
+        self.assertEqual((0, 0), self.app.search_indexer.drain())
+
+        # a single document fails
+        self.es.fail_documents.add(q2.id)
+        self.assertEqual((1, 1), self.app.search_indexer.drain(include_delayed=True))
+        entry = SearchOutbox.query.one()
+        self.assertEqual((q2.id, 2), (entry.doc_id, entry.attempts))
+
+        first_delay = self.app.search_indexer.backoff(1)
+        self.assertEqual(2 * first_delay, self.app.search_indexer.backoff(2))
+
+        self.es.fail_documents.clear()
+        self.assertEqual((1, 0), self.app.search_indexer.drain(include_delayed=True))
+        self.assertEqual(2, len(self.es.documents('question')))
+        self.assertEqual(0, SearchOutbox.query.count())
+
+    def test_filtered_search(self):
+        author = User(email="author@test.com", first_name="Test", last_name="Author")
+        author.set_password("password")
+        q1 = ShortAnswerQuestion(prompt="loop loop", answer="1", public=False, author=author)
+        q2 = ShortAnswerQuestion(prompt="loop", answer="2", public=True)
+        q3 = ShortAnswerQuestion(prompt="loop loop loop", answer="3", public=False)
+        db.session.add_all([author, q1, q2, q3])
+        db.session.commit()
+        self.app.search_indexer.drain()
+
+        results, total = Question.search("loop", filters=[{'public': True,
+                                                           'author_id': author.id}])
+        self.assertEqual(([q1, q2], 2), (results, total))
+
+        # changing a filtered field updates the document
+        q3.public = True
+        db.session.commit()
+        self.assertEqual(1, SearchOutbox.query.count())
+        self.app.search_indexer.drain()
+
+        results, total = Question.search("loop", per_page=1, filters=[{'public': True}])
+        self.assertEqual(([q3], 2), (results, total))
+
+    def test_drain_command(self):
+        db.session.add(ShortAnswerQuestion(prompt="First", answer="1"))
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(args=['search', 'drain'])
+        self.assertIn("Sent 1 index operations", result.output)
+        self.assertEqual(1, len(self.es.documents('question')))
+
+    def test_not_queued_without_elasticsearch(self):
+        self.app.elasticsearch = None
+        db.session.add(ShortAnswerQuestion(prompt="First", answer="1"))
+        db.session.commit()
+        self.assertEqual(0, SearchOutbox.query.count())
+
+    def test_drain_after_request(self):
+        def add_question():
+            db.session.add(ShortAnswerQuestion(prompt="First", answer="1"))
+            db.session.commit()
+            return ""
+
+        self.app.add_url_rule('/add-question', view_func=add_question)
+        self.app.after_request(self.app.search_indexer.drain_after_request)
+
+        self.app.test_client().get('/add-question')
+        self.assertEqual(1, len(self.es.documents('question')))
+        self.assertEqual(0, SearchOutbox.query.count())
+
+
+class CircuitBreakerCase(unittest.TestCase):
+    def test_opens_after_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual("closed", breaker.state)
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual("open", breaker.state)
+        self.assertFalse(breaker.allow())
+
+        # a single trial request is allowed once the timeout is up
+        time.sleep(0.06)
+        self.assertEqual("half-open", breaker.state)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        # which opens it again if it fails
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual("closed", breaker.state)
+        self.assertTrue(breaker.allow())
+
+
+class DegradedSearchCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.es = FakeElasticsearch()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.app.elasticsearch = self.es
+        self.app.search_indexer = SearchIndexer(self.app, breaker=self.breaker)
+        self.app.search_health = HealthProbe(self.app, self.breaker, self.app.search_indexer)
+        self.app.search_backends.insert(0, ElasticsearchBackend(self.breaker))
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_falls_back_when_unavailable(self):
+        self.assertTrue(self.app.search_health.check())
+        db.session.add_all([ShortAnswerQuestion(prompt="loop", answer="1"),
+                            ShortAnswerQuestion(prompt="loop loop", answer="2")])
+        db.session.commit()
+        self.app.search_indexer.drain()
+
+        self.es.available = False
+        for _ in range(3):
+            results, total = Question.search("loop")
+            self.assertEqual(2, total)
+
+        # the breaker opened after two failed searches
+        self.assertEqual(['bulk', 'search', 'search'], self.es.requests)
+        self.assertFalse(self.breaker.closed)
+
+        # changes are queued, but not sent until Elasticsearch is back
+        db.session.add(ShortAnswerQuestion(prompt="loop loop loop", answer="3"))
+        db.session.commit()
+        self.assertEqual((0, 0), self.app.search_indexer.drain())
+        self.assertEqual(1, SearchOutbox.query.count())
+        self.assertEqual(3, Question.search("loop")[1])
+
+        self.es.available = True
+        self.assertTrue(self.app.search_health.check())
+        self.assertTrue(self.breaker.closed)
+        self.assertTrue(self.app.search_indexer._wake.is_set())
+        self.assertEqual((1, 0), self.app.search_indexer.drain())
+        self.assertEqual(3, Question.search("loop")[1])
+        self.assertEqual('search', self.es.requests[-1])
+
+    def test_failed_bulk_requests_open_breaker(self):
+        self.app.search_health.check()
+        db.session.add(ShortAnswerQuestion(prompt="First", answer="1"))
+        db.session.commit()
+
+        self.es.fail_requests = 2
+        self.app.search_indexer.drain()
+        self.app.search_indexer.drain(include_delayed=True)
+        self.assertFalse(self.breaker.closed)
+        self.assertEqual((0, 0), self.app.search_indexer.drain(include_delayed=True))
+        self.assertEqual(2, len(self.es.requests))
+
+    def test_health_probe(self):
+        self.breaker.trip()
+        self.es.available = False
+        self.assertFalse(self.app.search_health.check())
+        self.assertFalse(self.breaker.closed)
+        self.assertEqual({}, self.es.indices_data)
+
+        # the indices are created once it can be reached
+        self.es.available = True
+        self.assertTrue(self.app.search_health.check())
+        self.assertTrue(self.breaker.closed)
+        self.assertTrue(self.es.indices.exists('question'))
+
+        self.es.available = False
+        self.assertFalse(self.app.search_health.check())
+        self.assertFalse(self.breaker.closed)
+
+    def test_startup_does_not_wait(self):
+        reached = threading.Event()
+        def ping(*args, **kwargs):
+            reached.wait(5)
+            return False
+
+        config = type('ElasticsearchConfig', (TestConfig,),
+                      dict(ELASTICSEARCH_URL='http://localhost:9200'))
+        with patch('elasticsearch.Elasticsearch.ping', side_effect=ping):
+            start = time.perf_counter()
+            app = create_app(config)
+            self.assertLess(time.perf_counter() - start, 2)
+
+            # searches use full-text search until Elasticsearch is reached
+            self.assertFalse(app.search_breaker.closed)
+            with app.app_context():
+                db.create_all()
+                db.session.add(Objective(description="Use a loop"))
+                db.session.commit()
+                self.assertEqual(1, Objective.search("loop")[1])
+                db.drop_all()
+
+            reached.set()
+            app.search_health.stop()
+            app.search_indexer.stop()
+
+
+class ReindexCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.es = FakeElasticsearch()
+        self.app.elasticsearch = self.es
+        self.app.search_indexer = SearchIndexer(self.app)
+        self.app.search_backends = [ElasticsearchBackend()]
+
+        self.questions = [ShortAnswerQuestion(prompt=f"Question {i}", answer=f"{i}")
+                          for i in range(7)]
+        db.session.add_all(self.questions)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_reindex_swaps_alias(self):
+        # an index from before we used aliases, with some stale documents
+        self.es.indices.create('question')
+        self.es.indices_data['question'] = {'1': {'prompt': "Stale"},
+                                            '999': {'prompt': "Deleted"}}
+        ensure_indices()
+
+        progress = []
+        def report(message):
+            # searches use the old index until the new one is done
+            self.assertIn('999', self.es.documents('question'))
+            progress.append(message)
+
+        self.assertEqual(7, reindex(Question, chunk_size=2,
+                                    workers=2, report=report))
+
+        self.assertEqual(4, len(progress)) # one report per chunk
+        self.assertIn("indexed 7 documents", progress[-1])
+        self.assertIn("docs/s", progress[-1])
+
+        # the old index is gone and both aliases point at the new index
+        self.assertNotIn('question', self.es.indices_data)
+        new_index, = self.es.resolve('question')
+        self.assertTrue(new_index.startswith('question-'))
+        self.assertEqual([new_index], self.es.resolve(write_alias('question')))
+        self.assertDictEqual({str(q.id): q.prompt for q in self.questions},
+                             {doc_id: doc['prompt'] for doc_id, doc
+                              in self.es.documents('question').items()})
+
+        # reindexing again replaces the versioned index
+        reindex(Question)
+        self.assertNotIn(new_index, self.es.indices_data)
+        self.assertEqual(7, len(self.es.documents('question')))
+
+    def test_updates_during_reindex_are_kept(self):
+        ensure_indices()
+        index, = self.es.resolve('question')
+
+        # document written by the indexer after the reindex read the row
+        self.es.indices_data[index]['1'] = {'prompt': "Newer"}
+        self.assertEqual(2, send_documents(self.es, index, [(1, {'prompt': "Older"}),
+                                                            (2, {'prompt': "Question"})]))
+        self.assertEqual({'prompt': "Newer"}, self.es.documents('question')['1'])
+        self.assertEqual({'prompt': "Question"}, self.es.documents('question')['2'])
+
+    def rebuild_with(self, during_chunk, **kwargs):
+        """ Reindexes questions, calling during_chunk with each chunk after it
+        was read from the database but before it is sent. """
+        original = stream_documents
+        def stream(model, chunk_size):
+            for documents in original(model, chunk_size):
+                during_chunk(documents)
+                yield documents
+
+        with patch('app.search.stream_documents', side_effect=stream):
+            return reindex(Question, **kwargs)
+
+    def test_failed_reindex(self):
+        ensure_indices()
+        old_index, = self.es.resolve('question')
+        self.app.search_indexer.drain()
+        q1_id, q2_id, last_id = [q.id for q in self.questions[:2] + self.questions[-1:]]
+
+        # changes made during the rebuild (until it fails)
+        def change(documents):
+            if q1_id in [doc_id for doc_id, _ in documents]:
+                Question.query.get(q1_id).prompt = "Changed"
+                db.session.delete(Question.query.get(q2_id))
+                db.session.commit()
+                self.app.search_indexer.drain()
+                self.es.fail_documents.add(last_id)
+
+        with self.assertRaises(RuntimeError):
+            self.rebuild_with(change, chunk_size=2, workers=1)
+
+        # the new index is gone and the old one was kept up to date
+        self.assertEqual([old_index], [i for i in self.es.indices_data
+                                       if i.startswith('question')])
+        self.assertEqual([old_index], self.es.resolve('question'))
+        self.assertEqual([old_index], self.es.resolve(write_alias('question')))
+        documents = self.es.documents('question')
+        self.assertEqual("Changed", documents[str(q1_id)]['prompt'])
+        self.assertNotIn(str(q2_id), documents)
+
+    def test_deleted_during_reindex(self):
+        ensure_indices()
+        self.app.search_indexer.drain()
+        deleted_id = self.questions[3].id
+
+        # deleted after its chunk was read, but before it was sent (so the
+        # indexer's delete doesn't find it in the new index)
+        def delete(documents):
+            if deleted_id in [doc_id for doc_id, _ in documents]:
+                db.session.delete(Question.query.get(deleted_id))
+                db.session.commit()
+                self.app.search_indexer.drain()
+
+        self.assertEqual(6, self.rebuild_with(delete, chunk_size=2, workers=1))
+        self.assertEqual({str(q.id) for q in Question.query},
+                         set(self.es.documents('question')))
+        self.assertNotIn(str(deleted_id), self.es.documents('question'))
+
+    def test_reindex_command(self):
+        ensure_indices()
+        result = self.app.test_cli_runner().invoke(
+            args=['search', 'reindex', '--chunk-size', '3', '--workers', '2'])
+
+        self.assertIn("Reindexing question", result.output)
+        self.assertIn("question: indexed 7 documents", result.output)
+        self.assertEqual(7, len(self.es.documents('question')))
+
+
+class FullTextSearchCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def search_ids(self, model, expression, **kwargs):
+        results, total = model.search(expression, **kwargs)
+        return [obj.id for obj in results], total
+
+    def test_used_without_elasticsearch(self):
+        self.assertIsNone(self.app.elasticsearch)
+        self.assertIsInstance(self.app.search_backends[0], SQLiteSearchBackend)
+
+    def test_ranking_and_pagination(self):
+        q1 = ShortAnswerQuestion(prompt="What is the length of a list?", answer="len")
+        q2 = ShortAnswerQuestion(prompt="Lists, lists, and more lists", answer="1")
+        q3 = ShortAnswerQuestion(prompt="What is a dictionary?", answer="A mapping")
+        db.session.add_all([q1, q2, q3])
+        db.session.commit()
+
+        # words are stemmed and the best (BM25) matches come first
+        self.assertEqual(([q2.id, q1.id], 2), self.search_ids(Question, "listing"))
+        self.assertEqual(([q2.id], 2), self.search_ids(Question, "list", per_page=1))
+        self.assertEqual(([q1.id], 2), self.search_ids(Question, "list", page=1, per_page=1))
+        self.assertEqual(([], 2), self.search_ids(Question, "list", page=2, per_page=1))
+
+        # matches any of the words
+        self.assertEqual(3, self.search_ids(Question, "dictionary list")[1])
+
+        # only the searchable fields are indexed
+        self.assertEqual(([], 0), self.search_ids(Question, "mapping"))
+
+        # subclasses are searched in their base class' index
+        self.assertEqual(([q3.id], 1), self.search_ids(ShortAnswerQuestion, "dictionary"))
+
+    def test_filters(self):
+        authors = [User(email=f"author{i}@test.com", first_name="Test",
+                        last_name=f"Author{i}") for i in range(2)]
+        for author in authors:
+            author.set_password("password")
+        objective = Objective(description="Iterate over lists")
+        db.session.add_all(authors + [objective])
+
+        questions = [ShortAnswerQuestion(prompt=f"Question {i} about loops", answer=f"{i}",
+                                         public=i % 2 == 0, author=authors[i % 3 == 0],
+                                         objective=objective if i < 5 else None)
+                     for i in range(12)]
+        db.session.add_all(questions)
+        db.session.commit()
+
+        def expected(condition):
+            return {q.id for q in questions if condition(q)}
+
+        # filters are applied before paginating, so every page is full
+        mine = [{'public': True, 'author_id': authors[1].id}]
+        pages = [self.search_ids(Question, "loops", page=page, per_page=3, filters=mine)
+                 for page in range(4)]
+        self.assertEqual([3, 3, 2, 0], [len(ids) for ids, total in pages])
+        self.assertEqual({8}, {total for ids, total in pages})
+        self.assertEqual(expected(lambda q: q.public or q.author == authors[1]),
+                         {i for ids, total in pages for i in ids})
+
+        # filters are combined
+        ids, total = self.search_ids(Question, "loops",
+                                     filters=[{'public': False},
+                                              {'objective_id': [objective.id]}])
+        self.assertEqual(expected(lambda q: not q.public and q.objective), set(ids))
+
+        self.assertEqual(([], 0), self.search_ids(Question, "loops",
+                                                  filters=[{'objective_id': []}]))
+
+        with self.assertRaises(ValueError):
+            Question.search("loops", filters=[{'prompt': "loops"}])
+
+        # the page is loaded with a single query
+        with QueryCounter(db.engine) as counter:
+            results, total = Question.search("loops", per_page=5)
+        self.assertEqual((5, 12), (len(results), total))
+        self.assertEqual(2, counter.count)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual('"NEAR" OR "foo" OR "bar"', fts_query('NEAR(foo* "bar'))
+        self.assertEqual("", fts_query("?!"))
+
+        db.session.add(Objective(description="Use a for loop"))
+        db.session.commit()
+        self.assertEqual(1, self.search_ids(Objective, 'for" OR loop*')[1])
+        self.assertEqual(([], 0), self.search_ids(Objective, "*"))
+
+    def test_index_kept_in_sync(self):
+        book = Textbook(title="Think Python", authors="Allen Downey")
+        db.session.add(book)
+        db.session.commit()
+        self.assertEqual(([book.id], 1), self.search_ids(Textbook, "downey"))
+
+        book.title = "How to Think Like a Computer Scientist"
+        db.session.commit()
+        self.assertEqual(([], 0), self.search_ids(Textbook, "python"))
+        self.assertEqual(([book.id], 1), self.search_ids(Textbook, "computer"))
+        self.assertEqual(([book.id], 1), self.search_ids(Textbook, "downey"))
+
+        # changes that are rolled back aren't indexed
+        book.title = "Rolled back"
+        db.session.flush()
+        self.assertEqual(1, self.search_ids(Textbook, "rolled")[1])
+        db.session.rollback()
+        self.assertEqual(([], 0), self.search_ids(Textbook, "rolled"))
+        self.assertEqual(([book.id], 1), self.search_ids(Textbook, "computer"))
+
+        db.session.delete(book)
+        db.session.commit()
+        self.assertEqual(([], 0), self.search_ids(Textbook, "computer"))
+
+        # the index matches the table (this raises an error if it doesn't)
+        db.session.execute(db.text("INSERT INTO textbook_fts(textbook_fts, rank) "
+                                   "VALUES('integrity-check', 1)"))
+
+    def test_reindex(self):
+        # rows changed without the ORM aren't indexed until reindexing
+        db.session.execute(Objective.__table__.insert(),
+                           [{'description': "Write a recursive function"}])
+        db.session.commit()
+        self.assertEqual(0, self.search_ids(Objective, "recursion")[1])
+
+        result = self.app.test_cli_runner().invoke(args=['search', 'reindex'])
+        self.assertIn("objective: indexed 1 documents", result.output)
+        self.assertEqual(1, self.search_ids(Objective, "recursion")[1])
+
+    def test_api_search(self):
+        instructor = User(email="instructor@test.com", first_name="Test",
+                          last_name="Instructor", instructor=True)
+        instructor.set_password("password")
+        db.session.add(instructor)
+        db.session.add_all([ShortAnswerQuestion(prompt="What is a tuple?", answer="1",
+                                                author=instructor),
+                            ShortAnswerQuestion(prompt="What is a set?", answer="2",
+                                                author=instructor)])
+        db.session.commit()
+
+        token = create_access_token(identity=instructor)
+        response = self.app.test_client().get(
+            '/api/questions?q=tuples',
+            headers={'Authorization': f"Bearer {token}"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["What is a tuple?"], [q['prompt'] for q in response.json['questions']])
+
+        # other people's private questions are filtered out before paginating
+        db.session.add_all([ShortAnswerQuestion(prompt=f"What is private {i}?", answer="?",
+                                                public=False)
+                            for i in range(5)])
+        db.session.commit()
+
+        response = self.app.test_client().get(
+            '/api/questions?q=what&page=0&per_page=2',
+            headers={'Authorization': f"Bearer {token}"})
+        self.assertEqual({"What is a tuple?", "What is a set?"},
+                         {q['prompt'] for q in response.json['questions']})
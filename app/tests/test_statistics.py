@@ -0,0 +1,155 @@
+import unittest
+from app import create_app, db
+from app.db_models import Course, Assessment, User, ShortAnswerQuestion, TextAttempt, Objective
+from app.statistics import AssessmentStatistics
+from datetime import date, timedelta, datetime
+
+class AssessmentStatisticsCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.c = Course(name="test-course", title="Test Course", description="",
+                        start_date=(date.today()-timedelta(days=3)),
+                        end_date=(date.today()+timedelta(days=3)))
+        self.a = Assessment(title="Test assessment")
+        self.c.assessments.append(self.a)
+
+        self.lo1 = Objective(description="Objective 1")
+        self.lo2 = Objective(description="Objective 2")
+        db.session.add_all([self.c, self.a, self.lo1, self.lo2])
+
+        self.questions = []
+        for i in range(6):
+            q = ShortAnswerQuestion(prompt=f"Question {i}", answer=f"Answer {i}",
+                                    objective=(self.lo1 if i % 2 == 0 else self.lo2))
+            self.a.questions.append(q)
+            self.questions.append(q)
+
+        self.users = []
+        for i in range(4):
+            u = User(email=f"test{i}@test.com", first_name=f"Test{i}", last_name="User")
+            u.set_password("test")
+            self.c.users.append(u)
+            self.users.append(u)
+
+        # user outside of the course shouldn't affect anything
+        self.outsider = User(email="outsider@test.com", first_name="Out", last_name="Sider")
+        self.outsider.set_password("test")
+        db.session.add(self.outsider)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_attempts(self):
+        u0, u1, u2, _ = self.users
+        q = self.questions
+        midnight_yesterday = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=1)
+
+        db.session.add_all([
+            # u0: practiced two questions yesterday, one waiting and one due
+            TextAttempt(response="a", user=u0, question=q[0], time=midnight_yesterday,
+                        next_attempt=date.today()+timedelta(days=1), e_factor=2.0, quality=4),
+            TextAttempt(response="a", user=u0, question=q[1], time=midnight_yesterday,
+                        next_attempt=date.today(), e_factor=3.5, quality=3),
+
+            # u1: got a question wrong today so it needs repeating
+            TextAttempt(response="a", user=u1, question=q[2], time=datetime.now(),
+                        next_attempt=date.today()+timedelta(days=1), e_factor=4.5, quality=1),
+
+            # u2: did everything and doesn't need more practice
+            *[TextAttempt(response="a", user=u2, question=question, time=datetime.now(),
+                          next_attempt=date.today()+timedelta(days=6), e_factor=2.6, quality=5)
+              for question in q],
+
+            TextAttempt(response="a", user=self.outsider, question=q[0], time=datetime.now(),
+                        e_factor=1.3, quality=0),
+        ])
+        db.session.commit()
+
+    def test_matches_per_user_methods(self):
+        self.add_attempts()
+        stats = AssessmentStatistics(self.c, self.a)
+
+        for user in self.users:
+            self.assertEqual(self.a.num_questions_to_practice(user),
+                             stats.questions_remaining(user.id))
+
+            for objective in [self.lo1, self.lo2]:
+                self.assertEqual(objective.get_e_factor_average(user, self.a),
+                                 stats.e_factor_average(user.id, objective))
+
+        self.assertEqual(sum(self.a.num_questions_to_practice(u) for u in self.users),
+                         stats.total_questions_remaining())
+
+    def test_breakdowns(self):
+        stats = AssessmentStatistics(self.c, self.a)
+        self.assertTupleEqual((0, 0, 0, 4, 0), stats.questions_remaining_breakdown())
+        self.assertTupleEqual((0, 0, 4), stats.skill_breakdown(self.lo1))
+        self.assertEqual(0, stats.star_rating(self.lo1))
+
+        self.add_attempts()
+        stats = AssessmentStatistics(self.c, self.a)
+
+        # remaining: u0 = 5, u1 = 7 (6 fresh + 1 repeat), u2 = 0, u3 = 6
+        self.assertTupleEqual((1, 0, 1, 2, 0), stats.questions_remaining_breakdown())
+
+        # lo1 averages: u0 = 2.0, u1 = 4.5, u2 = 2.6, u3 = 0
+        self.assertTupleEqual((1, 0, 3), stats.skill_breakdown(self.lo1))
+        self.assertEqual(2, stats.star_rating(self.lo1))
+
+        # Course methods give the same results
+        self.assertEqual(stats.star_rating(self.lo1), self.c.star_rating(self.lo1, self.a))
+        self.assertTupleEqual(stats.skill_breakdown(self.lo2),
+                              self.c.student_skill_breakdown(self.lo2, self.a))
+        self.assertTupleEqual(stats.questions_remaining_breakdown(),
+                              self.c.questions_remaining_breakdown(self.a))
+
+    def test_query_count_independent_of_users(self):
+        self.add_attempts()
+
+        # load everything expired by the commit before we start counting
+        for obj in [self.c, self.a, self.lo1, self.lo2]:
+            db.session.refresh(obj)
+
+        queries = []
+        def count_query(*args):
+            queries.append(args)
+
+        db.event.listen(db.engine, 'before_cursor_execute', count_query)
+        stats = AssessmentStatistics(self.c, self.a)
+        stats.questions_remaining_breakdown()
+        stats.skill_breakdown(self.lo1)
+        stats.star_rating(self.lo2)
+        db.event.remove(db.engine, 'before_cursor_execute', count_query)
+
+        self.assertLessEqual(len(queries), 5)
+
+    def test_progress_report(self):
+        self.add_attempts()
+
+        self.a.objectives.append(self.lo1)
+        self.a.objectives.append(self.lo2)
+
+        instructor = self.users[3]
+        instructor.instructor = True
+        db.session.commit()
+
+        report = self.a.progress_report(self.c, average_threshold=3.0)
+        self.assertCountEqual([u for u, _, _ in report], self.users[:3])
+
+        for user, num_remaining, objectives in report:
+            self.assertEqual(self.a.num_questions_to_practice(user), num_remaining)
+            self.assertEqual(self.a.objectives_to_review(user, average_threshold=3.0),
+                             objectives)
+
+        # u0 needs to work on lo1 (2.0), u2 on both (2.6)
+        report = {user: objectives for user, _, objectives in report}
+        self.assertEqual([(self.lo1, 2.0)], report[self.users[0]])
+        self.assertEqual([], report[self.users[1]])
+        self.assertCountEqual([(self.lo1, 2.6), (self.lo2, 2.6)], report[self.users[2]])
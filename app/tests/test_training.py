@@ -5,14 +5,16 @@ from urllib.parse import urlparse
 from datetime import date, datetime, timedelta
 from flask import url_for
 from flask_login import FlaskLoginClient
+from flask_sqlalchemy import BaseQuery
 
 from app import create_app, db
 from app.db_models import (
     User, Course, ShortAnswerQuestion, Assessment, Attempt, TextAttempt,
     AutoCheckQuestion, MultipleChoiceQuestion, MultipleSelectionQuestion,
     AnswerOption, SelectionAttempt, CodeJumbleQuestion, JumbleBlock,
-    selected_answers
+    selected_answers, PracticeQueue, PracticeQueueEntry
 )
+from app.tests.query_counter import QueryCounter
 
 
 class TrainingTests(unittest.TestCase):
@@ -650,5 +652,167 @@ class TrainingTests(unittest.TestCase):
                 self.assertEqual(Attempt.query.count(), 1)
 
 
+class PracticeQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('config.TestConfig')
+        self.app.test_client_class = FlaskLoginClient
+        self.app.config['SERVER_NAME'] = 'localhost.localdomain:5000'
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.course = Course(name="test-course", title="Test Course",
+                             description="A test course",
+                             start_date=(date.today()-timedelta(days=1)),
+                             end_date=(date.today()+timedelta(days=1)))
+        self.assessment = Assessment(title="Test assessment")
+        self.course.assessments.append(self.assessment)
+
+        self.questions = [AutoCheckQuestion(prompt=f"Question {i}", answer=f"{i}",
+                                            regex=False)
+                          for i in range(4)]
+        for q in self.questions:
+            self.assessment.questions.append(q)
+
+        self.user = User(email="user1@example.com", first_name="User", last_name="Uno")
+        self.user.set_password('testing1')
+        self.course.users.append(self.user)
+
+        db.session.add_all([self.course, self.user])
+        db.session.commit()
+
+        # attempts and queues are dated in the course's time zone while the
+        # assessment's fresh and repeat questions use the server's date, so
+        # make them agree whatever time the tests run at
+        patcher = patch('app.db_models.current_timezone_date', return_value=date.today())
+        self.today = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def answer(self, question, quality, time=None):
+        """ Adds a graded attempt at the question. """
+        attempt = TextAttempt(response="answer", question=question, user=self.user,
+                              time=time or datetime.now())
+        db.session.add(attempt)
+        db.session.commit()
+
+        attempt.sm2_update(quality)
+        db.session.commit()
+
+    def queued(self):
+        queue = PracticeQueue.query.get((self.user.id, self.assessment.id))
+        return [(entry.question_id, entry.repeat) for entry in queue.entries]
+
+    def test_built_once_per_day(self):
+        # answered well yesterday, so not due today
+        self.answer(self.questions[0], 5, time=datetime.now() - timedelta(days=1))
+
+        with patch.object(Assessment, 'fresh_questions',
+                          wraps=self.assessment.fresh_questions) as fresh:
+            PracticeQueue.for_today(self.user, self.assessment)
+            PracticeQueue.for_today(self.user, self.assessment)
+            self.assertEqual(1, fresh.call_count)
+
+        self.assertCountEqual([(q.id, False) for q in self.questions[1:]], self.queued())
+
+        # next day
+        queue = PracticeQueue.query.get((self.user.id, self.assessment.id))
+        queue.day = date.today() - timedelta(days=1)
+        db.session.commit()
+
+        PracticeQueue.for_today(self.user, self.assessment)
+        self.assertEqual(3, len(self.queued()))
+
+        # the day changes with the course's time zone rather than the server's
+        self.today.return_value = date.today() + timedelta(days=1)
+        queue = PracticeQueue.for_today(self.user, self.assessment)
+        self.assertEqual(date.today() + timedelta(days=1), queue.day)
+
+    def test_answers_update_queue(self):
+        queue = PracticeQueue.for_today(self.user, self.assessment)
+        first, fresh = queue.next_question()
+        self.assertTrue(fresh)
+
+        # wrong and hard answers are moved to the back to be repeated
+        self.answer(first, 2)
+        self.assertEqual((first.id, True), self.queued()[-1])
+        self.assertNotEqual(first, queue.next_question()[0])
+
+        others = [q for q in self.questions if q != first]
+        for q in others:
+            self.answer(q, 3 if q == others[0] else 5)
+
+        self.assertEqual([(first.id, True), (others[0].id, True)], self.queued())
+        self.assertEqual((first, False), queue.next_question())
+
+        self.answer(first, 4)
+        self.answer(others[0], 5)
+        self.assertEqual((None, None), queue.next_question())
+
+    def test_repeats_included_when_built(self):
+        self.answer(self.questions[0], 1)
+        PracticeQueue.for_today(self.user, self.assessment)
+        self.assertEqual((self.questions[0].id, True), self.queued()[-1])
+
+    def test_removed_questions_skipped(self):
+        queue = PracticeQueue.for_today(self.user, self.assessment)
+        first, _ = queue.next_question()
+        self.assessment.questions.remove(first)
+        db.session.commit()
+
+        served = []
+        question, _ = queue.next_question()
+        while question is not None:
+            served.append(question)
+            self.answer(question, 5)
+            question, _ = queue.next_question()
+
+        self.assertCountEqual([q for q in self.questions if q != first], served)
+
+    def test_created_by_another_request(self):
+        queue = PracticeQueue.for_today(self.user, self.assessment)
+        queued = self.queued()
+
+        # the other request created the queue after this one looked for it
+        with patch.object(BaseQuery, 'get', autospec=True, side_effect=[None, queue]), \
+                patch.object(PracticeQueue, 'build') as build:
+            self.assertEqual(queue, PracticeQueue.for_today(self.user, self.assessment))
+            build.assert_not_called()
+
+        self.assertEqual(queued, self.queued())
+
+    def test_next_question_queries(self):
+        PracticeQueue.for_today(self.user, self.assessment)
+        db.session.expire_all()
+        db.session.refresh(self.user)
+        db.session.refresh(self.assessment)
+
+        with QueryCounter(db.engine) as counter:
+            question, fresh = PracticeQueue.for_today(self.user, self.assessment).next_question()
+
+        self.assertIn(question, self.questions)
+        self.assertEqual(2, counter.count)
+
+    def test_train_page(self):
+        client = self.app.test_client(user=self.user)
+        url = url_for('user_views.test', course_name="test-course",
+                      mission_id=self.assessment.id)
+
+        response = client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(4, PracticeQueueEntry.query.count())
+
+        for q in self.questions:
+            self.answer(q, 5)
+
+        response = client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, PracticeQueueEntry.query.count())
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -13,33 +13,17 @@ from wtforms.validators import (
 )
 from flask_login import current_user, login_required
 
-import ast, markdown
+import ast
 from datetime import date, timedelta, datetime
 
-from app import db, ast_solver
+from app import db
+from app.grading import grade_response
+from app.rendering import markdown_to_html
 
 
 user_views = Blueprint('user_views', __name__)
 
 
-def markdown_to_html(markdown_text, code_linenums=True):
-    """ Convert markdown text to html. """
-    html = markdown.markdown(markdown_text,
-                             extensions=['fenced_code',
-                                         'codehilite',
-                                         'pymdownx.arithmatex'],
-
-                             extension_configs = {
-                                 "pymdownx.arithmatex": {
-                                     "generic": True
-                                 },
-                                 "codehilite": {
-                                     "linenums": code_linenums
-                                 }
-                             })
-    return html
-
-
 @user_views.route('/')
 def root():
     return render_template("home.html")
@@ -360,19 +344,7 @@ def get_next_question(assessment):
     """ Finds the next question to present to the student. Returns the
     question (or None if there is no more questions to train for) and whether
     the question is 'fresh' or a repeat. """
-
-    # set the question bank based on whether there are fresh questions or not
-    fresh_questions = assessment.fresh_questions(current_user).order_by(db.func.random())
-
-    if fresh_questions.count() != 0:
-        return fresh_questions.first(), True
-
-    repeat_questions = assessment.repeat_questions(current_user).order_by(db.func.random())
-
-    if repeat_questions.count() != 0:
-        return repeat_questions.first(), False
-    else:
-        return None, None
+    return PracticeQueue.for_today(current_user, assessment).next_question()
 
 
 def get_form(question, use_existing):
@@ -516,19 +488,10 @@ def test(course_name, mission_id):
                                         attempt=attempt.id))
 
             # Other question types can be graded automatically 
-            if question.type == QuestionType.AUTO_CHECK:
+            if question.type in (QuestionType.AUTO_CHECK,
+                                 QuestionType.SINGLE_LINE_CODE_QUESTION):
                 user_response = attempt.response.strip()
-                attempt.correct = attempt.response.strip() == question.answer
-
-            elif question.type == QuestionType.SINGLE_LINE_CODE_QUESTION:
-                user_response = attempt.response.strip()
-                question_answer = question.answer
-            
-                if question.add_body:
-                    user_response += "\n\tpass"
-                    question_answer += "\n\tpass"
-
-                attempt.correct = ast_solver.same_ast_tree(user_response, question_answer)
+                attempt.correct = grade_response(question, user_response)
 
             elif question.type == QuestionType.MULTIPLE_CHOICE:
                 attempt.correct = attempt.responses.filter_by(correct=True).count() == 1
@@ -676,7 +639,8 @@ class MultipleSelectionForm(FlaskForm):
 
 from app.db_models import (
     Question, Attempt, enrollments, QuestionType, AnswerOption, TextAttempt,
-    SelectionAttempt, JumbleBlock, Course, Objective, User, Assessment
+    SelectionAttempt, JumbleBlock, Course, Objective, User, Assessment,
+    PracticeQueue
 )
 
 
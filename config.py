@@ -16,10 +16,89 @@ class Config(object):
     LOGGING_LEVEL = logging.ERROR
     EMAIL_ERRORS = False
 
+    # log records are handled by a background thread, which writes them to a
+    # rotating log file in batches (of up to LOG_BUFFER_SIZE records) and
+    # emails errors as digests, at most one every ERROR_DIGEST_INTERVAL
+    # seconds. Records are dropped if LOG_QUEUE_SIZE records are waiting.
+    LOG_FILE = 'cadet.log'
+    LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+    LOG_FILE_BACKUPS = 5
+    LOG_BUFFER_SIZE = 100
+    LOG_QUEUE_SIZE = 10000
+    ERROR_DIGEST_INTERVAL = 300
+    ERROR_DIGEST_MAX_RECORDS = 50
+
+    # emails are queued (up to MAIL_QUEUE_SIZE of them, dropping any more
+    # rather than making requests wait for room) and sent by MAIL_WORKERS
+    # background threads, or right away if it is 0. Each worker keeps its
+    # connection open until it has been idle for MAIL_IDLE_TIMEOUT seconds
+    # and retries temporary failures up to MAIL_MAX_ATTEMPTS times. The
+    # queue's counters are logged once MAIL_QUEUE_WARN_SIZE messages are
+    # waiting (and again when it catches up).
+    MAIL_WORKERS = 2
+    MAIL_QUEUE_SIZE = 1000
+    MAIL_QUEUE_WARN_SIZE = 500
+    MAIL_IDLE_TIMEOUT = 5
+    MAIL_MAX_ATTEMPTS = 5
+    MAIL_RETRY_BACKOFF = 1 # seconds, doubled after each failure
+    MAIL_STOP_TIMEOUT = 30 # seconds to finish sending when shutting down
+
     ELASTICSEARCH_URL = 'http://localhost:9200'
+    ELASTICSEARCH_TIMEOUT = 5 # seconds
+
+    # Elasticsearch is pinged every SEARCH_HEALTH_INTERVAL seconds by a
+    # background thread (instead of when the app starts). Searches fall back
+    # to full-text search while it can't be reached or after
+    # SEARCH_BREAKER_THRESHOLD failed requests in a row, after which one
+    # request is tried every SEARCH_BREAKER_RESET_TIMEOUT seconds.
+    SEARCH_HEALTH_INTERVAL = 30
+    SEARCH_HEALTH_TIMEOUT = 2
+    SEARCH_BREAKER_THRESHOLD = 3
+    SEARCH_BREAKER_RESET_TIMEOUT = 30
+
+    # index changes are queued and sent to Elasticsearch in bulk by a
+    # background thread (or at the end of each request if it is disabled)
+    SEARCH_INDEX_WORKER = True
+    SEARCH_INDEX_BATCH_SIZE = 500
+    SEARCH_INDEX_RETRY_BACKOFF = 1 # seconds, doubled after each failure
+    SEARCH_REINDEX_WORKERS = 4
+
+    # keep SQLite full-text search tables up to date (when the database is
+    # SQLite), which are searched when Elasticsearch isn't available
+    SEARCH_FULL_TEXT = True
+
+    # maximum number of rendered markdown snippets kept in memory, and whether
+    # to also store prompt, option, and jumble block html in the database
+    MARKDOWN_CACHE_SIZE = 2048
+    MARKDOWN_CACHE_PERSIST = False
+
+    # longest response that is matched against a regex auto-check answer
+    REGEX_MAX_RESPONSE_LENGTH = 1000
+
+    # maximum number of verdicts on auto-graded responses kept in memory, and
+    # whether to also store them in the database (shared by all workers)
+    VERDICT_CACHE_SIZE = 4096
+    VERDICT_CACHE_PERSIST = False
+
+    # number of processes used by 'flask grading regrade'
+    GRADING_REGRADE_WORKERS = 4
+
+    # default and maximum number of results in a page of an API list
+    API_PAGE_SIZE = 100
+    API_MAX_PAGE_SIZE = 500
+
+    # the users who made recent requests (with their roles and enrollments)
+    # are cached for IDENTITY_CACHE_TTL seconds, so authenticating a read-only
+    # request doesn't take any queries (other requests always load the user).
+    # Changes made by other workers are only seen once the entry expires. Set
+    # the TTL to 0 to disable the cache.
+    IDENTITY_CACHE_TTL = 5
+    IDENTITY_CACHE_SIZE = 1024
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///cadet_db.sqlite'
+    MARKDOWN_CACHE_PERSIST = True
+    VERDICT_CACHE_PERSIST = True
     JWT_COOKIE_SECURE = True
     EMAIL_ERRORS = True
     #SERVER_NAME = 'localhost:5000'
@@ -38,6 +117,7 @@ class E2ETestingConfig(DevelopmentConfig):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     ENABLE_TEST_ROUTES = True
     ELASTICSEARCH_URL = 'http://es:9200'
+    SEARCH_INDEX_WORKER = False # in-memory database is shared with requests
 
 class TestConfig(Config):
     TESTING = True
@@ -71,6 +71,11 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search tables (and their shadow tables) aren't part of
+    # the models' metadata, so don't let autogenerate drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        return not (type_ == "table" and reflected and "_fts" in name)
+
     connectable = current_app.extensions['migrate'].db.get_engine()
 
     with connectable.connect() as connection:
@@ -78,6 +83,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
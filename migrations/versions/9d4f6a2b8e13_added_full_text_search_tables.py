@@ -0,0 +1,46 @@
+"""Added Full-Text Search Tables
+
+Revision ID: 9d4f6a2b8e13
+Revises: e7d31a9c5f02
+Create Date: 2026-10-17 15:02:11.318240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f6a2b8e13'
+down_revision = 'e7d31a9c5f02'
+branch_labels = None
+depends_on = None
+
+
+# searchable columns of each table (see SearchableMixin)
+SEARCHABLE = {
+    'topic': ['text'],
+    'question': ['prompt'],
+    'course': ['name', 'title'],
+    'objective': ['description'],
+    'textbook': ['title', 'authors'],
+}
+
+
+def upgrade():
+    # FTS5 tables are only used with SQLite
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table, columns in SEARCHABLE.items():
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+                   f"USING fts5({', '.join(columns)}, content='{table}', "
+                   f"content_rowid='id', tokenize='porter unicode61')")
+        op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in SEARCHABLE:
+        op.execute(f"DROP TABLE IF EXISTS {table}_fts")
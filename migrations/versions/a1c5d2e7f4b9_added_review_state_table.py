@@ -0,0 +1,50 @@
+"""Added Review State Table
+
+Revision ID: a1c5d2e7f4b9
+Revises: 3f368b7ef71f
+Create Date: 2026-10-17 09:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c5d2e7f4b9'
+down_revision = '3f368b7ef71f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('review_state',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('next_attempt', sa.Date(), nullable=False),
+    sa.Column('e_factor', sa.Float(), nullable=False),
+    sa.Column('interval', sa.Integer(), nullable=False),
+    sa.Column('quality', sa.Integer(), nullable=False),
+    sa.Column('last_attempt_time', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], name=op.f('fk_review_state_question_id_question')),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name=op.f('fk_review_state_user_id_user')),
+    sa.PrimaryKeyConstraint('user_id', 'question_id', name=op.f('pk_review_state'))
+    )
+
+    # populate review states from the existing attempt history
+    op.execute("""
+        INSERT INTO review_state (user_id, question_id, next_attempt, e_factor,
+                                  interval, quality, last_attempt_time)
+        SELECT user_id, question_id, next_attempt, e_factor, interval, quality, time
+        FROM (SELECT user_id, question_id,
+                     max(next_attempt) OVER (PARTITION BY user_id, question_id) AS next_attempt,
+                     e_factor, interval, quality, time,
+                     row_number() OVER (PARTITION BY user_id, question_id
+                                        ORDER BY time DESC, id DESC) AS position
+              FROM attempt
+              WHERE user_id IS NOT NULL AND question_id IS NOT NULL)
+        WHERE position = 1
+    """)
+
+
+def downgrade():
+    op.drop_table('review_state')